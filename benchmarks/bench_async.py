@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк конкурентности: Aria2Client (последовательно) против AsyncAria2Client
+
+Несколько фейковых демонов с задержкой ответа, по каждому опрашиваются
+статусы всех загрузок. Запуск: python3 benchmarks/bench_async.py [демонов] [загрузок] [задержка_мс]
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from aria2_client import Aria2Client
+from async_client import AsyncAria2Client
+from fake_aria2 import FakeAria2Server
+
+
+SECRET = "test123"
+
+
+def bench_sync(servers, gids):
+    clients = [Aria2Client(host=f"http://{s.host}", port=s.port, secret=SECRET) for s in servers]
+    start = time.perf_counter()
+    for client, server_gids in zip(clients, gids):
+        for gid in server_gids:
+            client.get_download_status(gid)
+    elapsed = time.perf_counter() - start
+    for client in clients:
+        client.close()
+    return elapsed
+
+
+async def bench_async(servers, gids):
+    clients = [AsyncAria2Client(host=f"http://{s.host}", port=s.port, secret=SECRET, pool_size=32)
+               for s in servers]
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        client.get_download_status(gid)
+        for client, server_gids in zip(clients, gids)
+        for gid in server_gids
+    ))
+    elapsed = time.perf_counter() - start
+    for client in clients:
+        await client.close()
+    return elapsed
+
+
+def main():
+    daemons = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    downloads = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    latency = (float(sys.argv[3]) if len(sys.argv) > 3 else 5.0) / 1000
+
+    servers = [FakeAria2Server(secret=SECRET, latency=latency).start() for _ in range(daemons)]
+    try:
+        gids = [[s.add_fake_download(f"http://example.com/{i}") for i in range(downloads)]
+                for s in servers]
+        total = daemons * downloads
+        sync_time = bench_sync(servers, gids)
+        async_time = asyncio.run(bench_async(servers, gids))
+    finally:
+        for server in servers:
+            server.stop()
+
+    print(f"Демонов: {daemons}, загрузок на демон: {downloads}, задержка: {latency * 1000:.0f} мс")
+    print(f"Aria2Client:      {sync_time:7.3f} с ({total / sync_time:8.1f} запросов/с)")
+    print(f"AsyncAria2Client: {async_time:7.3f} с ({total / async_time:8.1f} запросов/с)")
+    print(f"Ускорение:        {sync_time / async_time:7.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
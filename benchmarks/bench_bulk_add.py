@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк массового добавления: add_download по одному против bulk_add
+
+Каждый URL получает свои dir/out, как в ночных выгрузках.
+Запуск: python3 benchmarks/bench_bulk_add.py [число_url] [размер_группы] [параллельно] [задержка_мс]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from aria2_client import Aria2Client
+from fake_aria2 import FakeAria2Server
+
+
+SECRET = "test123"
+
+
+def make_items(count):
+    for i in range(count):
+        yield f"http://example.com/batch/{i}.bin", {"dir": f"/data/{i % 16}", "out": f"file{i}.bin"}
+
+
+def bench_single(server, count):
+    client = Aria2Client(host=f"http://{server.host}", port=server.port, secret=SECRET)
+    try:
+        start = time.perf_counter()
+        for url, options in make_items(count):
+            client.add_download(url, options)
+        return time.perf_counter() - start
+    finally:
+        client.close()
+
+
+def bench_bulk(server, count, chunk_size, parallel):
+    client = Aria2Client(host=f"http://{server.host}", port=server.port, secret=SECRET,
+                         pool_size=parallel)
+    try:
+        errors = 0
+        start = time.perf_counter()
+        for result in client.bulk_add(make_items(count), chunk_size, parallel):
+            errors += result.gid is None
+        elapsed = time.perf_counter() - start
+        if errors:
+            print(f"Ошибок при добавлении: {errors}")
+        return elapsed
+    finally:
+        client.close()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    chunk_size = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    parallel = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    latency = (float(sys.argv[4]) if len(sys.argv) > 4 else 1.0) / 1000
+
+    with FakeAria2Server(secret=SECRET, latency=latency) as server:
+        single_time = bench_single(server, count)
+    with FakeAria2Server(secret=SECRET, latency=latency) as server:
+        bulk_time = bench_bulk(server, count, chunk_size, parallel)
+
+    print(f"URL: {count}, группа: {chunk_size}, параллельно: {parallel}, задержка: {latency * 1000:.0f} мс")
+    print(f"add_download: {single_time:7.3f} с ({count / single_time:9.1f} URL/с)")
+    print(f"bulk_add:     {bulk_time:7.3f} с ({count / bulk_time:9.1f} URL/с)")
+    print(f"Ускорение:    {single_time / bulk_time:7.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
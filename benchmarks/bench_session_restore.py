@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Время восстановления очереди из файла сессии в работающий демон
+
+Файл сессии генерируется в формате aria2 (gid, dir, каждая третья запись
+на паузе). Запуск: python3 benchmarks/bench_session_restore.py [записей] [размер_группы] [задержка_мс]
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from aria2_client import Aria2Client
+from fake_aria2 import FakeAria2Server
+from session import SessionManager
+
+
+SECRET = "test123"
+
+
+def write_session(path, count):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            f.write(f"http://example.com/queue/{i}.bin\n gid={i + 1:016x}\n dir=/data/{i % 16}\n")
+            if i % 3 == 0:
+                f.write(" pause=true\n")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    chunk_size = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    latency = (float(sys.argv[3]) if len(sys.argv) > 3 else 1.0) / 1000
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "aria2.session")
+        write_session(path, count)
+        with FakeAria2Server(secret=SECRET, latency=latency) as server:
+            client = Aria2Client(host=f"http://{server.host}", port=server.port, secret=SECRET)
+            try:
+                result = SessionManager(client, path).restore(chunk_size=chunk_size)
+            finally:
+                client.close()
+
+    print(f"Записей: {count}, группа: {chunk_size}, задержка: {latency * 1000:.0f} мс")
+    print(f"Восстановлено: {result.added}, пропущено: {result.skipped}, ошибок: {len(result.errors)}")
+    print(f"Время: {result.elapsed:.3f} с ({result.added / result.elapsed:.0f} записей/с)")
+    return 0 if not result.errors else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Время start_aria2_daemon при уже работающем демоне
+
+Подключение к фейковому демону повторяется несколько раз с новым клиентом.
+С флагом --real проверяется настоящий aria2c на порту 6800 (запускается,
+если ещё не работает). Запуск: python3 benchmarks/bench_startup.py [повторов] [--real]
+"""
+
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from aria2_client import Aria2Client
+from fake_aria2 import FakeAria2Server
+
+
+SECRET = "test123"
+
+
+def measure(host, port, repeats):
+    times = []
+    for _ in range(repeats):
+        client = Aria2Client(host=host, port=port, secret=SECRET)
+        ok = client.start_aria2_daemon()
+        client.close()
+        if not ok:
+            raise SystemExit(client.startup.error)
+        times.append(client.startup.elapsed * 1000)
+    return times
+
+
+def report(title, times):
+    print(f"{title}: медиана {statistics.median(times):6.1f} мс, "
+          f"максимум {max(times):6.1f} мс ({len(times)} запусков)")
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    repeats = int(args[0]) if args else 20
+
+    with FakeAria2Server(secret=SECRET) as server:
+        times = measure(f"http://{server.host}", server.port, repeats)
+    report("Фейковый демон", times)
+
+    if "--real" in sys.argv:
+        report("aria2c", measure("http://localhost", 6800, repeats))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк транспорта: голый requests.post против пула соединений с keep-alive
+
+Запуск: python3 benchmarks/bench_transport.py [число_запросов]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import requests
+
+from fake_aria2 import FakeAria2Server
+from transport import HttpTransport
+
+
+def make_payload(secret):
+    return {
+        "jsonrpc": "2.0",
+        "id": "bench",
+        "method": "aria2.tellActive",
+        "params": [f"token:{secret}"]
+    }
+
+
+def bench_bare(url, payload, count):
+    """Старый путь: новое TCP соединение на каждый вызов"""
+    start = time.perf_counter()
+    for _ in range(count):
+        response = requests.post(url, json=payload, timeout=10)
+        response.raise_for_status()
+        response.json()
+    return count / (time.perf_counter() - start)
+
+
+def bench_pooled(url, payload, count):
+    """Новый путь: общий HttpTransport"""
+    transport = HttpTransport(url)
+    try:
+        start = time.perf_counter()
+        for _ in range(count):
+            transport.post(payload)
+        return count / (time.perf_counter() - start)
+    finally:
+        transport.close()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    secret = "test123"
+
+    with FakeAria2Server(secret=secret) as server:
+        for i in range(20):
+            server.add_fake_download(f"http://example.com/file{i}.bin")
+
+        payload = make_payload(secret)
+        bare = bench_bare(server.url, payload, count)
+        pooled = bench_pooled(server.url, payload, count)
+
+    print(f"Запросов: {count}")
+    print(f"requests.post:  {bare:8.1f} запросов/с")
+    print(f"HttpTransport:  {pooled:8.1f} запросов/с")
+    print(f"Ускорение:      {pooled / bare:8.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Масштабный прогон GUI (simple_gui.DownloadGUI) под виртуальным дисплеем
+
+Для каждого размера очереди (по умолчанию 100, 1 000, 5 000 и 10 000
+загрузок) поднимается фейковый aria2 с идущей имитацией, и настоящий
+DownloadGUI работает в нём заданное время со своим автообновлением.
+Каждая конфигурация запускается в отдельном процессе, чтобы память
+предыдущей не искажала замеры. Измеряются:
+- первая отрисовка: заполнение таблицы всеми строками (главный поток);
+- время обновления от запроса до конца отрисовки и отдельно время
+  отрисовки в главном потоке (p50/p95/максимум);
+- зависания главного цикла: опоздание таймера, который должен
+  срабатывать каждые 20 мс (p50/p99/максимум и число пауз дольше 100 мс);
+- память таблицы: рост RSS процесса при первом заполнении Treeview.
+
+Если число строк таблицы не совпадает с размером очереди, прогон
+считается неудачным (код выхода 1).
+
+Нужен Xvfb; с --display используется текущий $DISPLAY.
+
+Запуск:
+    python3 benchmarks/gui_scale.py [--sizes 100 1000 5000 10000] [--seconds 15]
+        [--active 0.05] [--output results.json] [--display]
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from aria2_client import Aria2Client
+from fake_aria2 import FakeAria2Server
+
+
+SECRET = "test123"
+SIZES = (100, 1000, 5000, 10000)
+HEARTBEAT_MS = 20
+STALL_MS = 100
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def rss_bytes() -> int:
+    """Текущий RSS процесса (Linux), иначе пиковый из getrusage"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class GuiProbe:
+    """Замеры внутри работающего DownloadGUI
+
+    Оборачивает DownloadGUI._render_downloads и DownloadListView.update на
+    уровне классов до создания окна: DownloadGUI.__init__ сразу запускает
+    автообновление, и первое заполнение таблицы тоже должно попасть в
+    замеры. Каждая конфигурация работает в своём процессе, поэтому
+    подмена классов не влияет на другие. attach держит в главном цикле
+    таймер с периодом HEARTBEAT_MS: его опоздание - это время, на которое
+    главный цикл был занят.
+    """
+
+    def __init__(self):
+        from download_list import DownloadListView
+        from simple_gui import DownloadGUI
+
+        self.app = None
+        self.renders: List[float] = []
+        self.walls: List[float] = []
+        self.lags: List[float] = []
+        self.widget_bytes = 0
+        self.widget_rows = 0
+
+        render = DownloadGUI._render_downloads
+        update = DownloadListView.update
+        probe = self
+
+        def timed_render(app, snapshot):
+            started = time.perf_counter()
+            render(app, snapshot)
+            finished = time.perf_counter()
+            probe.renders.append((finished - started) * 1000)
+            probe.walls.append((finished - app._refresh_started) * 1000)
+
+        def measured_update(view, records, etas=None):
+            if probe.widget_rows:
+                return update(view, records, etas)
+            before = rss_bytes()
+            changed = update(view, records, etas)
+            probe.widget_bytes = rss_bytes() - before
+            probe.widget_rows = len(view)
+            return changed
+
+        DownloadGUI._render_downloads = timed_render
+        DownloadListView.update = measured_update
+
+    def attach(self, app):
+        """Запускает таймер зависаний в главном цикле созданного окна"""
+        self.app = app
+        self._last_beat = time.perf_counter()
+        app.root.after(HEARTBEAT_MS, self._beat)
+
+    def _beat(self):
+        now = time.perf_counter()
+        self.lags.append(max(0.0, (now - self._last_beat) * 1000 - HEARTBEAT_MS))
+        self._last_beat = now
+        self.app.root.after(HEARTBEAT_MS, self._beat)
+
+    def results(self) -> Dict[str, float]:
+        # Первое обновление включает подключение и полное заполнение таблицы,
+        # поэтому в статистику обновлений оно не входит
+        renders, walls = self.renders[1:], self.walls[1:]
+        rows = self.widget_rows or 1
+        return {
+            "refreshes": len(self.renders),
+            "first_render_ms": self.renders[0] if self.renders else 0.0,
+            "refresh_wall_p50_ms": percentile(walls, 50),
+            "refresh_wall_p95_ms": percentile(walls, 95),
+            "refresh_wall_max_ms": max(walls, default=0.0),
+            "render_p50_ms": percentile(renders, 50),
+            "render_p95_ms": percentile(renders, 95),
+            "render_max_ms": max(renders, default=0.0),
+            "stall_p50_ms": percentile(self.lags, 50),
+            "stall_p99_ms": percentile(self.lags, 99),
+            "stall_max_ms": max(self.lags, default=0.0),
+            f"stalls_over_{STALL_MS}ms": sum(lag > STALL_MS for lag in self.lags),
+            "widget_rows": self.widget_rows,
+            "widget_rss_kb": self.widget_bytes / 1024,
+            "widget_bytes_per_row": self.widget_bytes / rows,
+            "rss_total_mb": rss_bytes() / (1 << 20),
+        }
+
+
+def run_configuration(size: int, seconds: float, active_share: float) -> Dict[str, float]:
+    """Один прогон GUI против фейкового демона с size загрузками"""
+    from simple_gui import DownloadGUI
+
+    active = max(1, min(size, round(size * active_share)))
+    with FakeAria2Server(secret=SECRET, seed=size) as server, \
+            tempfile.TemporaryDirectory() as temp:
+        server.global_options["max-concurrent-downloads"] = str(active)
+        server.global_options["save-session"] = os.path.join(temp, "fake.session")
+        server.populate(active, status="active")
+        server.populate(size - active, status="waiting")
+        server.start_simulation(interval=0.5)
+
+        client = Aria2Client(host=f"http://{server.host}", port=server.port, secret=SECRET)
+        try:
+            probe = GuiProbe()
+            app = DownloadGUI(client=client, session_file=os.path.join(temp, "aria2.session"))
+            probe.attach(app)
+            app.root.after(int(seconds * 1000), app.root.quit)
+            app.run()
+            results = probe.results()
+            app.root.destroy()
+        finally:
+            server.stop_simulation()
+            client.close()
+    return results
+
+
+@contextmanager
+def virtual_display(use_current: bool):
+    """Запускает Xvfb на свободном номере дисплея и выставляет DISPLAY"""
+    if use_current:
+        if not os.environ.get("DISPLAY"):
+            raise SystemExit("--display: переменная DISPLAY не задана")
+        yield os.environ["DISPLAY"]
+        return
+
+    xvfb = shutil.which("Xvfb")
+    if not xvfb:
+        raise SystemExit("Xvfb не найден (пакет xvfb); либо запустите с --display")
+
+    # Xvfb сам выбирает свободный номер и пишет его в -displayfd
+    read_fd, write_fd = os.pipe()
+    process = subprocess.Popen([xvfb, "-displayfd", str(write_fd), "-screen", "0", "1280x1024x24",
+                                "-nolisten", "tcp"],
+                               pass_fds=(write_fd,), stderr=subprocess.DEVNULL)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as pipe:
+        number = pipe.readline().strip()
+    if not number:
+        process.kill()
+        raise SystemExit("Xvfb не запустился")
+
+    previous = os.environ.get("DISPLAY")
+    os.environ["DISPLAY"] = f":{number}"
+    try:
+        yield os.environ["DISPLAY"]
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+        if previous is None:
+            del os.environ["DISPLAY"]
+        else:
+            os.environ["DISPLAY"] = previous
+
+
+def run_child(size: int, seconds: float, active_share: float) -> Dict[str, float]:
+    """Запускает конфигурацию в отдельном процессе; результат - последняя строка вывода"""
+    command = [sys.executable, __file__, "--child", "--sizes", str(size),
+               "--seconds", str(seconds), "--active", str(active_share)]
+    completed = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               text=True, timeout=seconds + 120)
+    lines = completed.stdout.strip().splitlines()
+    if completed.returncode != 0 or not lines:
+        raise RuntimeError(f"прогон {size} завершился с ошибкой:\n{completed.stderr.strip()}")
+    return json.loads(lines[-1])
+
+
+def print_table(results: Dict[int, Dict[str, float]]):
+    sizes = list(results)
+    print(f"\n{'загрузок':30}" + "".join(f"{size:>12}" for size in sizes))
+    for metric in results[sizes[0]]:
+        print(f"{metric:30}" + "".join(f"{results[size][metric]:12.1f}" for size in sizes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Масштабный прогон Tk GUI под Xvfb")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES), help="размеры очереди")
+    parser.add_argument("--seconds", type=float, default=15.0, help="время работы GUI на конфигурацию")
+    parser.add_argument("--active", type=float, default=0.05,
+                        help="доля активных загрузок (max-concurrent-downloads)")
+    parser.add_argument("--output", help="файл для результатов в JSON")
+    parser.add_argument("--display", action="store_true", help="использовать текущий $DISPLAY вместо Xvfb")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_configuration(args.sizes[0], args.seconds, args.active)))
+        return 0
+
+    results = {}
+    with virtual_display(args.display) as display:
+        print(f"Дисплей {display}, {args.seconds:g} с на конфигурацию")
+        for size in args.sizes:
+            print(f"  {size} загрузок...")
+            results[size] = run_child(size, args.seconds, args.active)
+    print_table(results)
+
+    if args.output:
+        report = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "seconds": args.seconds,
+                "active_share": args.active,
+            },
+            "results": {str(size): values for size, values in results.items()},
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    # Замеры имеют смысл, только если таблица показала всю очередь
+    incomplete = {size: values["widget_rows"] for size, values in results.items()
+                  if values["widget_rows"] != size}
+    if incomplete:
+        print("\nТаблица показала не всю очередь, замеры недействительны:")
+        for size, rows in incomplete.items():
+            print(f"  {size} загрузок: строк {rows}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Набор бенчмарков клиента и мониторинга с сравнением с эталоном
+
+Всё выполняется против фейкового aria2 в том же процессе:
+- задержка RPC (p50/p95/p99) и вызовов в секунду, последовательно и из
+  нескольких потоков;
+- стоимость и размер ответа get_all_downloads при очереди от 100 до 50 000;
+- процессорное время цикла монитора (только поток клиента, без сервера);
+- память монитора на одну отслеживаемую загрузку.
+
+Результаты пишутся в JSON. С --baseline они сравниваются с сохранённым
+эталоном, и ухудшение больше порога считается регрессией (код выхода 1).
+Метрики с суффиксом _per_s - чем больше, тем лучше, остальные - чем меньше.
+
+Запуск:
+    python3 benchmarks/run_benchmarks.py [--quick] [--output results.json]
+        [--baseline benchmarks/baseline.json] [--threshold 0.25] [--save-baseline]
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from aria2_client import Aria2Client
+from fake_aria2 import FakeAria2Server
+from monitor import DownloadMonitor
+
+
+SECRET = "test123"
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+QUEUE_SIZES = (100, 1000, 10000, 50000)
+QUICK_QUEUE_SIZES = (100, 1000, 10000)
+
+
+def make_client(server, pool_size=4):
+    return Aria2Client(host=f"http://{server.host}", port=server.port, secret=SECRET, pool_size=pool_size)
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def bench_rpc_latency(calls: int, threads: int) -> Dict[str, float]:
+    """Задержка одиночных вызовов и пропускная способность"""
+    with FakeAria2Server(secret=SECRET) as server:
+        client = make_client(server, pool_size=threads)
+        try:
+            client.get_global_stats()  # прогрев соединения
+            latencies = []
+            started = time.perf_counter()
+            for _ in range(calls):
+                call_start = time.perf_counter()
+                client.get_global_stats()
+                latencies.append((time.perf_counter() - call_start) * 1000)
+            sequential = calls / (time.perf_counter() - started)
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                list(pool.map(lambda _: client.get_global_stats(), range(calls)))
+            concurrent = calls / (time.perf_counter() - started)
+        finally:
+            client.close()
+
+    return {
+        "rpc_latency_p50_ms": percentile(latencies, 50),
+        "rpc_latency_p95_ms": percentile(latencies, 95),
+        "rpc_latency_p99_ms": percentile(latencies, 99),
+        "rpc_calls_per_s": sequential,
+        f"rpc_calls_{threads}_threads_per_s": concurrent,
+    }
+
+
+def bench_queue_sizes(sizes, repeats: int = 3) -> Dict[str, float]:
+    """get_all_downloads: первая страница (limit=100) и весь список"""
+    results = {}
+    for size in sizes:
+        with FakeAria2Server(secret=SECRET, seed=size) as server:
+            server.populate(size, status="waiting")
+            client = make_client(server)
+            try:
+                for label, limit in (("page", 100), ("full", size)):
+                    times = []
+                    for _ in range(repeats):
+                        sent_before = server.bytes_sent
+                        started = time.perf_counter()
+                        downloads = client.get_all_downloads("list", limit=limit)
+                        times.append((time.perf_counter() - started) * 1000)
+                        payload = server.bytes_sent - sent_before
+                    assert len(downloads) == min(size, limit)
+                    results[f"get_all_downloads_{label}_{size}_ms"] = statistics.median(times)
+                    results[f"get_all_downloads_{label}_{size}_bytes"] = payload
+            finally:
+                client.close()
+    return results
+
+
+def bench_monitor(size: int, ticks: int) -> Dict[str, float]:
+    """CPU потока клиента на цикл монитора и память на загрузку"""
+    with FakeAria2Server(secret=SECRET, seed=1) as server:
+        server.global_options["max-concurrent-downloads"] = str(size)
+        server.populate(size, status="active", rate=(1000, 100_000), total_length=(1 << 30, 1 << 31))
+        client = make_client(server)
+        try:
+            monitor = DownloadMonitor(client, use_notifications=False, keys="list")
+
+            tracemalloc.start()
+            before = tracemalloc.take_snapshot()
+            monitor.tick()
+            after = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            retained = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+
+            cpu = []
+            for _ in range(ticks):
+                server.advance(1.0)
+                started = time.thread_time()
+                monitor.tick()
+                cpu.append((time.thread_time() - started) * 1000)
+        finally:
+            client.close()
+
+    return {
+        f"monitor_tick_cpu_{size}_ms": statistics.median(cpu),
+        "monitor_bytes_per_download": retained / size,
+    }
+
+
+def run(quick: bool) -> Dict[str, float]:
+    results = {}
+    results.update(bench_rpc_latency(calls=300 if quick else 2000, threads=4))
+    results.update(bench_queue_sizes(QUICK_QUEUE_SIZES if quick else QUEUE_SIZES))
+    results.update(bench_monitor(size=1000 if quick else 5000, ticks=5 if quick else 20))
+    return results
+
+
+def higher_is_better(metric: str) -> bool:
+    return metric.endswith("_per_s")
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], threshold: float) -> List[str]:
+    """Метрики, ухудшившиеся относительно эталона больше чем на threshold"""
+    regressions = []
+    for metric, value in results.items():
+        reference = baseline.get(metric)
+        if not reference:
+            continue
+        change = value / reference - 1
+        if higher_is_better(metric):
+            change = -change
+        if change > threshold:
+            regressions.append(f"{metric}: {reference:.4g} -> {value:.4g} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки клиента aria2 и мониторинга")
+    parser.add_argument("--quick", action="store_true", help="меньше повторов и очередь до 10 000")
+    parser.add_argument("--output", help="файл для результатов в JSON")
+    parser.add_argument("--baseline", help="эталон для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.25, help="допустимое ухудшение (0.25 = 25%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="записать результаты как эталон")
+    args = parser.parse_args()
+
+    results = run(args.quick)
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+
+    for metric, value in results.items():
+        print(f"{metric:45} {value:14.3f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline or DEFAULT_BASELINE, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        return 0
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["meta"].get("quick") != args.quick:
+            print("Внимание: эталон снят в другом режиме (--quick), сравниваются общие метрики")
+        regressions = compare(results, baseline["results"], args.threshold)
+        if regressions:
+            print("\nРегрессии относительно эталона:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\nРегрессий нет")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
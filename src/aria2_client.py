@@ -1,212 +1,205 @@
+import itertools
 import json
 import requests
-import subprocess
 import time
-import threading
-from typing import Dict, List, Optional, Callable, Any
+from typing import Dict, List, Optional, Callable, Any, Iterable, Iterator, Tuple, Union
 import os
 import signal
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import rpc_protocol as rpc
+from input_file import read_input_file
+from selection import (PAUSABLE_STATUSES, QUEUE_STATUSES, QUEUED_STATUSES, SELECTION_KEYS,
+                       STOPPED_STATUSES, UNPAUSABLE_STATUSES, Selection)
+from torrent_file import METALINK, TorrentFile, load_torrent
+from transport import HttpTransport
+from monitor import DownloadMonitor
+from history import DownloadHistory
+from daemon import StartupResult, ensure_daemon
 
 
 class Aria2Client:
     """Клиент для взаимодействия с aria2 через JSON-RPC"""
     
-    def __init__(self, host: str = "http://localhost", port: int = 6800, secret: str = "test123"):
+    def __init__(self, host: str = "http://localhost", port: int = 6800, secret: str = "test123",
+                 pool_size: int = 4, connect_timeout: float = 3.0, read_timeout: float = 10.0):
         self.host = host
         self.port = port
         self.secret = secret
         self.base_url = f"{host}:{port}/jsonrpc"
+        # Общий транспорт: keep-alive и пул соединений для всех методов клиента
+        self.transport = HttpTransport(
+            self.base_url,
+            pool_size=pool_size,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout
+        )
         self.aria2_process = None
         self.callbacks: Dict[str, List[Callable]] = {}
+        self.monitor: Optional[DownloadMonitor] = None
+        self.startup: Optional[StartupResult] = None
+    
+    @property
+    def websocket_url(self) -> str:
+        """Адрес WebSocket RPC того же демона"""
+        return self.base_url.replace("https://", "wss://", 1).replace("http://", "ws://", 1)
         
-    def start_aria2_daemon(self) -> bool:
-        """Запускает aria2c демон если он не запущен"""
-        # Сначала останавливаем любые запущенные процессы aria2c
-        self._kill_existing_aria2()
+    def start_aria2_daemon(self, session_file: Optional[str] = None) -> bool:
+        """Подключается к работающему aria2c или запускает новый демон
         
+        Уже запущенные процессы aria2c не трогаются. Итог и время запуска
+        сохраняются в self.startup. session_file - файл сессии нового демона.
+        """
+        self.startup = ensure_daemon(self.probe, self.port, self.secret, session_file=session_file)
+        elapsed_ms = self.startup.elapsed * 1000
+        if not self.startup.ok:
+            print(f"{self.startup.error} ({elapsed_ms:.0f} мс)")
+        elif self.startup.attached:
+            print(f"aria2 уже запущен и работает ({elapsed_ms:.0f} мс)")
+        else:
+            print(f"aria2 демон запущен: {self.startup.path} ({elapsed_ms:.0f} мс)")
+        return self.startup.ok
+    
+    def probe(self, timeout: float = 0.5) -> Optional[Dict]:
+        """Ответ aria2.getVersion или None, если на порту никто не отвечает"""
         try:
-            # Проверяем, запущен ли уже рабочий aria2 с токеном
-            test_payload = {
-                "jsonrpc": "2.0", 
-                "id": "test", 
-                "method": "aria2.getVersion",
-                "params": [f"token:{self.secret}"] if self.secret else []
-            }
-            response = requests.post(
-                self.base_url,
-                json=test_payload,
-                timeout=2
-            )
-            if response.status_code == 200:
-                result = response.json()
-                if "result" in result:
-                    print("aria2 уже запущен и работает")
-                    return True
-        except requests.exceptions.RequestException:
-            pass
-        
-        # Ищем aria2c - сначала в абсолютных путях
-        aria2_path = None
-        
-        # Список путей для поиска (начинаем с абсолютных путей)
-        search_paths = [
-            "/usr/bin/aria2c",
-            "/usr/local/bin/aria2c", 
-            "/bin/aria2c",
-            "aria2c"  # в PATH последним
-        ]
-        
-        for path in search_paths:
-            try:
-                if path.startswith("/"):
-                    # Абсолютный путь - проверяем существование и исполняемость
-                    if os.path.exists(path) and os.access(path, os.X_OK):
-                        # Тестируем запуск
-                        test_result = subprocess.run([path, "--version"], 
-                                                   capture_output=True, timeout=2)
-                        if test_result.returncode == 0:
-                            aria2_path = path
-                            break
-                else:
-                    # Относительный путь - используем which
-                    import shutil
-                    which_result = shutil.which(path)
-                    if which_result:
-                        test_result = subprocess.run([which_result, "--version"], 
-                                                   capture_output=True, timeout=2)
-                        if test_result.returncode == 0:
-                            aria2_path = which_result
-                            break
-            except (subprocess.TimeoutExpired, OSError, FileNotFoundError):
-                continue
-        
-        if not aria2_path:
-            print("Ошибка: aria2c не найден ни в одном из путей")
-            print(f"Проверенные пути: {search_paths}")
-            return False
-        
-        print(f"Найден aria2c: {aria2_path}")
+            return self.transport.post(rpc.build_request(self.secret, "getVersion"), timeout=timeout)
+        except requests.exceptions.HTTPError as e:
+            # Порт занят: aria2 с другим секретом отвечает 400
+            return {"error": str(e)}
+        except (requests.exceptions.RequestException, ValueError):
+            return None
+    
+    def _make_request(self, method: str, params: Optional[List[Any]] = None) -> Dict:
+        """Выполняет JSON-RPC запрос к aria2"""
+        payload = rpc.build_request(self.secret, method, params)
         
-        # Запускаем aria2c
         try:
-            cmd = [
-                aria2_path,
-                "--enable-rpc",
-                f"--rpc-listen-port={self.port}",
-                "--rpc-allow-origin-all",
-                "--rpc-listen-all",
-                f"--rpc-secret={self.secret}",
-                "--daemon=true",
-                "--continue=true",
-                "--max-connection-per-server=16",
-                "--min-split-size=1M",
-                "--split=16"
-            ]
-            
-            print(f"Запуск команды: {' '.join(cmd)}")
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-            
-            if result.returncode != 0:
-                print(f"Ошибка запуска aria2: {result.stderr}")
-                return False
-                
-            # Ждем запуска
-            for i in range(15):  # Увеличиваем время ожидания
-                try:
-                    test_payload = {
-                        "jsonrpc": "2.0", 
-                        "id": "test", 
-                        "method": "aria2.getVersion",
-                        "params": [f"token:{self.secret}"] if self.secret else []
-                    }
-                    response = requests.post(
-                        self.base_url,
-                        json=test_payload,
-                        timeout=2
-                    )
-                    if response.status_code == 200:
-                        print("aria2 демон успешно запущен")
-                        return True
-                except requests.exceptions.RequestException:
-                    time.sleep(0.5)
-            
-            print("Тайм-аут подключения к aria2")
-            return False
-            
+            return self.transport.post(payload)
         except Exception as e:
-            print(f"Ошибка запуска aria2: {e}")
-            return False
+            return {"error": str(e)}
+        finally:
+            if method in rpc.MUTATING_METHODS:
+                self._poke_monitor()
     
-    def _kill_existing_aria2(self):
-        """Останавливает все запущенные процессы aria2c"""
-        try:
-            import subprocess
-            # Находим и убиваем все процессы aria2c
-            subprocess.run(["killall", "aria2c"], 
-                         capture_output=True, timeout=5)
-            time.sleep(1)  # Даем время процессам остановиться
-        except Exception:
-            pass  # Игнорируем ошибки если процессы не найдены
+    def _poke_monitor(self):
+        """После команды пользователя мониторинг обновляется без ожидания интервала"""
+        if self.monitor:
+            self.monitor.poke()
     
-    def _make_request(self, method: str, params: Optional[List[Any]] = None) -> Dict:
-        """Выполняет JSON-RPC запрос к aria2"""
-        if params is None:
-            params = []
-            
-        if self.secret:
-            params.insert(0, f"token:{self.secret}")
+    def batch(self, calls: List[rpc.Call]) -> List[Dict]:
+        """Выполняет группу методов за один запрос через system.multicall
         
-        payload = {
-            "jsonrpc": "2.0",
-            "id": str(time.time()),
-            "method": f"aria2.{method}",
-            "params": params
-        }
+        calls - список пар (метод, параметры). Возвращает ответы в том же
+        порядке и в том же формате, что и _make_request: {"result": ...}
+        или {"error": ...} для каждого вызова.
+        """
+        if not calls:
+            return []
         
         try:
-            response = requests.post(self.base_url, json=payload, timeout=10)
-            response.raise_for_status()
-            return response.json()
+            response = self.transport.post(rpc.build_multicall(self.secret, calls))
         except Exception as e:
-            return {"error": str(e)}
+            return [{"error": str(e)} for _ in calls]
+        finally:
+            if any(method in rpc.MUTATING_METHODS for method, _ in calls):
+                self._poke_monitor()
+        
+        return rpc.parse_multicall(response, len(calls))
     
     def add_download(self, url: str, options: Optional[Dict] = None) -> Optional[str]:
         """Добавляет новую загрузку по URL"""
-        params = [[url]]  # URL должен быть в массиве
-        if options:
-            params.append(options)
+        result = self._make_request("addUri", rpc.uri_params(url, options))
+        return rpc.result_or(result, None)
+    
+    def bulk_add(self, items: Iterable[rpc.AddItem], chunk_size: int = 500,
+                 parallel: Optional[int] = None) -> Iterator[rpc.AddResult]:
+        """Массово добавляет загрузки группами через system.multicall
         
-        result = self._make_request("addUri", params)
-        if "result" in result:
-            return result["result"]
+        items - URL или пары (uris, options), например из read_input_file.
+        Элементы читаются лениво: в памяти не больше parallel групп по
+        chunk_size штук. Группы отправляются параллельно (по умолчанию по
+        числу соединений в пуле), результаты выдаются в исходном порядке -
+        по одному AddResult на элемент, с GID или ошибкой.
+        """
+        parallel = parallel or self.transport.pool_size
+        pending = deque()
+        
+        with ThreadPoolExecutor(max_workers=parallel) as pool:
+            start = 0
+            for chunk in rpc.chunked(items, chunk_size):
+                future = pool.submit(self.batch, rpc.add_uri_calls(chunk))
+                pending.append((start, chunk, future))
+                start += len(chunk)
+                
+                if len(pending) >= parallel:
+                    first, done_chunk, done = pending.popleft()
+                    yield from rpc.add_results(first, done_chunk, done.result())
+            
+            while pending:
+                first, done_chunk, done = pending.popleft()
+                yield from rpc.add_results(first, done_chunk, done.result())
+    
+    def bulk_add_file(self, path: str, chunk_size: int = 500,
+                      parallel: Optional[int] = None) -> Iterator[rpc.AddResult]:
+        """Добавляет загрузки из файла в формате input-file aria2"""
+        return self.bulk_add(read_input_file(path), chunk_size, parallel)
+    
+    def find_by_info_hash(self, info_hash: str) -> Optional[str]:
+        """GID загрузки в очереди (активной, ожидающей или на паузе) с таким info-hash"""
+        info_hash = info_hash.lower()
+        queued = Selection.of(status=QUEUED_STATUSES)
+        for download in self.select_downloads(queued, keys=["gid", "status", "infoHash"]):
+            if download.get("infoHash", "").lower() == info_hash:
+                return download["gid"]
         return None
     
-    def add_torrent(self, torrent_path: str, options: Optional[Dict] = None) -> Optional[str]:
-        """Добавляет новую загрузку из торрент файла"""
-        import base64
+    def add_torrent_file(self, torrent: TorrentFile, options: Optional[Dict] = None,
+                         dedupe: bool = True) -> List[str]:
+        """Отправляет файл, прочитанный load_torrent, через addTorrent или addMetalink
+        
+        Возвращает GID созданных загрузок (metalink может создать несколько).
+        При dedupe торрент, info-hash которого уже в очереди, не добавляется
+        повторно - возвращается GID существующей загрузки.
+        """
+        info = torrent.info
+        if dedupe and info.info_hash:
+            existing = self.find_by_info_hash(info.info_hash)
+            if existing:
+                print(f"Торрент уже в очереди: {info.name} ({existing})")
+                return [existing]
         
+        if info.kind == METALINK:
+            result = self._make_request("addMetalink", rpc.metalink_params(torrent.base64(), options))
+        else:
+            result = self._make_request("addTorrent", rpc.torrent_params(torrent.base64(), options))
+        
+        if "error" in result:
+            print(f"Ошибка aria2 при добавлении {info.kind}: {result['error']}")
+            return []
+        gids = result["result"]
+        return gids if isinstance(gids, list) else [gids]
+    
+    def add_torrent(self, torrent_path: str, options: Optional[Dict] = None,
+                    dedupe: bool = True) -> Optional[str]:
+        """Добавляет новую загрузку из торрент файла"""
         try:
-            # Читаем торрент файл и кодируем в base64
-            with open(torrent_path, 'rb') as f:
-                torrent_data = base64.b64encode(f.read()).decode('utf-8')
-            
-            # Правильный формат: aria2.addTorrent([secret], torrent, [uris], [options])
-            params = [torrent_data, []]  # Пустой массив URIs обязателен
-            if options:
-                params.append(options)
-            
-            result = self._make_request("addTorrent", params)
-            
-            if "result" in result:
-                return result["result"]
-            elif "error" in result:
-                print(f"Ошибка aria2 при добавлении торрента: {result['error']}")
-                return None
-            else:
-                return None
-        except Exception as e:
+            torrent = load_torrent(torrent_path)
+        except (OSError, ValueError) as e:
             print(f"Ошибка добавления торрента: {e}")
             return None
+        
+        gids = self.add_torrent_file(torrent, options, dedupe)
+        return gids[0] if gids else None
+    
+    def add_metalink(self, metalink_path: str, options: Optional[Dict] = None) -> List[str]:
+        """Добавляет загрузки из .metalink/.meta4 файла"""
+        try:
+            return self.add_torrent_file(load_torrent(metalink_path), options)
+        except (OSError, ValueError) as e:
+            print(f"Ошибка добавления metalink: {e}")
+            return []
     
     def pause_download(self, gid: str) -> bool:
         """Ставит загрузку на паузу"""
@@ -223,56 +216,251 @@ class Aria2Client:
         result = self._make_request("remove", [gid])
         return "result" in result
     
-    def get_download_status(self, gid: str) -> Dict:
-        """Получает статус загрузки"""
-        result = self._make_request("tellStatus", [gid])
+    def select_downloads(self, selection: Selection, chunk_size: int = 1000,
+                         keys: List[str] = SELECTION_KEYS) -> List[Dict]:
+        """Загрузки, подходящие под выборку
+        
+        Если заданы GID, запрашиваются только они. Иначе первые страницы
+        нужных очередей приходят одним multicall, а следующие страницы
+        запрашиваются, только если очередь длиннее chunk_size. keys должны
+        включать поля, по которым фильтрует выборка.
+        """
+        if selection.gids is not None:
+            downloads = self.get_statuses(sorted(selection.gids), keys).values()
+            return [download for download in downloads if selection.matches(download)]
+        
+        calls = [call for call in rpc.download_calls(keys, chunk_size)
+                 if selection.statuses is None or selection.statuses & QUEUE_STATUSES[call[0]]]
+        selected = []
+        for (method, _), response in zip(calls, self.batch(calls)):
+            page = rpc.result_or(response, [])
+            if method != "tellActive" and len(page) == chunk_size:
+                page = itertools.chain(page, self._iter_pages(method, chunk_size, keys,
+                                                              offset=chunk_size))
+            selected.extend(download for download in page if selection.matches(download))
+        return selected
+    
+    def _selected_gids(self, selection: Selection, statuses: frozenset) -> List[str]:
+        if not selection.needs_query:
+            return sorted(selection.gids)
+        return [d["gid"] for d in self.select_downloads(selection) if d["status"] in statuses]
+    
+    def _control_all(self, method: str) -> rpc.ControlResult:
+        result = self._make_request(method)
         if "result" in result:
-            return result["result"]
-        return {}
-    
-    def get_all_downloads(self) -> List[Dict]:
-        """Получает список всех загрузок"""
-        active = self._make_request("tellActive")
-        waiting = self._make_request("tellWaiting", [0, 100])
-        stopped = self._make_request("tellStopped", [0, 100])
+            return rpc.ControlResult(True, [], {})
+        return rpc.ControlResult(False, [], {method: result.get("error")})
+    
+    def _control_many(self, calls: List[rpc.Call]) -> rpc.ControlResult:
+        gids = [params[0] for _, params in calls]
+        return rpc.control_result(gids, self.batch(calls))
+    
+    def pause_downloads(self, gids: Optional[Iterable[str]] = None,
+                        status: Union[None, str, Iterable[str]] = None,
+                        directory: Optional[str] = None, pattern: Optional[str] = None,
+                        force: bool = False) -> rpc.ControlResult:
+        """Ставит на паузу выбранные загрузки одним запросом
+        
+        Выборка - по списку GID, статусу, папке и шаблону имени файла
+        (например "*.iso"). Без условий используется pauseAll; force -
+        forcePause без ожидания ответа трекеров и серверов.
+        """
+        selection = Selection.of(gids, status, directory, pattern)
+        if selection.is_everything:
+            return self._control_all("forcePauseAll" if force else "pauseAll")
+        method = "forcePause" if force else "pause"
+        return self._control_many([(method, [gid])
+                                   for gid in self._selected_gids(selection, PAUSABLE_STATUSES)])
+    
+    def unpause_downloads(self, gids: Optional[Iterable[str]] = None,
+                          status: Union[None, str, Iterable[str]] = None,
+                          directory: Optional[str] = None,
+                          pattern: Optional[str] = None) -> rpc.ControlResult:
+        """Возобновляет выбранные загрузки одним запросом; без условий - unpauseAll"""
+        selection = Selection.of(gids, status, directory, pattern)
+        if selection.is_everything:
+            return self._control_all("unpauseAll")
+        return self._control_many([("unpause", [gid])
+                                   for gid in self._selected_gids(selection, UNPAUSABLE_STATUSES)])
+    
+    def remove_downloads(self, gids: Optional[Iterable[str]] = None,
+                         status: Union[None, str, Iterable[str]] = None,
+                         directory: Optional[str] = None, pattern: Optional[str] = None,
+                         force: bool = False) -> rpc.ControlResult:
+        """Удаляет выбранные загрузки одним запросом
+        
+        Активные и ожидающие удаляются через remove (forceRemove при force),
+        завершённые - через removeDownloadResult. Выборка по всем
+        остановленным статусам сводится к purgeDownloadResult.
+        Хотя бы одно условие обязательно.
+        """
+        selection = Selection.of(gids, status, directory, pattern)
+        if selection.is_everything:
+            raise ValueError("Для удаления нужно указать хотя бы одно условие выборки")
+        if selection == Selection(statuses=STOPPED_STATUSES):
+            return self._control_all("purgeDownloadResult")
+        
+        method = "forceRemove" if force else "remove"
+        if selection.needs_query:
+            return self._control_many([
+                ("removeDownloadResult" if d["status"] in STOPPED_STATUSES else method, [d["gid"]])
+                for d in self.select_downloads(selection)
+            ])
+        
+        # Статусы неизвестны: остановленные загрузки remove отклонит,
+        # их результаты удаляются вторым запросом
+        result = self._control_many([(method, [gid]) for gid in sorted(selection.gids)])
+        if result.ok:
+            return result
+        retry = self._control_many([("removeDownloadResult", [gid]) for gid in result.errors])
+        errors = {gid: result.errors[gid] for gid in retry.errors}
+        return rpc.ControlResult(not errors, result.done + retry.done, errors)
+    
+    def purge_download_results(self) -> bool:
+        """Убирает из списка все завершённые, ошибочные и удалённые загрузки"""
+        return self._control_all("purgeDownloadResult").ok
+    
+    def get_download_status(self, gid: str, keys: rpc.Keys = None) -> Dict:
+        """Получает статус загрузки
         
-        downloads = []
-        for response in [active, waiting, stopped]:
-            if "result" in response:
-                downloads.extend(response["result"])
+        keys - имя проекции ("list", "detail", "full") или список полей;
+        по умолчанию aria2 возвращает полный объект статуса.
+        """
+        result = self._make_request("tellStatus", rpc.status_params(gid, keys))
+        return rpc.result_or(result, {})
+    
+    def get_statuses(self, gids: List[str], keys: rpc.Keys = None) -> Dict[str, Dict]:
+        """Получает статусы нескольких загрузок за один запрос"""
+        return rpc.collect_statuses(gids, self.batch(rpc.status_calls(gids, keys)))
+    
+    def get_all_downloads(self, keys: rpc.Keys = None, limit: int = 100) -> List[Dict]:
+        """Получает список всех загрузок
+        
+        Из очередей ожидания и остановленных берутся первые limit записей;
+        для больших очередей используйте iter_waiting/iter_stopped.
+        """
+        return rpc.collect_downloads(self.batch(rpc.download_calls(keys, limit)))
+    
+    def get_waiting_window(self, offset: int = 0, limit: int = 100,
+                           keys: rpc.Keys = None) -> List[Dict]:
+        """Получает окно очереди ожидания [offset, offset + limit)"""
+        method, params = rpc.window_call("tellWaiting", offset, limit, keys)
+        return rpc.result_or(self._make_request(method, params), [])
+    
+    def get_stopped_window(self, offset: int = 0, limit: int = 100,
+                           keys: rpc.Keys = None) -> List[Dict]:
+        """Получает окно остановленных загрузок [offset, offset + limit)"""
+        method, params = rpc.window_call("tellStopped", offset, limit, keys)
+        return rpc.result_or(self._make_request(method, params), [])
+    
+    def _iter_pages(self, method: str, chunk_size: int, keys: rpc.Keys,
+                    offset: int = 0) -> Iterator[Dict]:
+        while True:
+            page = rpc.result_or(self._make_request(*rpc.window_call(method, offset, chunk_size, keys)), [])
+            yield from page
+            if len(page) < chunk_size:
+                return
+            offset += chunk_size
+    
+    def iter_waiting(self, chunk_size: int = 1000, keys: rpc.Keys = None) -> Iterator[Dict]:
+        """Лениво перебирает всю очередь ожидания страницами по chunk_size
         
-        return downloads
+        Очередь может меняться между страницами, поэтому при активном
+        изменении отдельные записи могут повториться или быть пропущены.
+        """
+        return self._iter_pages("tellWaiting", chunk_size, keys)
+    
+    def iter_stopped(self, chunk_size: int = 1000, keys: rpc.Keys = None) -> Iterator[Dict]:
+        """Лениво перебирает все остановленные загрузки страницами по chunk_size"""
+        return self._iter_pages("tellStopped", chunk_size, keys)
+    
+    def iter_all_downloads(self, chunk_size: int = 1000, keys: rpc.Keys = None) -> Iterator[Dict]:
+        """Лениво перебирает активные, ожидающие и остановленные загрузки"""
+        method, params = rpc.active_call(keys)
+        yield from rpc.result_or(self._make_request(method, params), [])
+        yield from self.iter_waiting(chunk_size, keys)
+        yield from self.iter_stopped(chunk_size, keys)
+    
+    def get_snapshot(self, keys: rpc.Keys = None, limit: Optional[int] = 100,
+                     chunk_size: int = 1000) -> Tuple[List[Dict], Dict]:
+        """Получает список загрузок и глобальную статистику одним запросом
+        
+        Все ответы формируются aria2 в рамках одного запроса, поэтому
+        снимок согласован между очередями. Из очередей ожидания и
+        остановленных берутся первые limit записей. limit=None - очереди
+        целиком: первые страницы по chunk_size приходят в том же запросе,
+        а длинные очереди дочитываются по плану rpc.snapshot_pages (между
+        запросами очередь может сдвинуться).
+        """
+        calls = rpc.snapshot_calls(keys, chunk_size if limit is None else limit)
+        responses = self.batch(calls)
+        downloads = rpc.collect_downloads(responses[:-1])
+        if limit is None:
+            for pages in rpc.snapshot_pages(calls, responses, keys, chunk_size):
+                downloads.extend(rpc.collect_downloads(self.batch(pages)))
+        return downloads, rpc.result_or(responses[-1], {})
     
     def get_global_stats(self) -> Dict:
         """Получает глобальную статистику"""
         result = self._make_request("getGlobalStat")
-        if "result" in result:
-            return result["result"]
-        return {}
+        return rpc.result_or(result, {})
+    
+    def get_global_options(self) -> Dict:
+        """Получает глобальные настройки демона (max-concurrent-downloads и др.)"""
+        result = self._make_request("getGlobalOption")
+        return rpc.result_or(result, {})
+    
+    def save_session(self) -> bool:
+        """Просит aria2 записать очередь в файл --save-session"""
+        result = self._make_request("saveSession")
+        return "result" in result
     
     def shutdown(self) -> bool:
         """Завершает работу aria2"""
         result = self._make_request("shutdown")
         return "result" in result
     
+    def close(self):
+        """Закрывает соединения с aria2"""
+        self.transport.close()
+    
     def register_callback(self, event: str, callback: Callable):
         """Регистрирует callback для событий"""
         if event not in self.callbacks:
             self.callbacks[event] = []
         self.callbacks[event].append(callback)
     
-    def start_monitoring(self):
-        """Запускает мониторинг загрузок в отдельном потоке"""
-        def monitor():
-            while True:
-                try:
-                    downloads = self.get_all_downloads()
-                    for callback in self.callbacks.get("downloads_updated", []):
-                        callback(downloads)
-                    time.sleep(1)
-                except Exception as e:
-                    print(f"Ошибка мониторинга: {e}")
-                    time.sleep(5)
+    def _emit(self, event: str, *args):
+        """Вызывает все callbacks, зарегистрированные на событие"""
+        for callback in self.callbacks.get(event, []):
+            callback(*args)
+    
+    def start_monitoring(self, use_notifications: bool = True, poll_interval: float = 1.0,
+                         idle_interval: float = 15.0, keys: rpc.Keys = None,
+                         history: Optional[DownloadHistory] = None) -> DownloadMonitor:
+        """Запускает мониторинг загрузок в отдельном потоке
         
-        thread = threading.Thread(target=monitor, daemon=True)
-        thread.start()
\ No newline at end of file
+        При use_notifications подписывается на WebSocket уведомления aria2
+        (onDownloadStart, onDownloadPause, onDownloadComplete, ...) и
+        перезапрашивает только упомянутые в них загрузки. Если WebSocket
+        недоступен, мониторинг опрашивает aria2 раз в poll_interval.
+        keys ограничивает поля статусов, например "list" для списка в GUI.
+        history (DownloadHistory) сохраняет завершённые загрузки между
+        перезапусками aria2.
+        """
+        self.monitor = DownloadMonitor(
+            self,
+            poll_interval=poll_interval,
+            idle_interval=idle_interval,
+            use_notifications=use_notifications,
+            keys=keys,
+            history=history
+        )
+        self.monitor.start()
+        return self.monitor
+    
+    def stop_monitoring(self):
+        """Останавливает мониторинг"""
+        if self.monitor:
+            self.monitor.stop()
+            self.monitor = None
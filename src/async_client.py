@@ -0,0 +1,300 @@
+"""
+Асинхронный клиент aria2 для asyncio
+"""
+
+import asyncio
+import json
+from collections import deque
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+import rpc_protocol as rpc
+from async_transport import AsyncHttpTransport
+from torrent_file import METALINK, TorrentFile, load_torrent
+from websocket_transport import (OP_CLOSE, OP_PING, OP_PONG, WebSocketError,
+                                 check_handshake_response, encode_frame,
+                                 handshake_request, notification_gids,
+                                 read_frame_async, websocket_endpoint)
+
+
+class AsyncAria2Client:
+    """Асинхронный аналог Aria2Client с теми же методами
+
+    Один экземпляр можно безопасно использовать из множества задач одного
+    цикла событий: запросы идут через общий пул keep-alive соединений.
+    """
+
+    def __init__(self, host: str = "http://localhost", port: int = 6800, secret: str = "test123",
+                 pool_size: int = 16, connect_timeout: float = 3.0, read_timeout: float = 10.0):
+        self.host = host
+        self.port = port
+        self.secret = secret
+        self.base_url = f"{host}:{port}/jsonrpc"
+        self.transport = AsyncHttpTransport(
+            self.base_url,
+            pool_size=pool_size,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout
+        )
+
+    @property
+    def websocket_url(self) -> str:
+        """Адрес WebSocket RPC того же демона"""
+        return self.base_url.replace("https://", "wss://", 1).replace("http://", "ws://", 1)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _make_request(self, method: str, params: Optional[List] = None) -> Dict:
+        """Выполняет JSON-RPC запрос к aria2"""
+        try:
+            return await self.transport.post(rpc.build_request(self.secret, method, params))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return {"error": str(e) or type(e).__name__}
+
+    async def batch(self, calls: List[rpc.Call]) -> List[Dict]:
+        """Выполняет группу методов за один запрос через system.multicall"""
+        if not calls:
+            return []
+
+        try:
+            response = await self.transport.post(rpc.build_multicall(self.secret, calls))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return [{"error": str(e) or type(e).__name__} for _ in calls]
+
+        return rpc.parse_multicall(response, len(calls))
+
+    async def add_download(self, url: str, options: Optional[Dict] = None) -> Optional[str]:
+        """Добавляет новую загрузку по URL"""
+        result = await self._make_request("addUri", rpc.uri_params(url, options))
+        return rpc.result_or(result, None)
+
+    async def bulk_add(self, items: Iterable[rpc.AddItem], chunk_size: int = 500,
+                       parallel: Optional[int] = None) -> AsyncIterator[rpc.AddResult]:
+        """Массово добавляет загрузки группами, см. Aria2Client.bulk_add"""
+        parallel = parallel or self.transport.pool_size
+        pending = deque()
+        try:
+            start = 0
+            for chunk in rpc.chunked(items, chunk_size):
+                task = asyncio.ensure_future(self.batch(rpc.add_uri_calls(chunk)))
+                pending.append((start, chunk, task))
+                start += len(chunk)
+
+                if len(pending) >= parallel:
+                    first, done_chunk, done = pending.popleft()
+                    for result in rpc.add_results(first, done_chunk, await done):
+                        yield result
+
+            while pending:
+                first, done_chunk, done = pending.popleft()
+                for result in rpc.add_results(first, done_chunk, await done):
+                    yield result
+        finally:
+            for _, _, task in pending:
+                task.cancel()
+
+    async def find_by_info_hash(self, info_hash: str) -> Optional[str]:
+        """GID загрузки в очереди с таким info-hash"""
+        info_hash = info_hash.lower()
+        keys = ["gid", "infoHash"]
+        for download in rpc.result_or(await self._make_request(*rpc.active_call(keys)), []):
+            if download.get("infoHash", "").lower() == info_hash:
+                return download["gid"]
+        async for download in self.iter_waiting(keys=keys):
+            if download.get("infoHash", "").lower() == info_hash:
+                return download["gid"]
+        return None
+
+    async def add_torrent_file(self, torrent: TorrentFile, options: Optional[Dict] = None,
+                               dedupe: bool = True) -> List[str]:
+        """Отправляет файл, прочитанный load_torrent, см. Aria2Client.add_torrent_file"""
+        info = torrent.info
+        if dedupe and info.info_hash:
+            existing = await self.find_by_info_hash(info.info_hash)
+            if existing:
+                print(f"Торрент уже в очереди: {info.name} ({existing})")
+                return [existing]
+
+        if info.kind == METALINK:
+            result = await self._make_request("addMetalink", rpc.metalink_params(torrent.base64(), options))
+        else:
+            result = await self._make_request("addTorrent", rpc.torrent_params(torrent.base64(), options))
+
+        if "error" in result:
+            print(f"Ошибка aria2 при добавлении {info.kind}: {result['error']}")
+            return []
+        gids = result["result"]
+        return gids if isinstance(gids, list) else [gids]
+
+    async def add_torrent(self, torrent_path: str, options: Optional[Dict] = None,
+                          dedupe: bool = True) -> Optional[str]:
+        """Добавляет новую загрузку из торрент файла"""
+        torrent = await self._load_torrent(torrent_path)
+        if torrent is None:
+            return None
+        gids = await self.add_torrent_file(torrent, options, dedupe)
+        return gids[0] if gids else None
+
+    async def add_metalink(self, metalink_path: str, options: Optional[Dict] = None) -> List[str]:
+        """Добавляет загрузки из .metalink/.meta4 файла"""
+        torrent = await self._load_torrent(metalink_path)
+        if torrent is None:
+            return []
+        return await self.add_torrent_file(torrent, options)
+
+    @staticmethod
+    async def _load_torrent(path: str) -> Optional[TorrentFile]:
+        loop = asyncio.get_running_loop()
+        try:
+            # Чтение и разбор файла не должны блокировать цикл событий
+            return await loop.run_in_executor(None, load_torrent, path)
+        except (OSError, ValueError) as e:
+            print(f"Ошибка чтения {path}: {e}")
+            return None
+
+    async def pause_download(self, gid: str) -> bool:
+        """Ставит загрузку на паузу"""
+        return "result" in await self._make_request("pause", [gid])
+
+    async def unpause_download(self, gid: str) -> bool:
+        """Возобновляет загрузку"""
+        return "result" in await self._make_request("unpause", [gid])
+
+    async def remove_download(self, gid: str) -> bool:
+        """Удаляет загрузку"""
+        return "result" in await self._make_request("remove", [gid])
+
+    async def get_download_status(self, gid: str, keys: rpc.Keys = None) -> Dict:
+        """Получает статус загрузки; keys - имя проекции или список полей"""
+        result = await self._make_request("tellStatus", rpc.status_params(gid, keys))
+        return rpc.result_or(result, {})
+
+    async def get_statuses(self, gids: List[str], keys: rpc.Keys = None) -> Dict[str, Dict]:
+        """Получает статусы нескольких загрузок за один запрос"""
+        return rpc.collect_statuses(gids, await self.batch(rpc.status_calls(gids, keys)))
+
+    async def get_all_downloads(self, keys: rpc.Keys = None, limit: int = 100) -> List[Dict]:
+        """Получает список всех загрузок (не больше limit из каждой очереди)"""
+        return rpc.collect_downloads(await self.batch(rpc.download_calls(keys, limit)))
+
+    async def get_waiting_window(self, offset: int = 0, limit: int = 100,
+                                 keys: rpc.Keys = None) -> List[Dict]:
+        """Получает окно очереди ожидания [offset, offset + limit)"""
+        method, params = rpc.window_call("tellWaiting", offset, limit, keys)
+        return rpc.result_or(await self._make_request(method, params), [])
+
+    async def get_stopped_window(self, offset: int = 0, limit: int = 100,
+                                 keys: rpc.Keys = None) -> List[Dict]:
+        """Получает окно остановленных загрузок [offset, offset + limit)"""
+        method, params = rpc.window_call("tellStopped", offset, limit, keys)
+        return rpc.result_or(await self._make_request(method, params), [])
+
+    async def _iter_pages(self, method: str, chunk_size: int,
+                          keys: rpc.Keys) -> AsyncIterator[Dict]:
+        offset = 0
+        while True:
+            response = await self._make_request(*rpc.window_call(method, offset, chunk_size, keys))
+            page = rpc.result_or(response, [])
+            for download in page:
+                yield download
+            if len(page) < chunk_size:
+                return
+            offset += chunk_size
+
+    def iter_waiting(self, chunk_size: int = 1000, keys: rpc.Keys = None) -> AsyncIterator[Dict]:
+        """Асинхронно перебирает всю очередь ожидания страницами по chunk_size"""
+        return self._iter_pages("tellWaiting", chunk_size, keys)
+
+    def iter_stopped(self, chunk_size: int = 1000, keys: rpc.Keys = None) -> AsyncIterator[Dict]:
+        """Асинхронно перебирает все остановленные загрузки страницами по chunk_size"""
+        return self._iter_pages("tellStopped", chunk_size, keys)
+
+    async def get_snapshot(self, keys: rpc.Keys = None, limit: Optional[int] = 100,
+                           chunk_size: int = 1000) -> Tuple[List[Dict], Dict]:
+        """Получает список загрузок и глобальную статистику одним запросом
+
+        limit=None - очереди целиком, как у Aria2Client.get_snapshot.
+        """
+        calls = rpc.snapshot_calls(keys, chunk_size if limit is None else limit)
+        responses = await self.batch(calls)
+        downloads = rpc.collect_downloads(responses[:-1])
+        if limit is None:
+            for pages in rpc.snapshot_pages(calls, responses, keys, chunk_size):
+                downloads.extend(rpc.collect_downloads(await self.batch(pages)))
+        return downloads, rpc.result_or(responses[-1], {})
+
+    async def get_global_stats(self) -> Dict:
+        """Получает глобальную статистику"""
+        return rpc.result_or(await self._make_request("getGlobalStat"), {})
+
+    async def get_global_options(self) -> Dict:
+        """Получает глобальные настройки демона"""
+        return rpc.result_or(await self._make_request("getGlobalOption"), {})
+
+    async def save_session(self) -> bool:
+        """Просит aria2 записать очередь в файл --save-session"""
+        return "result" in await self._make_request("saveSession")
+
+    async def shutdown(self) -> bool:
+        """Завершает работу aria2"""
+        return "result" in await self._make_request("shutdown")
+
+    async def events(self, reconnect_delay: float = 1.0,
+                     max_reconnect_delay: float = 30.0) -> AsyncIterator[Tuple[str, str]]:
+        """Поток уведомлений aria2: пары (событие, GID), например ("onDownloadComplete", gid)
+
+        При обрыве WebSocket переподключается с экспоненциальной задержкой.
+        """
+        host, port, path, context = websocket_endpoint(self.websocket_url)
+        delay = reconnect_delay
+
+        while True:
+            writer = None
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(host, port, ssl=context),
+                    timeout=self.transport.connect_timeout
+                )
+                request, key = handshake_request(host, port, path)
+                writer.write(request)
+                check_handshake_response((await reader.readuntil(b"\r\n\r\n"))[:-4], key)
+                delay = reconnect_delay
+
+                parts: List[bytes] = []
+                while True:
+                    fin, opcode, payload = await read_frame_async(reader.readexactly)
+                    if opcode == OP_PING:
+                        writer.write(encode_frame(OP_PONG, payload))
+                        continue
+                    if opcode == OP_CLOSE:
+                        raise WebSocketError("Сервер закрыл соединение")
+                    if opcode == OP_PONG:
+                        continue
+                    parts.append(payload)
+                    if not fin:
+                        continue
+                    message = json.loads(b"".join(parts).decode("utf-8"))
+                    parts = []
+                    method, gids = notification_gids(message)
+                    for gid in gids:
+                        yield method.split(".", 1)[-1], gid
+            except (OSError, WebSocketError, ValueError, asyncio.IncompleteReadError,
+                    asyncio.TimeoutError):
+                pass
+            finally:
+                if writer is not None:
+                    writer.close()
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, max_reconnect_delay)
+
+    async def close(self):
+        """Закрывает соединения с aria2"""
+        await self.transport.close()
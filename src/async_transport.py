@@ -0,0 +1,154 @@
+"""
+Асинхронный HTTP транспорт для JSON-RPC запросов к aria2 (asyncio, без внешних зависимостей)
+"""
+
+import asyncio
+import json
+import ssl
+from typing import Any, List, Optional, Tuple
+from urllib.parse import urlparse
+
+
+class AsyncTransportError(Exception):
+    """Ошибка HTTP обмена с aria2"""
+
+
+class _Connection:
+    """Одно keep-alive соединение"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    def close(self):
+        self.writer.close()
+
+
+class AsyncHttpTransport:
+    """Пул keep-alive соединений; параллельных запросов не больше pool_size
+
+    Поддерживаются http:// и https:// (aria2 с --rpc-secure).
+    """
+
+    def __init__(self, url: str, pool_size: int = 16, connect_timeout: float = 3.0,
+                 read_timeout: float = 10.0):
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https"):
+            raise ValueError(f"Неподдерживаемая схема адреса aria2: {url}")
+        self.url = url
+        self.host = parsed.hostname or "localhost"
+        self.ssl = ssl.create_default_context() if parsed.scheme == "https" else None
+        self.port = parsed.port or (443 if self.ssl else 80)
+        self.path = parsed.path or "/"
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._idle: List[_Connection] = []
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def _open(self) -> _Connection:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=self.ssl),
+            timeout=self.connect_timeout
+        )
+        return _Connection(reader, writer)
+
+    async def _acquire(self) -> Tuple[_Connection, bool]:
+        """Соединение из пула или новое; второй элемент - взято ли оно из пула"""
+        while self._idle:
+            connection = self._idle.pop()
+            # aria2 закрывает простаивающие соединения - такие не переиспользуем
+            if not connection.reader.at_eof():
+                return connection, True
+            connection.close()
+        return await self._open(), False
+
+    async def _exchange(self, connection: _Connection, request: bytes,
+                        timeout: Optional[float]) -> Tuple[int, bool, bytes]:
+        connection.writer.write(request)
+        return await asyncio.wait_for(
+            self._read_response(connection.reader),
+            timeout=self.read_timeout if timeout is None else timeout
+        )
+
+    async def post(self, payload: Any, timeout: Optional[float] = None) -> Any:
+        """Отправляет JSON-RPC payload и возвращает разобранный JSON ответа
+
+        Если соединение из пула оказалось закрыто сервером до ответа,
+        запрос один раз повторяется на новом соединении.
+        """
+        if self._semaphore is None:
+            # Семафор создаётся внутри работающего цикла событий
+            self._semaphore = asyncio.Semaphore(self.pool_size)
+
+        body = json.dumps(payload).encode("utf-8")
+        request = (
+            f"POST {self.path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: keep-alive\r\n"
+            "\r\n"
+        ).encode("ascii") + body
+
+        async with self._semaphore:
+            connection, reused = await self._acquire()
+            try:
+                try:
+                    status, keep_alive, data = await self._exchange(connection, request, timeout)
+                except (ConnectionError, asyncio.IncompleteReadError) as e:
+                    # Повтор безопасен, только если от сервера не пришло ни байта ответа
+                    if not reused or getattr(e, "partial", b""):
+                        raise
+                    connection.close()
+                    connection = await self._open()
+                    status, keep_alive, data = await self._exchange(connection, request, timeout)
+            except BaseException:
+                connection.close()
+                raise
+
+            if keep_alive:
+                self._idle.append(connection)
+            else:
+                connection.close()
+
+        if status != 200:
+            raise AsyncTransportError(f"{status} Error for url: {self.url}")
+        return json.loads(data)
+
+    @staticmethod
+    async def _read_response(reader: asyncio.StreamReader) -> Tuple[int, bool, bytes]:
+        head = await reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        status = int(lines[0].split()[1])
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            if name:
+                headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            data = bytearray()
+            while True:
+                size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                if size == 0:
+                    await reader.readuntil(b"\r\n")
+                    break
+                data += await reader.readexactly(size)
+                await reader.readexactly(2)
+            data = bytes(data)
+        else:
+            data = await reader.readexactly(int(headers.get("content-length", 0)))
+
+        keep_alive = headers.get("connection", "").lower() != "close"
+        return status, keep_alive, data
+
+    async def close(self):
+        """Закрывает все простаивающие соединения"""
+        idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+            try:
+                await connection.writer.wait_closed()
+            except OSError:
+                pass
@@ -0,0 +1,125 @@
+"""
+Разбор bencode (формат .torrent файлов)
+
+Декодер идёт по индексам в исходном буфере без промежуточной разбивки
+на токены и запоминает границы словаря info - по ним считается info-hash.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class BencodeError(ValueError):
+    """Повреждённые или не bencode данные"""
+
+
+_DIGITS = b"0123456789"
+
+
+class _Decoder:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.info_span: Optional[Tuple[int, int]] = None
+
+    def decode(self, pos: int, depth: int = 0) -> Tuple[Any, int]:
+        data = self.data
+        try:
+            token = data[pos]
+        except IndexError:
+            raise BencodeError(f"Неожиданный конец данных на позиции {pos}") from None
+
+        if token == 0x69:  # i<число>e
+            end = data.index(b"e", pos)
+            try:
+                return int(data[pos + 1:end]), end + 1
+            except ValueError:
+                raise BencodeError(f"Некорректное число на позиции {pos}") from None
+
+        if token == 0x6c:  # l<элементы>e
+            items: List[Any] = []
+            pos += 1
+            while data[pos] != 0x65:
+                item, pos = self.decode(pos, depth + 1)
+                items.append(item)
+            return items, pos + 1
+
+        if token == 0x64:  # d<ключ><значение>e
+            result: Dict[bytes, Any] = {}
+            pos += 1
+            while data[pos] != 0x65:
+                key, pos = self._string(pos)
+                start = pos
+                result[key], pos = self.decode(pos, depth + 1)
+                if depth == 0 and key == b"info":
+                    self.info_span = (start, pos)
+            return result, pos + 1
+
+        if token in _DIGITS:
+            return self._string(pos)
+
+        raise BencodeError(f"Неизвестный тип {chr(token)!r} на позиции {pos}")
+
+    def _string(self, pos: int) -> Tuple[bytes, int]:
+        colon = self.data.find(b":", pos)
+        if colon < 0:
+            raise BencodeError(f"Нет длины строки на позиции {pos}")
+        try:
+            length = int(self.data[pos:colon])
+        except ValueError:
+            raise BencodeError(f"Некорректная длина строки на позиции {pos}") from None
+        end = colon + 1 + length
+        if length < 0 or end > len(self.data):
+            raise BencodeError(f"Строка на позиции {pos} выходит за конец данных")
+        return self.data[colon + 1:end], end
+
+
+def decode(data: bytes) -> Any:
+    """Декодирует bencode; строки возвращаются как bytes"""
+    value, _ = decode_with_info_span(data)
+    return value
+
+
+def decode_with_info_span(data: bytes) -> Tuple[Any, Optional[Tuple[int, int]]]:
+    """Декодирует bencode и возвращает границы значения info верхнего словаря"""
+    decoder = _Decoder(data)
+    try:
+        value, end = decoder.decode(0)
+    except BencodeError:
+        raise
+    except (IndexError, ValueError, RecursionError):
+        raise BencodeError("Повреждённые данные bencode") from None
+    if end != len(data):
+        raise BencodeError(f"Лишние данные после позиции {end}")
+    return value, decoder.info_span
+
+
+def encode(value: Any) -> bytes:
+    """Кодирует значение в bencode (ключи словарей сортируются)"""
+    parts: List[bytes] = []
+    _encode(value, parts)
+    return b"".join(parts)
+
+
+def _encode(value: Any, parts: List[bytes]):
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(value, int):
+        parts.append(b"i%de" % value)
+    elif isinstance(value, (bytes, str)):
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        parts.append(b"%d:" % len(value))
+        parts.append(value)
+    elif isinstance(value, (list, tuple)):
+        parts.append(b"l")
+        for item in value:
+            _encode(item, parts)
+        parts.append(b"e")
+    elif isinstance(value, dict):
+        parts.append(b"d")
+        items = [(k.encode("utf-8") if isinstance(k, str) else k, v) for k, v in value.items()]
+        for key, item in sorted(items):
+            _encode(key, parts)
+            _encode(item, parts)
+        parts.append(b"e")
+    else:
+        raise TypeError(f"Тип {type(value).__name__} нельзя закодировать в bencode")
@@ -0,0 +1,134 @@
+"""
+Поиск aria2c и подключение к демону или его запуск
+"""
+
+import os
+import shutil
+import subprocess
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+# Стандартные расположения проверяются раньше PATH
+SEARCH_PATHS = ("/usr/bin/aria2c", "/usr/local/bin/aria2c", "/bin/aria2c")
+
+
+class StartupResult(NamedTuple):
+    """Итог start_aria2_daemon
+
+    attached - подключились к уже работающему демону; elapsed - время от
+    начала проверки до готовности в секундах.
+    """
+    ok: bool
+    attached: bool
+    path: Optional[str]
+    elapsed: float
+    error: Optional[str]
+
+
+# Найденный путь к aria2c; неудачный поиск не кэшируется
+_aria2c_path: Optional[str] = None
+
+
+def find_aria2c() -> Optional[str]:
+    """Путь к исполняемому aria2c или None
+
+    Проверяются существование и права на запуск, без вызова aria2c --version.
+    Найденный путь кэшируется на время жизни процесса и общий для app.py,
+    utils и клиента; если aria2c не найден, следующий вызов ищет заново
+    (его могли установить, пока приложение работает).
+    """
+    global _aria2c_path
+    if _aria2c_path and os.access(_aria2c_path, os.X_OK):
+        return _aria2c_path
+    candidates = list(SEARCH_PATHS)
+    in_path = shutil.which("aria2c")
+    if in_path:
+        candidates.append(in_path)
+    for path in candidates:
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            _aria2c_path = path
+            return path
+    return None
+
+
+def daemon_command(path: str, port: int, secret: Optional[str],
+                   session_file: Optional[str] = None) -> List[str]:
+    """Командная строка запуска aria2c в режиме демона с RPC
+
+    session_file - файл сессии: незавершённые загрузки сохраняются в него
+    и восстанавливаются при следующем запуске.
+    """
+    cmd = [
+        path,
+        "--enable-rpc",
+        f"--rpc-listen-port={port}",
+        "--rpc-allow-origin-all",
+        "--rpc-listen-all",
+        "--daemon=true",
+        "--continue=true",
+        "--max-connection-per-server=16",
+        "--min-split-size=1M",
+        "--split=16"
+    ]
+    if secret:
+        cmd.insert(5, f"--rpc-secret={secret}")
+    if session_file:
+        cmd += [f"--save-session={session_file}", "--save-session-interval=60"]
+        if os.path.exists(session_file):
+            cmd.append(f"--input-file={session_file}")
+    return cmd
+
+
+def wait_until_ready(is_ready: Callable[[], bool], timeout: float = 5.0,
+                     initial_delay: float = 0.01, max_delay: float = 0.25) -> bool:
+    """Опрашивает is_ready с экспоненциально растущей паузой до timeout секунд"""
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    while True:
+        if is_ready():
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, max_delay)
+
+
+def ensure_daemon(probe: Callable[[], Optional[Dict]], port: int, secret: Optional[str],
+                  ready_timeout: float = 5.0, session_file: Optional[str] = None) -> StartupResult:
+    """Подключается к демону на port или запускает новый
+
+    probe возвращает ответ aria2.getVersion или None, если порт не отвечает.
+    Работающие процессы aria2c никогда не останавливаются: если на порту
+    отвечает демон с другим секретом, возвращается ошибка.
+    """
+    start = time.perf_counter()
+
+    def result(ok, attached, path=None, error=None):
+        return StartupResult(ok, attached, path, time.perf_counter() - start, error)
+
+    response = probe()
+    if response is not None:
+        if "result" in response:
+            return result(True, True)
+        return result(False, False, error=f"Порт {port} занят, aria2 отклонил запрос: {response.get('error')}")
+
+    path = find_aria2c()
+    if not path:
+        return result(False, False, error=f"aria2c не найден (проверены {', '.join(SEARCH_PATHS)} и PATH)")
+
+    try:
+        completed = subprocess.run(daemon_command(path, port, secret, session_file),
+                                   capture_output=True, text=True, timeout=10)
+    except (subprocess.TimeoutExpired, OSError) as e:
+        return result(False, False, path, f"Ошибка запуска aria2: {e}")
+    if completed.returncode != 0:
+        return result(False, False, path, f"Ошибка запуска aria2: {completed.stderr.strip()}")
+
+    def is_ready():
+        response = probe()
+        return response is not None and "result" in response
+
+    if not wait_until_ready(is_ready, ready_timeout):
+        return result(False, False, path, "Тайм-аут подключения к aria2")
+    return result(True, False, path)
@@ -0,0 +1,69 @@
+"""
+Вычисление изменений между снимками списка загрузок
+"""
+
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+ADDED = "added"
+REMOVED = "removed"
+STATUS_CHANGED = "status_changed"
+PROGRESS = "progress"
+
+
+class DownloadDelta(NamedTuple):
+    """Изменение одной загрузки
+
+    changes содержит только изменившиеся поля; для ADDED - весь объект
+    статуса, для REMOVED - пустой словарь.
+    """
+    kind: str
+    gid: str
+    changes: Dict[str, Any]
+
+
+class SnapshotDiffer:
+    """Хранит предыдущий снимок по GID и выдаёт типизированные изменения"""
+
+    def __init__(self):
+        self.previous: Dict[str, Dict] = {}
+
+    def diff(self, downloads: Iterable[Dict], complete: bool = True) -> List[DownloadDelta]:
+        """Сравнивает загрузки с предыдущим состоянием
+
+        complete=True означает, что downloads - полный список, и отсутствующие
+        в нём GID считаются удалёнными. Для частичных обновлений (например,
+        только GID из уведомлений) передавайте complete=False.
+        """
+        deltas: List[DownloadDelta] = []
+        seen = set()
+        previous = self.previous
+
+        for download in downloads:
+            gid = download.get("gid")
+            if gid is None:
+                continue
+            seen.add(gid)
+            old = previous.get(gid)
+            previous[gid] = download
+
+            if old is None:
+                deltas.append(DownloadDelta(ADDED, gid, download))
+                continue
+
+            changes = {key: value for key, value in download.items() if old.get(key) != value}
+            if not changes:
+                continue
+            kind = STATUS_CHANGED if "status" in changes else PROGRESS
+            deltas.append(DownloadDelta(kind, gid, changes))
+
+        if complete:
+            for gid in [gid for gid in previous if gid not in seen]:
+                deltas.append(self.forget(gid))
+
+        return deltas
+
+    def forget(self, gid: str) -> Optional[DownloadDelta]:
+        """Удаляет GID из снимка и возвращает событие REMOVED"""
+        if self.previous.pop(gid, None) is None:
+            return None
+        return DownloadDelta(REMOVED, gid, {})
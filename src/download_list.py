@@ -0,0 +1,140 @@
+"""
+Список загрузок на ttk.Treeview с точечным обновлением строк
+"""
+
+import tkinter as tk
+from tkinter import ttk
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils import format_size, format_speed, format_time
+
+# (идентификатор, заголовок, ширина)
+COLUMNS = (
+    ("name", "Файл", 320),
+    ("status", "Статус", 110),
+    ("progress", "Прогресс", 80),
+    ("size", "Размер", 170),
+    ("speed", "Скорость", 100),
+    ("eta", "Осталось", 90),
+)
+
+STATUS_LABELS = {
+    "active": "🔄 ACTIVE",
+    "waiting": "⏳ WAITING",
+    "paused": "⏸️ PAUSED",
+    "complete": "✅ COMPLETE",
+    "error": "❌ ERROR",
+    "removed": "🗑️ REMOVED",
+}
+
+
+def format_eta(record, eta: Optional[float]) -> str:
+    """Оставшееся время по сглаженной оценке EtaEstimator"""
+    if record.status == "complete" or (record.total_length > 0
+                                       and record.total_length <= record.completed_length):
+        return "Завершено"
+    if eta is None:
+        return "∞" if record.status == "active" else ""
+    return format_time(eta)
+
+
+def format_row(record, eta: Optional[float] = None) -> Tuple[str, ...]:
+    """Значения ячеек строки для записи DownloadRecord и её ETA в секундах"""
+    if record.total_length > 0:
+        size = f"{format_size(record.completed_length)} / {format_size(record.total_length)}"
+    else:
+        size = format_size(record.completed_length)
+    return (
+        record.name,
+        STATUS_LABELS.get(record.status, f"❓ {record.status.upper()}"),
+        f"{record.progress:.1f}%",
+        size,
+        format_speed(record.download_speed),
+        format_eta(record, eta),
+    )
+
+
+class DownloadListView:
+    """Таблица загрузок, строки которой привязаны к GID
+
+    При обновлении меняются только ячейки, значения которых изменились;
+    позиция прокрутки и выделение сохраняются. Treeview рисует только
+    видимые строки, поэтому тысячи записей не замедляют отрисовку.
+    """
+
+    def __init__(self, parent, height: int = 12):
+        self.frame = ttk.Frame(parent)
+        self.tree = ttk.Treeview(
+            self.frame,
+            columns=[column for column, _, _ in COLUMNS],
+            show="headings",
+            height=height,
+            selectmode="extended"
+        )
+        for column, title, width in COLUMNS:
+            self.tree.heading(column, text=title)
+            self.tree.column(column, width=width, stretch=(column == "name"))
+
+        scroll = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scroll.set)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(5, 0), pady=5)
+        scroll.pack(side=tk.RIGHT, fill=tk.Y, padx=(0, 5), pady=5)
+
+        # gid -> (сырые значения, отображаемые ячейки)
+        self._rows: Dict[str, Tuple[tuple, Tuple[str, ...]]] = {}
+        self.tree.bind("<Control-a>", self._select_all)
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def update(self, records: Iterable, etas: Optional[Dict[str, Optional[float]]] = None) -> int:
+        """Синхронизирует таблицу с записями; возвращает число изменённых строк
+
+        etas - оценки оставшегося времени по GID (EtaEstimator.update).
+        """
+        etas = etas or {}
+        changed = 0
+        seen = set()
+        tree = self.tree
+
+        for record in records:
+            gid = record.gid
+            seen.add(gid)
+            eta = etas.get(gid)
+            raw = (record.status, record.path, record.completed_length,
+                   record.total_length, record.download_speed,
+                   None if eta is None else int(eta))
+            row = self._rows.get(gid)
+            if row is not None and row[0] == raw:
+                continue
+
+            values = format_row(record, eta)
+            if row is None:
+                tree.insert("", tk.END, iid=gid, values=values)
+            else:
+                for (column, _, _), old, new in zip(COLUMNS, row[1], values):
+                    if old != new:
+                        tree.set(gid, column, new)
+            self._rows[gid] = (raw, values)
+            changed += 1
+
+        gone = [gid for gid in self._rows if gid not in seen]
+        if gone:
+            tree.delete(*gone)
+            for gid in gone:
+                del self._rows[gid]
+            changed += len(gone)
+
+        return changed
+
+    def selected_gids(self) -> List[str]:
+        """GID выделенных строк"""
+        return list(self.tree.selection())
+
+    def _select_all(self, event=None):
+        """Ctrl+A: выделяет все строки для массовых команд"""
+        self.tree.selection_set(self.tree.get_children())
+        return "break"
+
+    def __len__(self) -> int:
+        return len(self._rows)
@@ -0,0 +1,288 @@
+"""
+Компактное хранилище состояния загрузок с индексами по GID, статусу и папке
+"""
+
+import os
+import sys
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from delta import ADDED, PROGRESS, REMOVED, STATUS_CHANGED, DownloadDelta
+
+# Порядок статусов совпадает с порядком в get_all_downloads:
+# активные, очередь ожидания, остановленные
+STATUS_ORDER = ("active", "waiting", "paused", "complete", "error", "removed")
+
+
+# Числовые поля записи и ключи ответа aria2, из которых они берутся
+NUMERIC_FIELDS = (
+    ("total_length", "totalLength"),
+    ("completed_length", "completedLength"),
+    ("download_speed", "downloadSpeed"),
+    ("upload_speed", "uploadSpeed"),
+    ("error_code", "errorCode"),
+)
+
+
+def _int(value, default: int = 0) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class DownloadRecord:
+    """Одна загрузка: числа уже разобраны, строки интернированы"""
+
+    __slots__ = ("gid", "status", "total_length", "completed_length", "download_speed",
+                 "upload_speed", "directory", "path", "error_code", "info_hash")
+
+    def __init__(self, gid: str):
+        self.gid = gid
+        self.status = ""
+        self.total_length = 0
+        self.completed_length = 0
+        self.download_speed = 0
+        self.upload_speed = 0
+        self.directory = ""
+        self.path = ""
+        self.error_code = 0
+        self.info_hash = ""
+
+    @property
+    def name(self) -> str:
+        """Имя первого файла загрузки"""
+        return os.path.basename(self.path) if self.path else "unknown"
+
+    @property
+    def progress(self) -> float:
+        """Прогресс в процентах"""
+        if self.total_length <= 0:
+            return 0.0
+        return self.completed_length / self.total_length * 100
+
+    def update(self, download: Dict) -> List[str]:
+        """Обновляет поля, присутствующие в ответе aria2 (поддерживает проекции keys)
+
+        Возвращает ключи ответа, значения которых изменили запись.
+        """
+        changed = []
+        value = download.get("status")
+        if value is not None and value != self.status:
+            self.status = sys.intern(value)
+            changed.append("status")
+        for field, key in NUMERIC_FIELDS:
+            if key in download:
+                value = _int(download[key])
+                if value != getattr(self, field):
+                    setattr(self, field, value)
+                    changed.append(key)
+        value = download.get("dir")
+        if value is not None and value != self.directory:
+            self.directory = sys.intern(value)
+            changed.append("dir")
+        value = download.get("infoHash")
+        if value is not None and value != self.info_hash:
+            self.info_hash = value
+            changed.append("infoHash")
+        files = download.get("files")
+        if files:
+            value = files[0].get("path", "")
+            if value != self.path:
+                self.path = value
+                changed.append("files")
+        return changed
+
+    def as_dict(self) -> Dict:
+        """Запись в виде ответа aria2 (числа - строками, как у aria2)"""
+        return {
+            "gid": self.gid,
+            "status": self.status,
+            "totalLength": str(self.total_length),
+            "completedLength": str(self.completed_length),
+            "downloadSpeed": str(self.download_speed),
+            "uploadSpeed": str(self.upload_speed),
+            "dir": self.directory,
+            "files": [{"path": self.path}],
+            "errorCode": str(self.error_code),
+            "infoHash": self.info_hash,
+        }
+
+    def __repr__(self):
+        return f"DownloadRecord({self.gid!r}, {self.status!r}, {self.completed_length}/{self.total_length})"
+
+
+class DownloadStore:
+    """Записи по GID плюс индексы по статусу и папке
+
+    Индексы - словари с порядком вставки, поэтому выбор "первой" загрузки
+    с нужным статусом совпадает с порядком, в котором их вернул aria2.
+    Поиск по GID и по статусу - O(1).
+    """
+
+    def __init__(self):
+        self._records: Dict[str, DownloadRecord] = {}
+        self._by_status: Dict[str, Dict[str, None]] = {}
+        self._by_directory: Dict[str, Dict[str, None]] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __contains__(self, gid: str) -> bool:
+        return gid in self._records
+
+    def __iter__(self) -> Iterator[DownloadRecord]:
+        return iter(self.records())
+
+    def get(self, gid: str) -> Optional[DownloadRecord]:
+        """Запись по GID"""
+        return self._records.get(gid)
+
+    def records(self) -> List[DownloadRecord]:
+        """Все записи в порядке статусов и поступления"""
+        with self._lock:
+            return [self._records[gid] for status in self._ordered_statuses()
+                    for gid in self._by_status[status]]
+
+    def by_status(self, status: str) -> List[DownloadRecord]:
+        """Записи с указанным статусом"""
+        with self._lock:
+            return [self._records[gid] for gid in self._by_status.get(status, ())]
+
+    def by_directory(self, directory: str) -> List[DownloadRecord]:
+        """Записи с указанной папкой загрузки"""
+        with self._lock:
+            return [self._records[gid] for gid in self._by_directory.get(directory, ())]
+
+    def count(self, status: str) -> int:
+        """Число записей со статусом за O(1)"""
+        return len(self._by_status.get(status, ()))
+
+    def first(self, statuses: Iterable[str] = STATUS_ORDER) -> Optional[DownloadRecord]:
+        """Первая запись с одним из статусов, проверяя их в указанном порядке"""
+        with self._lock:
+            for status in statuses:
+                for gid in self._by_status.get(status, ()):
+                    return self._records[gid]
+        return None
+
+    def _ordered_statuses(self) -> List[str]:
+        known = [status for status in STATUS_ORDER if status in self._by_status]
+        return known + [status for status in self._by_status if status not in STATUS_ORDER]
+
+    @staticmethod
+    def _index_add(index: Dict[str, Dict[str, None]], key: str, gid: str):
+        index.setdefault(key, {})[gid] = None
+
+    @staticmethod
+    def _index_remove(index: Dict[str, Dict[str, None]], key: str, gid: str):
+        bucket = index.get(key)
+        if bucket is not None:
+            bucket.pop(gid, None)
+            if not bucket:
+                del index[key]
+
+    def upsert(self, download: Dict) -> Optional[DownloadRecord]:
+        """Создаёт или обновляет на месте запись по ответу aria2"""
+        gid = download.get("gid")
+        if gid is None:
+            return None
+
+        with self._lock:
+            record = self._records.get(gid)
+            if record is None:
+                record = self._records[gid] = DownloadRecord(gid)
+                old_status = old_directory = None
+            else:
+                old_status, old_directory = record.status, record.directory
+
+            record.update(download)
+            self._reindex(record, old_status, old_directory)
+            return record
+
+    def _reindex(self, record: DownloadRecord, old_status: Optional[str],
+                 old_directory: Optional[str]):
+        gid = record.gid
+        if record.status != old_status:
+            if old_status is not None:
+                self._index_remove(self._by_status, old_status, gid)
+            self._index_add(self._by_status, record.status, gid)
+        if record.directory != old_directory:
+            if old_directory is not None:
+                self._index_remove(self._by_directory, old_directory, gid)
+            self._index_add(self._by_directory, record.directory, gid)
+
+    def remove(self, gid: str) -> Optional[DownloadRecord]:
+        """Удаляет запись и её индексы"""
+        with self._lock:
+            record = self._records.pop(gid, None)
+            if record is not None:
+                self._index_remove(self._by_status, record.status, gid)
+                self._index_remove(self._by_directory, record.directory, gid)
+            return record
+
+    def update_many(self, downloads: Iterable[Dict], complete: bool = False):
+        """Применяет результаты опроса
+
+        complete=True - downloads содержит все загрузки, остальные записи удаляются.
+        """
+        with self._lock:
+            seen = set()
+            for download in downloads:
+                record = self.upsert(download)
+                if record is not None:
+                    seen.add(record.gid)
+            if complete:
+                for gid in [gid for gid in self._records if gid not in seen]:
+                    self.remove(gid)
+
+    def apply(self, downloads: Iterable[Dict], complete: bool = False) -> List[DownloadDelta]:
+        """Применяет ответы aria2 и возвращает изменения, как SnapshotDiffer
+
+        Сравнение идёт с самими записями, поэтому прежний снимок в виде
+        словарей aria2 хранить не нужно. changes содержит поля ответа,
+        изменившие запись, для ADDED - весь ответ. complete=True -
+        downloads содержит все загрузки, остальные удаляются (REMOVED).
+        """
+        deltas: List[DownloadDelta] = []
+        with self._lock:
+            seen = set()
+            for download in downloads:
+                gid = download.get("gid")
+                if gid is None:
+                    continue
+                seen.add(gid)
+                record = self._records.get(gid)
+                if record is None:
+                    self.upsert(download)
+                    deltas.append(DownloadDelta(ADDED, gid, download))
+                    continue
+                old_status, old_directory = record.status, record.directory
+                changed = record.update(download)
+                if not changed:
+                    continue
+                self._reindex(record, old_status, old_directory)
+                kind = STATUS_CHANGED if record.status != old_status else PROGRESS
+                deltas.append(DownloadDelta(kind, gid, {key: download[key] for key in changed}))
+            if complete:
+                for gid in [gid for gid in self._records if gid not in seen]:
+                    self.remove(gid)
+                    deltas.append(DownloadDelta(REMOVED, gid, {}))
+        return deltas
+
+    def apply_deltas(self, deltas: Iterable[DownloadDelta]):
+        """Применяет изменения из события downloads_delta монитора"""
+        with self._lock:
+            for delta in deltas:
+                if delta.kind == REMOVED:
+                    self.remove(delta.gid)
+                else:
+                    self.upsert(dict(delta.changes, gid=delta.gid))
+
+    def clear(self):
+        """Удаляет все записи"""
+        with self._lock:
+            self._records.clear()
+            self._by_status.clear()
+            self._by_directory.clear()
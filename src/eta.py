@@ -0,0 +1,137 @@
+"""
+Сглаженная оценка оставшегося времени загрузок и всей очереди
+"""
+
+import heapq
+import time
+from typing import Dict, Iterable, List, Optional
+
+# Значение max-concurrent-downloads по умолчанию в aria2
+DEFAULT_MAX_CONCURRENT = 5
+
+
+class _Track:
+    """Состояние оценщика для одной загрузки"""
+
+    __slots__ = ("time", "completed", "rate", "progress_time")
+
+    def __init__(self, now: float, completed: int, rate: float):
+        self.time = now
+        self.completed = completed
+        self.rate = rate
+        self.progress_time = now
+
+
+class EtaEstimator:
+    """Скорость каждой загрузки как EWMA прироста completedLength
+
+    Скорость считается по приросту байт между опросами, а не по мгновенной
+    downloadSpeed, поэтому неравные интервалы опроса и кратковременные
+    провалы скорости до нуля не дают скачков: вес нового отсчёта зависит
+    от прошедшего времени (half_life - время, за которое вклад старых
+    отсчётов падает вдвое). Если прогресса нет дольше stall_timeout
+    секунд, загрузка считается зависшей и оценки для неё нет.
+    """
+
+    def __init__(self, half_life: float = 10.0, stall_timeout: float = 60.0):
+        self.half_life = half_life
+        self.stall_timeout = stall_timeout
+        self._tracks: Dict[str, _Track] = {}
+
+    def update(self, records: Iterable, now: Optional[float] = None) -> Dict[str, Optional[float]]:
+        """Учитывает опрос активных загрузок; возвращает ETA в секундах по GID
+
+        records - активные записи DownloadStore. Состояние остальных GID
+        сбрасывается, так что после паузы оценка начинается заново.
+        """
+        now = time.monotonic() if now is None else now
+        etas: Dict[str, Optional[float]] = {}
+        tracks = {}
+        for record in records:
+            track = self._tracks.get(record.gid)
+            if track is None or record.completed_length < track.completed:
+                # Первая оценка - по скорости, которую сообщил aria2
+                track = _Track(now, record.completed_length, float(record.download_speed))
+            elif now > track.time:
+                elapsed = now - track.time
+                progress = record.completed_length - track.completed
+                weight = 1 - 0.5 ** (elapsed / self.half_life)
+                track.rate += weight * (progress / elapsed - track.rate)
+                track.time = now
+                track.completed = record.completed_length
+                if progress:
+                    track.progress_time = now
+            tracks[record.gid] = track
+            etas[record.gid] = self._eta(track, record, now)
+        self._tracks = tracks
+        return etas
+
+    def _eta(self, track: _Track, record, now: float) -> Optional[float]:
+        remaining = record.total_length - record.completed_length
+        if record.total_length <= 0:
+            return None
+        if remaining <= 0:
+            return 0.0
+        if track.rate <= 0 or now - track.progress_time > self.stall_timeout:
+            return None
+        return remaining / track.rate
+
+    def rate(self, gid: str) -> float:
+        """Сглаженная скорость загрузки в байтах/с"""
+        track = self._tracks.get(gid)
+        return track.rate if track else 0.0
+
+    def total_rate(self) -> float:
+        """Сумма сглаженных скоростей активных загрузок"""
+        return sum(track.rate for track in self._tracks.values())
+
+    def queue_drain(self, active: Iterable, waiting: Iterable,
+                    max_concurrent: int = DEFAULT_MAX_CONCURRENT) -> Optional[float]:
+        """Время до завершения активных загрузок и очереди ожидания в секундах
+
+        Загрузки из очереди стартуют по мере освобождения max_concurrent
+        слотов и качаются со средней скоростью текущих загрузок. Размер
+        ожидающих загрузок без известной длины берётся средним по известным.
+        None - если скорость неизвестна.
+        """
+        active = list(active)
+        slot_rate = self.total_rate() / len(active) if active else 0.0
+        if slot_rate <= 0:
+            return None
+
+        finish_times: List[float] = []
+        sizes: List[int] = []
+        for record in active:
+            remaining = max(record.total_length - record.completed_length, 0)
+            rate = self.rate(record.gid)
+            finish_times.append(remaining / (rate if rate > 0 else slot_rate))
+            sizes.append(record.total_length)
+
+        pending: List[int] = []
+        unknown = 0
+        for record in waiting:
+            if record.total_length > 0:
+                pending.append(record.total_length - record.completed_length)
+                sizes.append(record.total_length)
+            else:
+                unknown += 1
+        known = [size for size in sizes if size > 0]
+        if unknown and known:
+            pending.extend([sum(known) // len(known)] * unknown)
+
+        return _simulate_slots(finish_times, pending, max(max_concurrent, 1), slot_rate)
+
+
+def _simulate_slots(finish_times: List[float], pending: List[int], slots: int, slot_rate: float) -> float:
+    """Время освобождения всех слотов, если очередь занимает их по порядку"""
+    ordered = sorted(finish_times)
+    heap = ordered[:slots]
+    # Активных больше, чем слотов (лимит уменьшили) - лишние ждут, как очередь
+    durations = ordered[slots:] + [remaining / slot_rate for remaining in pending]
+    heapq.heapify(heap)
+    for duration in durations:
+        if len(heap) < slots:
+            heapq.heappush(heap, duration)
+        else:
+            heapq.heappush(heap, heapq.heappop(heap) + duration)
+    return max(heap) if heap else 0.0
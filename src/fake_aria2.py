@@ -0,0 +1,638 @@
+"""
+Локальный заменитель aria2 JSON-RPC сервера для тестов и бенчмарков
+
+Кроме JSON-RPC по HTTP и WebSocket умеет имитировать ход загрузок с
+заданной скоростью (populate, advance, start_simulation) и сбои: ошибки
+отдельных методов, случайные ошибки и обрывы соединения. Случайность
+берётся из генератора с seed, поэтому прогоны воспроизводимы.
+"""
+
+import base64
+import binascii
+import itertools
+import json
+import os
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
+
+from torrent_file import parse_metalink, parse_torrent
+from websocket_transport import (OP_CLOSE, OP_PING, OP_PONG, OP_TEXT, WebSocketError,
+                                 accept_key, encode_frame, read_frame)
+
+# Уведомление aria2 для каждого нового состояния загрузки
+STATUS_EVENTS = {
+    "active": "aria2.onDownloadStart",
+    "paused": "aria2.onDownloadPause",
+    "removed": "aria2.onDownloadStop",
+    "complete": "aria2.onDownloadComplete",
+    "error": "aria2.onDownloadError",
+}
+
+
+class RpcError(Exception):
+    """Ошибка JSON-RPC в формате aria2"""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class _RpcHandler(BaseHTTPRequestHandler):
+    """HTTP обработчик с поддержкой keep-alive"""
+
+    protocol_version = "HTTP/1.1"
+    # Без этого заголовки и тело уходят отдельными сегментами и keep-alive
+    # соединение упирается в задержку Nagle/delayed ACK
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.fake.lock:
+            self.server.fake.connection_count += 1
+            self.server.fake.connections.add(self.connection)
+
+    def finish(self):
+        with self.server.fake.lock:
+            self.server.fake.connections.discard(self.connection)
+        super().finish()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        if self.server.fake.take_dropped_request():
+            # Обрыв без ответа, как у упавшего демона
+            self.close_connection = True
+            return
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            response = {"jsonrpc": "2.0", "id": None,
+                        "error": {"code": -32700, "message": "Parse error."}}
+        else:
+            response = self.server.fake.handle_payload(payload)
+
+        data = json.dumps(response).encode("utf-8")
+        with self.server.fake.lock:
+            self.server.fake.bytes_sent += len(data)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json-rpc")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.headers.get("Upgrade", "").lower() != "websocket":
+            self.send_error(400)
+            return
+
+        key = self.headers.get("Sec-WebSocket-Key", "")
+        self.send_response(101)
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept_key(key))
+        self.end_headers()
+        self.wfile.flush()
+
+        fake = self.server.fake
+        self.send_lock = threading.Lock()
+        with fake.lock:
+            fake.websockets.append(self)
+        try:
+            self._serve_websocket()
+        finally:
+            with fake.lock:
+                fake.websockets.remove(self)
+            self.close_connection = True
+
+    def _read_exact(self, size: int) -> bytes:
+        data = self.rfile.read(size)
+        if len(data) < size:
+            raise WebSocketError("Соединение закрыто")
+        return data
+
+    def _serve_websocket(self):
+        while True:
+            try:
+                _, opcode, payload = read_frame(self._read_exact)
+            except (OSError, WebSocketError):
+                return
+            if opcode == OP_CLOSE:
+                self.send_frame(OP_CLOSE, b"")
+                return
+            if opcode == OP_PING:
+                self.send_frame(OP_PONG, payload)
+            elif opcode == OP_TEXT:
+                try:
+                    response = self.server.fake.handle_payload(json.loads(payload))
+                except ValueError:
+                    continue
+                self.send_frame(OP_TEXT, json.dumps(response).encode("utf-8"))
+
+    def send_frame(self, opcode: int, payload: bytes) -> bool:
+        """Отправляет кадр клиенту; False если соединение уже закрыто"""
+        try:
+            with self.send_lock:
+                self.wfile.write(encode_frame(opcode, payload, mask=False))
+                self.wfile.flush()
+            return True
+        except OSError:
+            return False
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeAria2Server:
+    """Сервер, имитирующий JSON-RPC интерфейс aria2 в текущем процессе"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, secret: Optional[str] = None,
+                 latency: float = 0.0, seed: Optional[int] = 0):
+        self.host = host
+        self.secret = secret
+        # Искусственная задержка ответа, имитирующая сеть или загруженный демон
+        self.latency = latency
+        self.random = random.Random(seed)
+        # Сбои: доля случайных ошибок методов, ошибки по методам, обрывы запросов
+        self.failure_rate = 0.0
+        self.download_failure_rate = 0.0
+        self.dropped_requests = 0
+        self._failures: Dict[str, List] = {}
+        # Скорость имитации каждой загрузки в байтах/с
+        self.rates: Dict[str, int] = {}
+        self._simulation: Optional[threading.Thread] = None
+        self._simulation_stop = threading.Event()
+        self.downloads: Dict[str, Dict] = {}
+        self.request_count = 0
+        # Байт в телах HTTP ответов - размер полезной нагрузки для бенчмарков
+        self.bytes_sent = 0
+        self.connection_count = 0
+        self.websockets: List[_RpcHandler] = []
+        self.connections: Set[socket.socket] = set()
+        self.global_options: Dict[str, str] = {"dir": "/tmp", "max-overall-download-limit": "0",
+                                               "max-concurrent-downloads": "5"}
+        self.lock = threading.RLock()
+        self._gid_counter = itertools.count(1)
+        self._httpd = ThreadingHTTPServer((host, port), _RpcHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        self._thread: Optional[threading.Thread] = None
+
+        self.methods: Dict[str, Callable] = {
+            "aria2.getVersion": self._get_version,
+            "aria2.addUri": self._add_uri,
+            "aria2.addTorrent": self._add_torrent,
+            "aria2.addMetalink": self._add_metalink,
+            "aria2.tellStatus": self._tell_status,
+            "aria2.tellActive": self._tell_active,
+            "aria2.tellWaiting": self._tell_waiting,
+            "aria2.tellStopped": self._tell_stopped,
+            "aria2.getGlobalStat": self._get_global_stat,
+            "aria2.getGlobalOption": self._get_global_option,
+            "aria2.pause": self._pause,
+            "aria2.forcePause": self._pause,
+            "aria2.pauseAll": self._pause_all,
+            "aria2.forcePauseAll": self._pause_all,
+            "aria2.unpause": self._unpause,
+            "aria2.unpauseAll": self._unpause_all,
+            "aria2.remove": self._remove,
+            "aria2.forceRemove": self._remove,
+            "aria2.removeDownloadResult": self._remove_download_result,
+            "aria2.purgeDownloadResult": self._purge_download_result,
+            "aria2.saveSession": self._save_session,
+            "aria2.shutdown": self._shutdown,
+        }
+
+    @property
+    def port(self) -> int:
+        return self._httpd.server_address[1]
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/jsonrpc"
+
+    def start(self) -> "FakeAria2Server":
+        """Запускает сервер в фоновом потоке"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Останавливает сервер"""
+        self.stop_simulation()
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        # Открытые keep-alive и WebSocket соединения закрываются, как у
+        # остановленного демона
+        with self.lock:
+            connections = list(self.connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    # Управление состоянием
+
+    def add_fake_download(self, uri: str, status: str = "active", total_length: int = 1048576,
+                          completed_length: int = 0, download_speed: int = 0,
+                          options: Optional[Dict] = None) -> str:
+        """Добавляет загрузку напрямую, минуя RPC"""
+        options = options or {}
+        with self.lock:
+            gid = options.get("gid") or f"{next(self._gid_counter):016x}"
+            directory = options.get("dir", "/tmp")
+            name = options.get("out") or uri.rstrip("/").rsplit("/", 1)[-1] or "index.html"
+            self.downloads[gid] = {
+                "gid": gid,
+                "status": status,
+                "totalLength": str(total_length),
+                "completedLength": str(completed_length),
+                "uploadLength": "0",
+                "downloadSpeed": str(download_speed),
+                "uploadSpeed": "0",
+                "connections": "1" if status == "active" else "0",
+                "numPieces": "1",
+                "pieceLength": "1048576",
+                "bitfield": "00",
+                "dir": directory,
+                "files": [{
+                    "index": "1",
+                    "path": f"{directory}/{name}",
+                    "length": str(total_length),
+                    "completedLength": str(completed_length),
+                    "selected": "true",
+                    "uris": [{"uri": uri, "status": "used"}],
+                }],
+            }
+            return gid
+
+    def populate(self, count: int, status: str = "active",
+                 rate: Union[int, Tuple[int, int]] = (100_000, 1_000_000),
+                 total_length: Union[int, Tuple[int, int]] = (1 << 20, 1 << 30)) -> List[str]:
+        """Добавляет count загрузок для имитации
+
+        rate и total_length - число или диапазон (min, max), из которого
+        значение выбирается генератором с seed.
+        """
+        def pick(value):
+            return self.random.randint(*value) if isinstance(value, tuple) else value
+
+        gids = []
+        with self.lock:
+            start = len(self.downloads)
+            for i in range(count):
+                gid = self.add_fake_download(f"http://fake.invalid/file{start + i}.bin", status=status,
+                                             total_length=pick(total_length))
+                self.rates[gid] = pick(rate)
+                if status == "active":
+                    self.downloads[gid]["downloadSpeed"] = str(self.rates[gid])
+                gids.append(gid)
+        return gids
+
+    def advance(self, seconds: float) -> List[Tuple[str, str]]:
+        """Сдвигает имитацию на seconds секунд; возвращает смены статусов (gid, статус)
+
+        Активные загрузки продвигаются со своей скоростью, завершённые
+        освобождают места, и ожидающие стартуют в порядке очереди, пока
+        активных не больше max-concurrent-downloads. Уведомления
+        рассылаются как у aria2.
+        """
+        changes: List[Tuple[str, str]] = []
+        with self.lock:
+            for gid in self._promote():
+                changes.append((gid, "active"))
+            for gid, download in self.downloads.items():
+                if download["status"] != "active":
+                    continue
+                if self.download_failure_rate and self.random.random() < self.download_failure_rate * seconds:
+                    download["errorCode"] = "1"
+                    download["errorMessage"] = "Simulated network failure"
+                    changes.append((gid, "error"))
+                    continue
+                rate = self.rates.get(gid, 0)
+                total = int(download["totalLength"])
+                completed = min(total, int(download["completedLength"]) + int(rate * seconds))
+                download["completedLength"] = download["files"][0]["completedLength"] = str(completed)
+                download["downloadSpeed"] = str(rate)
+                if completed >= total:
+                    changes.append((gid, "complete"))
+            finished = {gid for gid, status in changes if status != "active"}
+            promoted = self._promote(exclude=finished)
+        for gid, status in changes:
+            if status == "active":
+                self.notify(STATUS_EVENTS["active"], gid)
+            else:
+                self.set_status(gid, status)
+        for gid in promoted:
+            self.notify(STATUS_EVENTS["active"], gid)
+        return changes + [(gid, "active") for gid in promoted]
+
+    def _promote(self, exclude: Set[str] = frozenset()) -> List[str]:
+        """Переводит ожидающие загрузки в активные до лимита одновременных"""
+        limit = int(self.global_options.get("max-concurrent-downloads", 5))
+        active = sum(d["status"] == "active" and gid not in exclude for gid, d in self.downloads.items())
+        promoted = []
+        for gid, download in self.downloads.items():
+            if active >= limit:
+                break
+            if download["status"] == "waiting":
+                download["status"] = "active"
+                download["connections"] = "1"
+                self.rates.setdefault(gid, 0)
+                promoted.append(gid)
+                active += 1
+        return promoted
+
+    def start_simulation(self, interval: float = 0.5, speedup: float = 1.0):
+        """Двигает имитацию в фоновом потоке каждые interval секунд
+
+        speedup > 1 ускоряет время: за каждый шаг проходит interval * speedup
+        секунд имитации.
+        """
+        if self._simulation and self._simulation.is_alive():
+            return
+        self._simulation_stop.clear()
+
+        def run():
+            while not self._simulation_stop.wait(interval):
+                self.advance(interval * speedup)
+
+        self._simulation = threading.Thread(target=run, daemon=True)
+        self._simulation.start()
+
+    def stop_simulation(self):
+        self._simulation_stop.set()
+        if self._simulation:
+            self._simulation.join(timeout=5)
+            self._simulation = None
+
+    def inject_failure(self, method: str, times: int = 1, code: int = 1,
+                       message: str = "Injected failure"):
+        """Следующие times вызовов method ("aria2.addUri" или "*") вернут ошибку"""
+        with self.lock:
+            self._failures[method] = [times, code, message]
+
+    def take_dropped_request(self) -> bool:
+        """Нужно ли оборвать очередной HTTP запрос (см. dropped_requests)"""
+        with self.lock:
+            if self.dropped_requests > 0:
+                self.dropped_requests -= 1
+                return True
+        return False
+
+    def _check_failure(self, method: str):
+        with self.lock:
+            for key in (method, "*"):
+                failure = self._failures.get(key)
+                if failure:
+                    failure[0] -= 1
+                    if failure[0] <= 0:
+                        del self._failures[key]
+                    raise RpcError(failure[1], failure[2])
+            if self.failure_rate and self.random.random() < self.failure_rate:
+                raise RpcError(1, "Simulated failure")
+
+    def set_status(self, gid: str, status: str):
+        """Меняет состояние загрузки и рассылает соответствующее уведомление"""
+        with self.lock:
+            download = self._get(gid)
+            download["status"] = status
+            if status != "active":
+                download["downloadSpeed"] = "0"
+            if status == "complete":
+                download["completedLength"] = download["totalLength"]
+        self.notify(STATUS_EVENTS[status], gid)
+
+    def notify(self, method: str, gid: str):
+        """Рассылает уведомление всем WebSocket клиентам"""
+        message = json.dumps({"jsonrpc": "2.0", "method": method, "params": [{"gid": gid}]})
+        with self.lock:
+            clients = list(self.websockets)
+        for client in clients:
+            client.send_frame(OP_TEXT, message.encode("utf-8"))
+
+    # Обработка запросов
+
+    def handle_payload(self, payload: Any) -> Any:
+        """Обрабатывает одиночный JSON-RPC запрос"""
+        with self.lock:
+            self.request_count += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return self._handle_single(payload)
+
+    def _handle_single(self, request: Dict) -> Dict:
+        response = {"jsonrpc": "2.0", "id": request.get("id")}
+        try:
+            response["result"] = self.call(request.get("method"), list(request.get("params", [])))
+        except RpcError as e:
+            response["error"] = {"code": e.code, "message": e.message}
+        return response
+
+    def call(self, method: str, params: List[Any]) -> Any:
+        """Выполняет метод aria2 с проверкой токена"""
+        if method == "system.multicall":
+            return self._multicall(params[0] if params else [])
+
+        handler = self.methods.get(method)
+        if handler is None:
+            raise RpcError(1, f"No such method: {method}")
+
+        token = None
+        if params and isinstance(params[0], str) and params[0].startswith("token:"):
+            token = params.pop(0)[len("token:"):]
+        if self.secret and token != self.secret:
+            raise RpcError(1, "Unauthorized")
+        self._check_failure(method)
+
+        with self.lock:
+            return handler(*params)
+
+    def _multicall(self, calls: List[Dict]) -> List[Any]:
+        # Успешный результат оборачивается в массив, ошибка - структура fault
+        results = []
+        for item in calls:
+            try:
+                results.append([self.call(item.get("methodName"), list(item.get("params", [])))])
+            except RpcError as e:
+                results.append({"code": e.code, "message": e.message})
+        return results
+
+    def _get(self, gid: str) -> Dict:
+        download = self.downloads.get(gid)
+        if download is None:
+            raise RpcError(1, f"GID {gid} is not found")
+        return download
+
+    @staticmethod
+    def _project(download: Dict, keys: Optional[List[str]]) -> Dict:
+        if not keys:
+            return json.loads(json.dumps(download))
+        return {key: download[key] for key in keys if key in download}
+
+    def _select(self, statuses: tuple, offset: int, num: int, keys: Optional[List[str]]) -> List[Dict]:
+        matched = [d for d in self.downloads.values() if d["status"] in statuses]
+        return [self._project(d, keys) for d in matched[offset:offset + num]]
+
+    # Методы aria2
+
+    def _get_version(self):
+        return {"version": "1.37.0", "enabledFeatures": ["BitTorrent", "Metalink"]}
+
+    def _add_uri(self, uris, options=None, position=None):
+        if not uris or "://" not in uris[0]:
+            raise RpcError(1, "No URI to download.")
+        options = options or {}
+        if options.get("gid") in self.downloads:
+            raise RpcError(1, f"GID#{options['gid']} is not unique.")
+        status = "paused" if options.get("pause") == "true" else "waiting"
+        return self.add_fake_download(uris[0], status=status, options=options)
+
+    @staticmethod
+    def _decode_upload(data: str, parse: Callable):
+        try:
+            return parse(base64.b64decode(data, validate=True))
+        except (ValueError, binascii.Error):
+            raise RpcError(1, "Failed to load the uploaded file.") from None
+
+    def _add_torrent(self, torrent, uris=None, options=None, position=None):
+        info = self._decode_upload(torrent, parse_torrent)
+        options = dict(options or {}, out=info.name)
+        gid = self.add_fake_download(f"magnet:?xt=urn:btih:{info.info_hash}", status="waiting",
+                                     total_length=info.total_length, options=options)
+        with self.lock:
+            self.downloads[gid]["infoHash"] = info.info_hash
+            self.downloads[gid]["bittorrent"] = {"info": {"name": info.name}}
+        return gid
+
+    def _add_metalink(self, metalink, options=None, position=None):
+        info = self._decode_upload(metalink, parse_metalink)
+        return [self.add_fake_download(f"http://metalink.invalid/{info.name}.{i}", status="waiting",
+                                       options=options)
+                for i in range(info.file_count)]
+
+    def _tell_status(self, gid, keys=None):
+        return self._project(self._get(gid), keys)
+
+    def _tell_active(self, keys=None):
+        return [self._project(d, keys) for d in self.downloads.values() if d["status"] == "active"]
+
+    def _tell_waiting(self, offset, num, keys=None):
+        return self._select(("waiting", "paused"), offset, num, keys)
+
+    def _tell_stopped(self, offset, num, keys=None):
+        return self._select(("complete", "error", "removed"), offset, num, keys)
+
+    def _get_global_stat(self):
+        statuses = [d["status"] for d in self.downloads.values()]
+        speed = sum(int(d["downloadSpeed"]) for d in self.downloads.values())
+        return {
+            "downloadSpeed": str(speed),
+            "uploadSpeed": "0",
+            "numActive": str(statuses.count("active")),
+            "numWaiting": str(statuses.count("waiting") + statuses.count("paused")),
+            "numStopped": str(sum(s in ("complete", "error", "removed") for s in statuses)),
+            "numStoppedTotal": str(sum(s in ("complete", "error", "removed") for s in statuses)),
+        }
+
+    def _pause(self, gid):
+        download = self._get(gid)
+        if download["status"] not in ("active", "waiting"):
+            raise RpcError(1, f"GID#{gid} cannot be paused now")
+        self.set_status(gid, "paused")
+        return gid
+
+    def _unpause(self, gid):
+        download = self._get(gid)
+        if download["status"] != "paused":
+            raise RpcError(1, f"GID#{gid} cannot be unpaused now")
+        download["status"] = "waiting"
+        return gid
+
+    def _remove(self, gid):
+        download = self._get(gid)
+        if download["status"] in ("complete", "error", "removed"):
+            raise RpcError(1, f"Active Download not found for GID#{gid}")
+        self.set_status(gid, "removed")
+        return gid
+
+    def _pause_all(self):
+        for gid, download in list(self.downloads.items()):
+            if download["status"] in ("active", "waiting"):
+                self.set_status(gid, "paused")
+        return "OK"
+
+    def _unpause_all(self):
+        for download in self.downloads.values():
+            if download["status"] == "paused":
+                download["status"] = "waiting"
+        return "OK"
+
+    def _remove_download_result(self, gid):
+        download = self._get(gid)
+        if download["status"] not in ("complete", "error", "removed"):
+            raise RpcError(1, f"Could not remove download result of GID#{gid}")
+        del self.downloads[gid]
+        return "OK"
+
+    def _purge_download_result(self):
+        for gid in [gid for gid, d in self.downloads.items()
+                    if d["status"] in ("complete", "error", "removed")]:
+            del self.downloads[gid]
+        return "OK"
+
+    def _get_global_option(self):
+        return dict(self.global_options)
+
+    def _save_session(self):
+        # Как aria2: незавершённые загрузки, запись через временный файл
+        path = self.global_options.get("save-session")
+        if not path:
+            raise RpcError(1, "Filename is not given.")
+        lines = []
+        for download in self.downloads.values():
+            if download["status"] not in ("active", "waiting", "paused"):
+                continue
+            lines.append("\t".join(uri["uri"] for uri in download["files"][0]["uris"]))
+            lines.append(f" gid={download['gid']}")
+            lines.append(f" dir={download['dir']}")
+            if download["status"] == "paused":
+                lines.append(" pause=true")
+        temp = path + "__temp"
+        with open(temp, "w", encoding="utf-8") as f:
+            f.write("".join(line + "\n" for line in lines))
+        os.replace(temp, path)
+        return "OK"
+
+    def _shutdown(self):
+        return "OK"
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Запуск: python3 src/fake_aria2.py [порт] [число_загрузок] [seed]
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 6800
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    server = FakeAria2Server(port=port, secret="test123", seed=seed).start()
+    if count:
+        server.populate(count, status="waiting")
+        server.start_simulation()
+    print(f"Фейковый aria2 слушает {server.url}, загрузок: {count}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
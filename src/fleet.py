@@ -0,0 +1,286 @@
+"""
+Несколько удалённых демонов aria2 как один парк загрузок
+
+Fleet опрашивает узлы параллельно, объединяет их загрузки под глобальными
+ID вида "<узел>-<gid>" и отправляет новые загрузки на узел с наибольшим
+запасом полосы или места на диске. Недоступный узел не останавливает
+остальные: его последнее известное состояние сохраняется, а повторные
+попытки идут с нарастающей паузой.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import rpc_protocol as rpc
+from aria2_client import Aria2Client
+from history import DownloadHistory
+from sharding import merge_stats
+
+BANDWIDTH = "bandwidth"
+DISK = "disk"
+
+
+def fleet_id(node: str, gid: str) -> str:
+    """Глобальный ID загрузки в парке"""
+    return f"{node}-{gid}"
+
+
+def split_fleet_id(global_id: str) -> Tuple[str, str]:
+    """Разбирает глобальный ID на (узел, gid); GID aria2 не содержит "-" """
+    node, sep, gid = global_id.rpartition("-")
+    if not sep or not node:
+        raise ValueError(f"Некорректный ID загрузки: {global_id}")
+    return node, gid
+
+
+class FleetNode:
+    """Узел парка и его последнее известное состояние
+
+    max_bandwidth - пропускная способность канала узла в байтах/с (если
+    не задана, берётся max-overall-download-limit демона). disk_free -
+    функция, возвращающая свободное место в байтах: aria2 не сообщает его
+    по RPC, поэтому значение даёт внешний агент или мониторинг.
+    """
+
+    def __init__(self, name: str, client: Aria2Client, max_bandwidth: Optional[int] = None,
+                 disk_free: Optional[Callable[[], Optional[int]]] = None):
+        self.name = name
+        self.client = client
+        self.max_bandwidth = max_bandwidth
+        self.disk_free = disk_free
+
+        self.reachable = False
+        self.last_error: Optional[str] = None
+        self.last_seen: Optional[float] = None
+        self.downloads: List[Dict] = []
+        self.stats: Dict = {}
+        self.free_disk: Optional[int] = None
+        self._failures = 0
+        self._retry_at = 0.0
+
+    @property
+    def download_speed(self) -> int:
+        try:
+            return int(self.stats.get("downloadSpeed", 0))
+        except (TypeError, ValueError):
+            return 0
+
+    @property
+    def free_bandwidth(self) -> Optional[int]:
+        """Свободная полоса в байтах/с; None, если предел канала неизвестен"""
+        if self.max_bandwidth:
+            return self.max_bandwidth - self.download_speed
+        return None
+
+    def bandwidth_rank(self) -> Tuple[int, int]:
+        """Ключ сортировки по полосе: меньше - лучше
+
+        Свободная полоса и скорость узла без предела несравнимы, поэтому
+        узлы делятся на уровни: с известным запасом полосы (по убыванию
+        запаса), без известного предела (по возрастанию скорости) и
+        с исчерпанным пределом (по убыванию запаса).
+        """
+        free = self.free_bandwidth
+        if free is None:
+            return 1, self.download_speed
+        return (0 if free > 0 else 2), -free
+
+    def due(self, now: float) -> bool:
+        """Пора ли опрашивать узел (после ошибок - с паузой)"""
+        return now >= self._retry_at
+
+    def mark_ok(self, downloads: List[Dict], stats: Dict, free_disk: Optional[int]):
+        self.reachable = True
+        self.last_error = None
+        self.last_seen = time.time()
+        self.downloads = downloads
+        self.stats = stats
+        self.free_disk = free_disk
+        self._failures = 0
+        self._retry_at = 0.0
+
+    def mark_failed(self, error: str, retry_delay: float, max_retry_delay: float):
+        self.reachable = False
+        self.last_error = error
+        self._failures += 1
+        delay = min(retry_delay * 2 ** (self._failures - 1), max_retry_delay)
+        self._retry_at = time.monotonic() + delay
+
+
+class Fleet:
+    """Парк демонов aria2 на разных машинах
+
+    Если передана history, загрузки, перешедшие в complete, error или
+    removed, сохраняются в неё с именем узла.
+    """
+
+    def __init__(self, max_workers: int = 8, connect_timeout: float = 1.0, read_timeout: float = 3.0,
+                 retry_delay: float = 1.0, max_retry_delay: float = 30.0, keys: rpc.Keys = "list",
+                 history: Optional[DownloadHistory] = None):
+        self.nodes: Dict[str, FleetNode] = {}
+        self.history = history
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.keys = keys
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+        self._poller: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def add_node(self, name: str, host: str, port: int = 6800, secret: Optional[str] = None,
+                 max_bandwidth: Optional[int] = None,
+                 disk_free: Optional[Callable[[], Optional[int]]] = None) -> FleetNode:
+        """Регистрирует удалённый демон; name используется в глобальных ID"""
+        if "-" in name or not name:
+            raise ValueError(f"Имя узла не может быть пустым или содержать '-': {name!r}")
+        client = Aria2Client(host=host, port=port, secret=secret,
+                             connect_timeout=self.connect_timeout, read_timeout=self.read_timeout)
+        node = FleetNode(name, client, max_bandwidth, disk_free)
+        with self._lock:
+            old = self.nodes.get(name)
+            self.nodes[name] = node
+        if old:
+            old.client.close()
+        return node
+
+    def remove_node(self, name: str):
+        with self._lock:
+            node = self.nodes.pop(name, None)
+        if node:
+            node.client.close()
+
+    def _node(self, name: str) -> FleetNode:
+        node = self.nodes.get(name)
+        if node is None:
+            raise ValueError(f"Неизвестный узел: {name}")
+        return node
+
+    def _poll_node(self, node: FleetNode):
+        # Загрузки, статистика и настройки демона - одним multicall
+        calls = rpc.download_calls(self.keys) + [("getGlobalStat", None), ("getGlobalOption", None)]
+        try:
+            responses = node.client.batch(calls)
+            if "error" in responses[-2]:
+                raise RuntimeError(responses[-2]["error"])
+            downloads = rpc.collect_downloads(responses[:-2])
+            stats = responses[-2]["result"]
+            if node.max_bandwidth is None:
+                options = rpc.result_or(responses[-1], {})
+                limit = int(options.get("max-overall-download-limit", 0) or 0)
+                node.max_bandwidth = limit or None
+            free_disk = node.disk_free() if node.disk_free else None
+        except Exception as e:
+            node.mark_failed(str(e), self.retry_delay, self.max_retry_delay)
+            return
+        if self.history is not None:
+            previous = {download["gid"]: download.get("status") for download in node.downloads}
+            self.history.record_many((download for download in downloads
+                                      if previous.get(download["gid"]) != download.get("status")),
+                                     node.name)
+        node.mark_ok(downloads, stats, free_disk)
+
+    def poll(self) -> Dict[str, bool]:
+        """Опрашивает все узлы параллельно; возвращает доступность по имени
+
+        Узлы после ошибки пропускаются, пока не истечёт пауза повтора.
+        """
+        now = time.monotonic()
+        with self._lock:
+            nodes = list(self.nodes.values())
+        futures = [self._pool.submit(self._poll_node, node) for node in nodes if node.due(now)]
+        for future in futures:
+            future.result()
+        return {node.name: node.reachable for node in nodes}
+
+    def downloads(self) -> List[Dict]:
+        """Объединённый список загрузок последнего опроса
+
+        gid заменяется глобальным ID, в поле node - имя узла, в stale -
+        признак того, что узел сейчас недоступен и данные устарели.
+        """
+        merged = []
+        for node in list(self.nodes.values()):
+            for download in node.downloads:
+                download = dict(download)
+                download["gid"] = fleet_id(node.name, download["gid"])
+                download["node"] = node.name
+                download["stale"] = not node.reachable
+                merged.append(download)
+        return merged
+
+    def global_stats(self) -> Dict:
+        """Суммарная статистика доступных узлов"""
+        return merge_stats(node.stats for node in list(self.nodes.values()) if node.reachable)
+
+    def rank_nodes(self, prefer: str = BANDWIDTH) -> List[FleetNode]:
+        """Доступные узлы от лучшего к худшему для новой загрузки
+
+        prefer=BANDWIDTH - по свободной полосе (см. FleetNode.bandwidth_rank),
+        DISK - по свободному месту (узлы без сведений о диске - в конце).
+        """
+        nodes = [node for node in list(self.nodes.values()) if node.reachable]
+        if prefer == DISK:
+            return sorted(nodes, key=lambda n: (n.free_disk is None, -(n.free_disk or 0)))
+        return sorted(nodes, key=FleetNode.bandwidth_rank)
+
+    def add_download(self, url: str, options: Optional[Dict] = None,
+                     prefer: str = BANDWIDTH) -> Optional[str]:
+        """Добавляет загрузку на лучший узел
+
+        Если узел недоступен, пробуется следующий; отказ самого aria2
+        (например, некорректный URL) возвращается сразу.
+        """
+        for node in self.rank_nodes(prefer):
+            response = node.client.batch([("addUri", rpc.uri_params(url, options))])[0]
+            if "result" in response:
+                return fleet_id(node.name, response["result"])
+            error = response.get("error")
+            if isinstance(error, dict):
+                print(f"Узел {node.name} отклонил загрузку: {error.get('message')}")
+                return None
+            node.mark_failed(str(error), self.retry_delay, self.max_retry_delay)
+        return None
+
+    def pause_download(self, global_id: str) -> bool:
+        """Ставит на паузу загрузку по глобальному ID"""
+        name, gid = split_fleet_id(global_id)
+        return self._node(name).client.pause_download(gid)
+
+    def unpause_download(self, global_id: str) -> bool:
+        """Возобновляет загрузку по глобальному ID"""
+        name, gid = split_fleet_id(global_id)
+        return self._node(name).client.unpause_download(gid)
+
+    def remove_download(self, global_id: str) -> bool:
+        """Удаляет загрузку по глобальному ID"""
+        name, gid = split_fleet_id(global_id)
+        return self._node(name).client.remove_download(gid)
+
+    def start_polling(self, interval: float = 2.0, on_update: Optional[Callable[["Fleet"], None]] = None):
+        """Опрашивает узлы в фоновом потоке каждые interval секунд"""
+        if self._poller and self._poller.is_alive():
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.is_set():
+                self.poll()
+                if on_update:
+                    on_update(self)
+                self._stop.wait(interval)
+
+        self._poller = threading.Thread(target=run, daemon=True)
+        self._poller.start()
+
+    def close(self):
+        """Останавливает опрос и закрывает соединения"""
+        self._stop.set()
+        if self._poller:
+            self._poller.join(timeout=5)
+        self._pool.shutdown(wait=False)
+        for node in list(self.nodes.values()):
+            node.client.close()
@@ -0,0 +1,124 @@
+"""
+Фоновый исполнитель вызовов aria2 для Tk интерфейса
+"""
+
+import queue
+import threading
+from typing import Any, Callable, List, Optional, Set
+
+
+class RpcWorker:
+    """Выполняет блокирующие вызовы в фоновом потоке
+
+    Tk не потокобезопасен, поэтому результаты складываются в очередь, а
+    главный поток забирает их через root.after и вызывает обработчики.
+    Задачи с одинаковым key не накапливаются: пока одна выполняется,
+    повторные отбрасываются.
+
+    В режиме удержания (hold=True, например пока aria2 запускается) задачи
+    копятся в буфере и уходят в работу после release(); срочные задачи
+    (urgent=True) выполняются сразу.
+    """
+
+    def __init__(self, root, poll_ms: int = 50, hold: bool = False):
+        self.root = root
+        self.poll_ms = poll_ms
+        self._tasks: "queue.Queue" = queue.Queue()
+        self._results: "queue.Queue" = queue.Queue()
+        self._in_flight: Set[str] = set()
+        self._held: Optional[List[tuple]] = [] if hold else None
+        self._lock = threading.Lock()
+        self._stopped = False
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._after_id = self.root.after(self.poll_ms, self._drain)
+
+    def submit(self, func: Callable, *args, on_done: Optional[Callable[[Any], None]] = None,
+               on_error: Optional[Callable[[Exception], None]] = None,
+               key: Optional[str] = None, urgent: bool = False) -> bool:
+        """Ставит вызов func(*args) в очередь
+
+        on_done(result) и on_error(exception) вызываются в главном потоке Tk.
+        Возвращает False, если задача с тем же key ещё не завершена.
+        """
+        task = (func, args, on_done, on_error, key)
+        with self._lock:
+            if key is not None:
+                if key in self._in_flight:
+                    return False
+                self._in_flight.add(key)
+            if self._held is not None and not urgent:
+                self._held.append(task)
+                return True
+        self._tasks.put(task)
+        return True
+
+    def hold(self):
+        """Начинает копить новые задачи вместо выполнения"""
+        with self._lock:
+            if self._held is None:
+                self._held = []
+
+    def release(self):
+        """Отправляет накопленные задачи в работу в порядке поступления"""
+        with self._lock:
+            held, self._held = self._held or [], None
+        for task in held:
+            self._tasks.put(task)
+
+    @property
+    def held_count(self) -> int:
+        """Сколько задач ждёт release()"""
+        with self._lock:
+            return len(self._held) if self._held is not None else 0
+
+    def is_busy(self, key: str) -> bool:
+        """Выполняется ли задача с этим key"""
+        with self._lock:
+            return key in self._in_flight
+
+    def _run(self):
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                return
+            func, args, on_done, on_error, key = task
+            try:
+                self._results.put((on_done, func(*args), None, on_error, key))
+            except Exception as e:
+                self._results.put((on_done, None, e, on_error, key))
+
+    def _drain(self):
+        """Вызывает обработчики готовых результатов в главном потоке"""
+        while True:
+            try:
+                on_done, result, error, on_error, key = self._results.get_nowait()
+            except queue.Empty:
+                break
+
+            if key is not None:
+                with self._lock:
+                    self._in_flight.discard(key)
+            try:
+                if error is None:
+                    if on_done:
+                        on_done(result)
+                elif on_error:
+                    on_error(error)
+                else:
+                    print(f"Ошибка фоновой задачи: {error}")
+            except Exception as e:
+                print(f"Ошибка обработчика фоновой задачи: {e}")
+
+        if not self._stopped:
+            self._after_id = self.root.after(self.poll_ms, self._drain)
+
+    def stop(self):
+        """Останавливает поток и опрос очереди результатов"""
+        self._stopped = True
+        self._tasks.put(None)
+        try:
+            self.root.after_cancel(self._after_id)
+        except Exception:
+            pass
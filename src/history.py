@@ -0,0 +1,225 @@
+"""
+Постоянная история завершённых загрузок в SQLite
+
+aria2 забывает остановленные загрузки при перезапуске и отдаёт только
+последние из них, поэтому завершённые, ошибочные и удалённые загрузки
+сохраняются в отдельную базу. Запись идёт пакетами в фоновом потоке,
+чтобы не задерживать опрос aria2.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+DEFAULT_HISTORY_PATH = os.path.expanduser("~/.local/share/aria2-download-manager/history.sqlite3")
+
+# Статусы, с которыми загрузка попадает в историю
+FINISHED_STATUSES = frozenset(("complete", "error", "removed"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS downloads (
+    id INTEGER PRIMARY KEY,
+    node TEXT NOT NULL DEFAULT '',
+    gid TEXT NOT NULL,
+    status TEXT NOT NULL,
+    url TEXT,
+    info_hash TEXT,
+    dir TEXT,
+    path TEXT,
+    total_length INTEGER NOT NULL DEFAULT 0,
+    completed_length INTEGER NOT NULL DEFAULT 0,
+    error_code INTEGER NOT NULL DEFAULT 0,
+    error_message TEXT,
+    finished_at REAL NOT NULL,
+    UNIQUE (node, gid)
+);
+CREATE INDEX IF NOT EXISTS downloads_finished ON downloads (finished_at);
+CREATE INDEX IF NOT EXISTS downloads_status ON downloads (status, finished_at);
+CREATE INDEX IF NOT EXISTS downloads_dir ON downloads (dir, finished_at);
+CREATE INDEX IF NOT EXISTS downloads_url ON downloads (url) WHERE url IS NOT NULL;
+CREATE INDEX IF NOT EXISTS downloads_info_hash ON downloads (info_hash) WHERE info_hash IS NOT NULL;
+"""
+
+# Повторная запись того же GID (например, после перезапуска монитора)
+# обновляет поля, а время завершения меняет только при смене статуса
+UPSERT = """
+INSERT INTO downloads (node, gid, status, url, info_hash, dir, path, total_length,
+                       completed_length, error_code, error_message, finished_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (node, gid) DO UPDATE SET
+    finished_at = CASE WHEN status = excluded.status THEN finished_at ELSE excluded.finished_at END,
+    status = excluded.status,
+    url = COALESCE(excluded.url, url),
+    info_hash = COALESCE(excluded.info_hash, info_hash),
+    dir = excluded.dir,
+    path = excluded.path,
+    total_length = excluded.total_length,
+    completed_length = excluded.completed_length,
+    error_code = excluded.error_code,
+    error_message = excluded.error_message
+"""
+
+COLUMNS = ("node", "gid", "status", "url", "info_hash", "dir", "path", "total_length",
+           "completed_length", "error_code", "error_message", "finished_at")
+
+
+def _int(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def history_row(download: Dict, node: str = "", finished_at: Optional[float] = None) -> tuple:
+    """Строка таблицы по ответу aria2 (tellStatus и т.п.)"""
+    files = download.get("files") or [{}]
+    uris = files[0].get("uris") or [{}]
+    return (
+        node,
+        download["gid"],
+        download["status"],
+        uris[0].get("uri"),
+        download.get("infoHash"),
+        download.get("dir"),
+        files[0].get("path"),
+        _int(download.get("totalLength")),
+        _int(download.get("completedLength")),
+        _int(download.get("errorCode")),
+        download.get("errorMessage"),
+        time.time() if finished_at is None else finished_at,
+    )
+
+
+class DownloadHistory:
+    """База истории с фоновой пакетной записью
+
+    record() только ставит загрузку в очередь; поток записи забирает до
+    batch_size строк за раз и пишет их одной транзакцией. База в режиме
+    WAL, поэтому чтение из GUI не блокируется записью. Чтение идёт через
+    отдельное соединение в каждом потоке.
+    """
+
+    def __init__(self, path: str = DEFAULT_HISTORY_PATH, batch_size: int = 500):
+        self.path = path
+        self.batch_size = batch_size
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        connection = self._connect()
+        connection.executescript(SCHEMA)
+        connection.close()
+
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._local = threading.local()
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def record(self, download: Dict, node: str = "") -> bool:
+        """Ставит загрузку в очередь записи, если она завершена, с ошибкой или удалена"""
+        if download.get("status") not in FINISHED_STATUSES or "gid" not in download:
+            return False
+        self._queue.put(history_row(download, node))
+        return True
+
+    def record_many(self, downloads: Iterable[Dict], node: str = "") -> int:
+        """Ставит в очередь подходящие загрузки; возвращает их число"""
+        return sum(self.record(download, node) for download in downloads)
+
+    def _write_loop(self):
+        connection = self._connect()
+        try:
+            while True:
+                row = self._queue.get()
+                batch = [row]
+                # Забираем всё, что успело накопиться, но не больше batch_size
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stop = None in batch
+                rows = [row for row in batch if row is not None]
+                try:
+                    if rows:
+                        with connection:
+                            connection.executemany(UPSERT, rows)
+                except sqlite3.Error as e:
+                    print(f"Ошибка записи истории загрузок: {e}")
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+                if stop:
+                    return
+        finally:
+            connection.close()
+
+    def flush(self):
+        """Ждёт, пока очередь записи опустеет"""
+        self._queue.join()
+
+    def _reader(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+            connection.row_factory = sqlite3.Row
+        return connection
+
+    def query(self, url: Optional[str] = None, info_hash: Optional[str] = None,
+              directory: Optional[str] = None, status: Optional[str] = None,
+              since: Optional[float] = None, until: Optional[float] = None,
+              node: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        """Записи истории, новые первыми
+
+        Все условия используют индексы. since/until - границы finished_at
+        (until не включается): для следующей страницы передайте until,
+        равный finished_at последней полученной записи.
+        """
+        where = []
+        params: list = []
+        for column, value in (("url", url), ("info_hash", info_hash), ("dir", directory),
+                              ("status", status), ("node", node)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            where.append("finished_at >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("finished_at < ?")
+            params.append(until)
+
+        sql = f"SELECT {', '.join(COLUMNS)} FROM downloads"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY finished_at DESC LIMIT ?"
+        params.append(limit)
+        return [dict(row) for row in self._reader().execute(sql, params)]
+
+    def count(self, status: Optional[str] = None) -> int:
+        """Число записей, всего или с указанным статусом"""
+        if status is None:
+            row = self._reader().execute("SELECT COUNT(*) FROM downloads").fetchone()
+        else:
+            row = self._reader().execute("SELECT COUNT(*) FROM downloads WHERE status = ?",
+                                         (status,)).fetchone()
+        return row[0]
+
+    def close(self):
+        """Дописывает очередь и останавливает поток записи"""
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
@@ -0,0 +1,48 @@
+"""
+Чтение списка загрузок в формате input-file aria2 (--input-file)
+
+Формат: строка с URI (зеркала одного файла разделяются табуляцией), за ней
+строки опций, начинающиеся с пробела или табуляции: " dir=/tmp", " out=a.iso".
+Строки с # в начале - комментарии.
+"""
+
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+Entry = Tuple[List[str], Dict[str, str]]
+
+
+def parse_input_file(lines: Iterable[str]) -> Iterator[Entry]:
+    """Разбирает строки input-file в пары (uris, options)
+
+    Генератор: записи выдаются по мере чтения, файл целиком в память не
+    загружается. Опции без "=" пропускаются.
+    """
+    uris: Optional[List[str]] = None
+    options: Dict[str, str] = {}
+
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+
+        if line[0] in " \t":
+            if uris is None:
+                continue  # опция до первого URI
+            name, sep, value = line.strip().partition("=")
+            if sep:
+                options[name.strip()] = value.strip()
+            continue
+
+        if uris is not None:
+            yield uris, options
+        uris = [uri for uri in line.split("\t") if uri.strip()]
+        options = {}
+
+    if uris is not None:
+        yield uris, options
+
+
+def read_input_file(path: str, encoding: str = "utf-8") -> Iterator[Entry]:
+    """Построчно читает input-file с диска"""
+    with open(path, "r", encoding=encoding) as f:
+        yield from parse_input_file(f)
@@ -0,0 +1,212 @@
+"""
+Мониторинг загрузок aria2: уведомления WebSocket с откатом на опрос
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from delta import ADDED, REMOVED, STATUS_CHANGED, DownloadDelta
+from download_store import DownloadStore
+from history import DownloadHistory
+from scheduler import AdaptiveScheduler
+from speed_history import SpeedHistory
+from rpc_protocol import Keys, active_call, resolve_keys, status_calls
+from websocket_transport import NotificationListener
+
+
+class DownloadMonitor:
+    """Поддерживает актуальный список загрузок и рассылает его подписчикам клиента
+
+    Подписчики "downloads_delta" получают только изменения за цикл
+    (список DownloadDelta), подписчики "downloads_updated" - полный список.
+
+    Состояние хранится только в store (DownloadStore): изменения
+    вычисляются сравнением ответов aria2 с компактными записями, а сами
+    ответы после цикла не удерживаются.
+
+    Пока WebSocket подключен, между полными синхронизациями запрашиваются
+    только активные загрузки и GID из уведомлений. Без WebSocket каждый
+    цикл запрашивает полный список.
+
+    Общая скорость и скорости активных загрузок каждого цикла пишутся в
+    speed_history (SpeedHistory). Если передана history (DownloadHistory),
+    в неё попадают загрузки, перешедшие в complete, error или removed.
+
+    Интервал выбирает AdaptiveScheduler: poll_interval при активных
+    загрузках, затем экспоненциальное замедление до idle_interval (без
+    WebSocket - не больше 5 * poll_interval). Уведомления и команды
+    пользователя (poke) будят монитор сразу.
+    """
+
+    def __init__(self, client, poll_interval: float = 1.0, idle_interval: float = 15.0,
+                 resync_interval: float = 60.0, use_notifications: bool = True,
+                 keys: Keys = None, history: Optional[DownloadHistory] = None):
+        self.client = client
+        self.history = history
+        self.keys = resolve_keys(keys)
+        self.poll_interval = poll_interval
+        self.idle_interval = idle_interval
+        self.resync_interval = resync_interval
+        self.use_notifications = use_notifications
+
+        self.global_stats: Dict = {}
+        self.store = DownloadStore()
+        self.speed_history = SpeedHistory()
+        self.scheduler = AdaptiveScheduler(min_interval=poll_interval, max_interval=idle_interval)
+        self.listener: Optional[NotificationListener] = None
+        self._dirty: Set[str] = set()
+        self._dirty_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._next_resync = 0.0
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def notifications_active(self) -> bool:
+        return self.listener is not None and self.listener.connected
+
+    def start(self):
+        """Запускает поток мониторинга и приём уведомлений"""
+        if self.use_notifications:
+            self.listener = NotificationListener(
+                self.client.websocket_url,
+                self._on_notification,
+                on_state_change=self._on_listener_state
+            )
+            self.listener.start()
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Останавливает мониторинг"""
+        self._stop.set()
+        self._wakeup.set()
+        if self.listener:
+            self.listener.stop()
+
+    def poke(self):
+        """Немедленный цикл после команды пользователя"""
+        self.scheduler.note_interaction()
+        self._wakeup.set()
+
+    def stats(self) -> Dict[str, float]:
+        """Стоимость циклов и текущий интервал опроса"""
+        return self.scheduler.stats()
+
+    def _on_notification(self, method: str, gids: List[str]):
+        with self._dirty_lock:
+            self._dirty.update(gids)
+        event = method.split(".", 1)[-1]
+        for gid in gids:
+            self.client._emit("download_event", event, gid)
+        self._wakeup.set()
+
+    def _on_listener_state(self, connected: bool):
+        # Пока уведомлений не было, могли пропустить изменения - нужна полная синхронизация
+        self._next_resync = 0.0
+        self._wakeup.set()
+
+    def _take_dirty(self) -> List[str]:
+        with self._dirty_lock:
+            dirty, self._dirty = list(self._dirty), set()
+        return dirty
+
+    def _has_active(self) -> bool:
+        return self.store.count("active") > 0
+
+    def tick(self) -> List[DownloadDelta]:
+        """Один цикл обновления состояния; возвращает изменения за цикл"""
+        now = time.monotonic()
+        dirty = self._take_dirty()
+
+        if not self.notifications_active or now >= self._next_resync:
+            downloads, self.global_stats = self.client.get_snapshot(self.keys, limit=None)
+            fetched = {d["gid"]: d for d in downloads if "gid" in d}
+            self._recover_missing(fetched)
+            self._next_resync = now + self.resync_interval
+            deltas = self.store.apply(fetched.values(), complete=True)
+        else:
+            refreshed, removed = self._refresh_partial(dirty)
+            fetched = {d["gid"]: d for d in refreshed}
+            deltas = self.store.apply(refreshed)
+            for gid in removed:
+                if self.store.remove(gid) is not None:
+                    deltas.append(DownloadDelta(REMOVED, gid, {}))
+
+        if deltas:
+            self.client._emit("downloads_delta", deltas)
+        self.speed_history.record(self.global_stats, self.store.by_status("active"))
+        if self.history is not None:
+            # Запись в базу идёт в фоновом потоке истории, здесь - только очередь
+            self.history.record_many(fetched[delta.gid] for delta in deltas
+                                     if delta.kind in (ADDED, STATUS_CHANGED)
+                                     and delta.gid in fetched)
+        # Полный список строится только для подписчиков старого режима
+        if self.client.callbacks.get("downloads_updated"):
+            self.client._emit("downloads_updated", [record.as_dict() for record in self.store])
+        self.client._emit("stats_updated", self.global_stats)
+        return deltas
+
+    def _recover_missing(self, fetched: Dict[str, Dict]):
+        """Проверяет через tellStatus GID, пропавшие из полного списка
+
+        Длинные очереди читаются страницами, и загрузка, сдвинувшаяся между
+        страницами, может в список не попасть. Удалённой она считается,
+        только если aria2 её больше не знает.
+        """
+        missing = [record.gid for record in self.store if record.gid not in fetched]
+        if missing:
+            fetched.update(self.client.get_statuses(missing, self.keys))
+
+    def _refresh_partial(self, dirty: List[str]) -> Tuple[List[Dict], List[str]]:
+        """Запрашивает только активные загрузки и GID из уведомлений
+
+        Возвращает (обновлённые загрузки, GID исчезнувших из aria2).
+        """
+        calls = [("getGlobalStat", None)]
+        with_active = self._has_active()
+        if with_active:
+            calls.append(active_call(self.keys))
+        calls.extend(status_calls(dirty, self.keys))
+
+        responses = self.client.batch(calls)
+        if "result" not in responses[0]:
+            # Демон не ответил - повторим эти GID на следующем цикле
+            with self._dirty_lock:
+                self._dirty.update(dirty)
+            raise RuntimeError(responses[0].get("error"))
+        self.global_stats = responses[0]["result"]
+
+        refreshed: List[Dict] = []
+        removed: List[str] = []
+        if with_active:
+            refreshed.extend(responses[1].get("result", []))
+
+        for gid, response in zip(dirty, responses[len(calls) - len(dirty):]):
+            if "result" in response:
+                refreshed.append(response["result"])
+            elif gid in self.store:
+                # Результат уже удалён из aria2
+                removed.append(gid)
+        return refreshed, removed
+
+    def _next_interval(self) -> float:
+        # Без уведомлений изменения видны только опросом - не замедляемся сильно
+        ceiling = None if self.notifications_active else min(self.idle_interval, self.poll_interval * 5)
+        return self.scheduler.next_interval(ceiling=ceiling)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                started = time.perf_counter()
+                deltas = self.tick()
+                self.scheduler.record_tick(time.perf_counter() - started,
+                                           busy=bool(deltas) or self._has_active())
+                interval = self._next_interval()
+            except Exception as e:
+                print(f"Ошибка мониторинга: {e}")
+                interval = 5
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
@@ -0,0 +1,307 @@
+"""
+Построение JSON-RPC запросов к aria2 и разбор ответов
+
+Общий код синхронного и асинхронного клиентов: транспорт у них разный,
+а формат запросов и ответов должен совпадать.
+"""
+
+import time
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+Call = Tuple[str, Optional[List[Any]]]
+Keys = Union[None, str, List[str]]
+# Элемент массового добавления: URL или пара (uris, options)
+AddItem = Union[str, Tuple[Union[str, List[str]], Optional[Dict]]]
+
+# Поля, которые читает список загрузок в GUI. files остаётся целиком:
+# aria2 не умеет выбирать вложенные поля, а путь берётся из files[0]
+LIST_VIEW_KEYS = [
+    "gid", "status", "totalLength", "completedLength", "downloadSpeed", "dir", "files",
+]
+
+# Поля для подробной карточки загрузки - всё, кроме bitfield и списка пиров
+DETAIL_VIEW_KEYS = LIST_VIEW_KEYS + [
+    "uploadLength", "uploadSpeed", "connections", "numSeeders", "seeder",
+    "pieceLength", "numPieces", "errorCode", "errorMessage", "infoHash",
+    "bittorrent", "followedBy", "following", "belongsTo",
+]
+
+# Именованные проекции для параметра keys методов tell*
+PROJECTIONS: Dict[str, Optional[List[str]]] = {
+    "list": LIST_VIEW_KEYS,
+    "detail": DETAIL_VIEW_KEYS,
+    "full": None,
+}
+
+
+# Методы, меняющие состояние загрузок: после них мониторинг обновляется сразу
+MUTATING_METHODS = frozenset({
+    "addUri", "addTorrent", "addMetalink", "remove", "forceRemove",
+    "pause", "forcePause", "pauseAll", "forcePauseAll", "unpause", "unpauseAll",
+    "changePosition", "changeOption", "purgeDownloadResult", "removeDownloadResult",
+})
+
+
+def resolve_keys(keys: Keys) -> Optional[List[str]]:
+    """Превращает имя проекции или список полей в параметр keys для aria2
+
+    None означает полный объект статуса. gid добавляется всегда - по нему
+    клиенты сопоставляют ответы.
+    """
+    if keys is None:
+        return None
+    if isinstance(keys, str):
+        if keys not in PROJECTIONS:
+            raise ValueError(f"Неизвестная проекция: {keys}")
+        keys = PROJECTIONS[keys]
+        if keys is None:
+            return None
+    if "gid" not in keys:
+        keys = ["gid"] + list(keys)
+    return list(keys)
+
+
+def _with_keys(params: List[Any], keys: Optional[List[str]]) -> List[Any]:
+    if keys:
+        params.append(keys)
+    return params
+
+
+def download_calls(keys: Keys = None, limit: int = 100) -> List[Call]:
+    """Вызовы tellActive/tellWaiting/tellStopped для снимка
+
+    Из очередей ожидания и остановленных берутся первые limit записей.
+    """
+    keys = resolve_keys(keys)
+    return [
+        active_call(keys),
+        window_call("tellWaiting", 0, limit, keys),
+        window_call("tellStopped", 0, limit, keys),
+    ]
+
+
+# Сколько окон длинной очереди дочитывается одним system.multicall
+PAGES_PER_REQUEST = 4
+
+# Поле getGlobalStat с длиной очереди для метода окна
+_QUEUE_LENGTHS = {"tellWaiting": "numWaiting", "tellStopped": "numStopped"}
+
+
+def snapshot_calls(keys: Keys = None, limit: int = 100) -> List[Call]:
+    """Вызовы снимка: первые limit записей очередей и getGlobalStat"""
+    return download_calls(keys, limit) + [("getGlobalStat", None)]
+
+
+def snapshot_pages(calls: List[Call], responses: List[Dict], keys: Keys = None,
+                   page_size: int = 1000,
+                   pages_per_request: int = PAGES_PER_REQUEST) -> List[List[Call]]:
+    """План дочитывания очередей после snapshot_calls(keys, page_size)
+
+    Очереди, первая страница которых пришла целиком, дочитываются окнами
+    по page_size до длины из getGlobalStat того же ответа (numWaiting,
+    numStopped). Окна сгруппированы по pages_per_request в один
+    multicall. Если длина неизвестна, запрашивается ещё одно окно.
+    """
+    stats = result_or(responses[-1], {})
+    pages: List[Call] = []
+    for (method, _), response in zip(calls[:-1], responses[:-1]):
+        if method not in _QUEUE_LENGTHS or len(result_or(response, [])) < page_size:
+            continue
+        try:
+            total = int(stats.get(_QUEUE_LENGTHS[method], 0))
+        except (TypeError, ValueError):
+            total = 0
+        for offset in range(page_size, max(total, 2 * page_size), page_size):
+            pages.append(window_call(method, offset, page_size, keys))
+    return [pages[start:start + pages_per_request]
+            for start in range(0, len(pages), pages_per_request)]
+
+
+def active_call(keys: Keys = None) -> Call:
+    """Вызов tellActive"""
+    return ("tellActive", _with_keys([], resolve_keys(keys)))
+
+
+def window_call(method: str, offset: int, limit: int, keys: Keys = None) -> Call:
+    """Вызов tellWaiting/tellStopped для окна [offset, offset + limit)"""
+    return (method, _with_keys([offset, limit], resolve_keys(keys)))
+
+
+def with_token(secret: Optional[str], params: Optional[List[Any]]) -> List[Any]:
+    """Возвращает параметры с токеном авторизации в начале"""
+    params = list(params) if params else []
+    if secret:
+        params.insert(0, f"token:{secret}")
+    return params
+
+
+def build_request(secret: Optional[str], method: str, params: Optional[List[Any]] = None) -> Dict:
+    """Формирует JSON-RPC запрос к методу aria2"""
+    return {
+        "jsonrpc": "2.0",
+        "id": str(time.time()),
+        "method": f"aria2.{method}",
+        "params": with_token(secret, params)
+    }
+
+
+def build_multicall(secret: Optional[str], calls: List[Call]) -> Dict:
+    """Формирует запрос system.multicall для группы вызовов"""
+    return {
+        "jsonrpc": "2.0",
+        "id": str(time.time()),
+        "method": "system.multicall",
+        "params": [[
+            {"methodName": f"aria2.{method}", "params": with_token(secret, params)}
+            for method, params in calls
+        ]]
+    }
+
+
+def parse_multicall(response: Dict, count: int) -> List[Dict]:
+    """Разбирает ответ system.multicall в список ответов формата {"result"}/{"error"}"""
+    if "result" not in response:
+        return [{"error": response.get("error")} for _ in range(count)]
+
+    # Успешный вызов приходит как [результат], ошибка - как {code, message}
+    results = []
+    for item in response["result"]:
+        if isinstance(item, list):
+            results.append({"result": item[0]})
+        else:
+            results.append({"error": item})
+    return results
+
+
+def result_or(response: Dict, default: Any) -> Any:
+    """Возвращает result из ответа или значение по умолчанию"""
+    if "result" in response:
+        return response["result"]
+    return default
+
+
+def collect_downloads(responses: List[Dict]) -> List[Dict]:
+    """Объединяет ответы tellActive/tellWaiting/tellStopped в один список"""
+    downloads = []
+    for response in responses:
+        if "result" in response:
+            downloads.extend(response["result"])
+    return downloads
+
+
+def status_params(gid: str, keys: Keys = None) -> List[Any]:
+    """Параметры aria2.tellStatus: gid, [keys]"""
+    return _with_keys([gid], resolve_keys(keys))
+
+
+def status_calls(gids: List[str], keys: Keys = None) -> List[Call]:
+    """Вызовы tellStatus для списка GID"""
+    keys = resolve_keys(keys)
+    return [("tellStatus", _with_keys([gid], keys)) for gid in gids]
+
+
+def collect_statuses(gids: List[str], responses: List[Dict]) -> Dict[str, Dict]:
+    """Сопоставляет ответы tellStatus с GID, пропуская ошибки"""
+    return {
+        gid: response["result"]
+        for gid, response in zip(gids, responses)
+        if "result" in response
+    }
+
+
+def torrent_params(torrent_data: str, options: Optional[Dict]) -> List[Any]:
+    """Параметры aria2.addTorrent: torrent, [uris], [options]"""
+    params: List[Any] = [torrent_data, []]  # Пустой массив URIs обязателен
+    if options:
+        params.append(options)
+    return params
+
+
+def metalink_params(metalink_data: str, options: Optional[Dict]) -> List[Any]:
+    """Параметры aria2.addMetalink: metalink, [options]"""
+    params: List[Any] = [metalink_data]
+    if options:
+        params.append(options)
+    return params
+
+
+def uri_params(url: Union[str, List[str]], options: Optional[Dict]) -> List[Any]:
+    """Параметры aria2.addUri: [uris], [options]
+
+    url - один URL или список зеркал одного файла.
+    """
+    params: List[Any] = [[url] if isinstance(url, str) else list(url)]  # URL должен быть в массиве
+    if options:
+        params.append(options)
+    return params
+
+
+class AddResult(NamedTuple):
+    """Результат добавления одного элемента bulk_add
+
+    index - позиция во входной последовательности; gid равен None, если
+    aria2 вернул ошибку (тогда она в error).
+    """
+    index: int
+    uris: List[str]
+    gid: Optional[str]
+    error: Optional[Any]
+
+
+def add_entry(item: AddItem) -> Tuple[List[str], Optional[Dict]]:
+    """Приводит элемент массового добавления к паре (uris, options)"""
+    if isinstance(item, str):
+        return [item], None
+    uris, options = item
+    return ([uris] if isinstance(uris, str) else list(uris)), options
+
+
+def chunked(items: Iterable[AddItem], size: int) -> Iterator[List[Tuple[List[str], Optional[Dict]]]]:
+    """Лениво нарезает элементы на группы по size штук"""
+    if size < 1:
+        raise ValueError("Размер группы должен быть положительным")
+    iterator = iter(items)
+    while True:
+        chunk = [add_entry(item) for item in islice(iterator, size)]
+        if not chunk:
+            return
+        yield chunk
+
+
+def add_uri_calls(chunk: List[Tuple[List[str], Optional[Dict]]]) -> List[Call]:
+    """Вызовы addUri для группы пар (uris, options)"""
+    return [("addUri", uri_params(uris, options)) for uris, options in chunk]
+
+
+def add_results(start: int, chunk: List[Tuple[List[str], Optional[Dict]]],
+                responses: List[Dict]) -> List[AddResult]:
+    """Сопоставляет ответы addUri с элементами группы"""
+    return [
+        AddResult(start + offset, uris, response.get("result"), response.get("error"))
+        for offset, ((uris, _), response) in enumerate(zip(chunk, responses))
+    ]
+
+
+class ControlResult(NamedTuple):
+    """Итог массовой команды (пауза, возобновление, удаление)
+
+    done - GID, к которым команда применена; errors - ошибки aria2 по GID.
+    Для глобальных методов (pauseAll, purgeDownloadResult) GID неизвестны,
+    и done пуст, а ok отражает ответ aria2.
+    """
+    ok: bool
+    done: List[str]
+    errors: Dict[str, Any]
+
+
+def control_result(gids: List[str], responses: List[Dict]) -> ControlResult:
+    """Собирает ControlResult из ответов на вызовы по одному на GID"""
+    done = []
+    errors = {}
+    for gid, response in zip(gids, responses):
+        if "result" in response:
+            done.append(gid)
+        else:
+            errors[gid] = response.get("error")
+    return ControlResult(not errors, done, errors)
@@ -0,0 +1,73 @@
+"""
+Адаптивный выбор интервала опроса aria2
+"""
+
+import time
+from collections import deque
+from typing import Dict, Optional
+
+
+class AdaptiveScheduler:
+    """Частые циклы при активности, экспоненциальное замедление в простое
+
+    - есть активные загрузки или изменения - интервал сбрасывается к min_interval;
+    - простой - интервал умножается на backoff до max_interval;
+    - пользователь недавно работал с окном - не реже min_interval;
+    - окно скрыто - не чаще hidden_interval.
+
+    Стоимость каждого цикла записывается, чтобы политику можно было настроить.
+    """
+
+    def __init__(self, min_interval: float = 1.0, max_interval: float = 30.0, backoff: float = 2.0,
+                 hidden_interval: float = 60.0, interaction_window: float = 10.0,
+                 history: int = 120):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.hidden_interval = hidden_interval
+        self.interaction_window = interaction_window
+
+        self.interval = min_interval
+        self.ticks = 0
+        self.tick_costs: deque = deque(maxlen=history)
+        self._last_interaction = float("-inf")
+
+    def note_interaction(self):
+        """Пользователь что-то сделал: опрашиваем часто"""
+        self._last_interaction = time.monotonic()
+        self.interval = self.min_interval
+
+    def record_tick(self, cost: float, busy: bool):
+        """Учитывает завершённый цикл: cost - длительность в секундах, busy - были ли активность или изменения"""
+        self.ticks += 1
+        self.tick_costs.append(cost)
+        if busy:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+
+    def next_interval(self, visible: bool = True, ceiling: Optional[float] = None) -> float:
+        """Интервал до следующего цикла в секундах
+
+        ceiling ограничивает замедление сверху, например когда нет
+        уведомлений и изменения можно заметить только опросом.
+        """
+        interval = self.interval
+        if ceiling is not None:
+            interval = min(interval, ceiling)
+        if time.monotonic() - self._last_interaction < self.interaction_window:
+            interval = self.min_interval
+        if not visible:
+            interval = max(interval, self.hidden_interval)
+        return interval
+
+    def stats(self) -> Dict[str, float]:
+        """Статистика циклов для настройки политики"""
+        costs = list(self.tick_costs)
+        return {
+            "ticks": self.ticks,
+            "interval": self.interval,
+            "last_cost": costs[-1] if costs else 0.0,
+            "mean_cost": sum(costs) / len(costs) if costs else 0.0,
+            "max_cost": max(costs) if costs else 0.0,
+        }
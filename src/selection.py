@@ -0,0 +1,77 @@
+"""
+Выборка загрузок для массовых команд: по GID, статусу, папке и шаблону имени
+"""
+
+import fnmatch
+import os
+from typing import Dict, FrozenSet, Iterable, NamedTuple, Optional, Union
+
+# Статусы, к которым применимы команды aria2
+PAUSABLE_STATUSES = frozenset({"active", "waiting"})
+UNPAUSABLE_STATUSES = frozenset({"paused"})
+STOPPED_STATUSES = frozenset({"complete", "error", "removed"})
+QUEUED_STATUSES = frozenset({"active", "waiting", "paused"})
+
+# Какие статусы возвращает каждый из методов tell*
+QUEUE_STATUSES = {
+    "tellActive": frozenset({"active"}),
+    "tellWaiting": frozenset({"waiting", "paused"}),
+    "tellStopped": STOPPED_STATUSES,
+}
+
+# Поля tell*, достаточные для фильтрации
+SELECTION_KEYS = ["gid", "status", "dir", "files"]
+
+
+class Selection(NamedTuple):
+    """Условия выборки; None означает "без ограничения"
+
+    Условия объединяются по И. Пустая выборка (все поля None) означает все
+    загрузки - для неё клиент использует pauseAll/unpauseAll.
+    """
+    gids: Optional[FrozenSet[str]] = None
+    statuses: Optional[FrozenSet[str]] = None
+    directory: Optional[str] = None
+    pattern: Optional[str] = None
+
+    @classmethod
+    def of(cls, gids: Optional[Iterable[str]] = None, status: Union[None, str, Iterable[str]] = None,
+           directory: Optional[str] = None, pattern: Optional[str] = None) -> "Selection":
+        """Создаёт выборку; status - один статус или набор статусов"""
+        if isinstance(status, str):
+            status = [status]
+        return cls(
+            frozenset(gids) if gids is not None else None,
+            frozenset(status) if status is not None else None,
+            os.path.normpath(directory) if directory else None,
+            pattern or None,
+        )
+
+    @property
+    def is_everything(self) -> bool:
+        """Выборка без условий"""
+        return self == Selection()
+
+    @property
+    def needs_query(self) -> bool:
+        """Нужно ли запрашивать у aria2 состояние загрузок для фильтрации
+
+        Если заданы только GID, команды отправляются сразу.
+        """
+        return self.gids is None or any(
+            value is not None for value in (self.statuses, self.directory, self.pattern))
+
+    def matches(self, download: Dict) -> bool:
+        """Подходит ли загрузка (ответ tell* с полями SELECTION_KEYS)"""
+        if self.gids is not None and download.get("gid") not in self.gids:
+            return False
+        if self.statuses is not None and download.get("status") not in self.statuses:
+            return False
+        if self.directory is not None and os.path.normpath(download.get("dir", "")) != self.directory:
+            return False
+        if self.pattern is not None:
+            files = download.get("files") or [{}]
+            name = os.path.basename(files[0].get("path", ""))
+            if not fnmatch.fnmatch(name, self.pattern):
+                return False
+        return True
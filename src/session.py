@@ -0,0 +1,261 @@
+"""
+Файл сессии aria2: периодическое сохранение, резервные копии и восстановление
+
+aria2 сам пишет очередь в файл --save-session (через временный файл и
+переименование) и читает её при запуске из --input-file. Здесь к этому
+добавляются вызовы saveSession по таймеру, ротация резервных копий и
+восстановление очереди в уже работающий демон.
+"""
+
+import os
+import shutil
+import threading
+import time
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+import rpc_protocol as rpc
+from aria2_client import Aria2Client
+from input_file import Entry, read_input_file
+from torrent_file import METALINK, load_torrent
+
+DEFAULT_SESSION_FILE = os.path.expanduser("~/.local/share/aria2-download-manager/aria2.session")
+
+
+class RestoreResult(NamedTuple):
+    """Итог restore: добавлено, пропущено (GID уже в демоне), ошибки, время в секундах"""
+    added: int
+    skipped: int
+    errors: List[Tuple[List[str], Any]]
+    elapsed: float
+
+
+def restore_call(uris: List[str], options: Optional[dict]) -> rpc.Call:
+    """Вызов aria2 для записи сессии
+
+    aria2 сохраняет торренты, добавленные через RPC, как путь к локальному
+    .torrent файлу - такие записи отправляются через addTorrent/addMetalink.
+    """
+    if len(uris) == 1 and "://" not in uris[0] and os.path.isfile(uris[0]):
+        torrent = load_torrent(uris[0])
+        if torrent.info.kind == METALINK:
+            return ("addMetalink", rpc.metalink_params(torrent.base64(), options))
+        return ("addTorrent", rpc.torrent_params(torrent.base64(), options))
+    return ("addUri", rpc.uri_params(uris, options))
+
+
+class SessionManager:
+    """Управляемый файл сессии одного демона
+
+    path - файл --save-session; рядом хранятся keep резервных копий
+    path.1 (самая свежая) ... path.N. Копии пишутся во временный файл с
+    fsync и переименовываются атомарно, поэтому сбой посреди ротации не
+    оставляет обрезанных файлов.
+    """
+
+    def __init__(self, client: Aria2Client, path: str = DEFAULT_SESSION_FILE, keep: int = 3):
+        self.client = client
+        self.path = path
+        self.keep = keep
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._saver: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        # False, если подключились к демону, который пишет сессию в другой файл
+        self.managed = True
+
+    def backup_path(self, index: int) -> str:
+        return f"{self.path}.{index}"
+
+    def candidates(self) -> List[str]:
+        """Файл сессии и резервные копии от новых к старым"""
+        return [self.path] + [self.backup_path(i) for i in range(1, self.keep + 1)]
+
+    @staticmethod
+    def is_valid(path: str, allow_empty: bool = False) -> bool:
+        """Файл - целая сессия aria2
+
+        У каждой записи есть URI и опция gid (aria2 пишет её всегда), файл
+        заканчивается переводом строки - обрезанная посреди записи сессия
+        не проходит. Пустой файл принимается только при allow_empty: после
+        сбоя записи он неотличим от пустой очереди.
+        """
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            if not data:
+                return allow_empty
+            if not data.endswith(b"\n"):
+                return False
+            for uris, options in read_input_file(path):
+                if not uris or not options.get("gid"):
+                    return False
+        except (OSError, UnicodeDecodeError):
+            return False
+        return True
+
+    def latest_valid(self) -> Optional[str]:
+        """Самый свежий целый файл сессии
+
+        Резервные копии пишутся только после успешного saveSession, поэтому
+        пустая копия - это пустая очередь. Пустой файл сессии принимается,
+        только если самая свежая копия тоже пуста.
+        """
+        newest = self.backup_path(1)
+        empty_queue = os.path.exists(newest) and os.path.getsize(newest) == 0
+        for path in self.candidates():
+            allow_empty = empty_queue if path == self.path else True
+            if os.path.exists(path) and self.is_valid(path, allow_empty):
+                return path
+        return None
+
+    def prepare(self) -> Optional[str]:
+        """Перед запуском демона: если файл сессии испорчен, подставляет копию
+
+        Испорченный файл без целой копии переименовывается в path.corrupt,
+        чтобы демон запустился без --input-file. Возвращает файл, из
+        которого будет восстановлена очередь.
+        """
+        source = self.latest_valid()
+        if source and source != self.path:
+            print(f"Файл сессии отсутствует или повреждён, восстанавливаю из {source}")
+            self._atomic_copy(source, self.path)
+        elif source is None and os.path.exists(self.path):
+            corrupt = f"{self.path}.corrupt"
+            print(f"Файл сессии повреждён и целой копии нет, он перемещён в {corrupt}")
+            os.replace(self.path, corrupt)
+        return source
+
+    def owns_daemon(self) -> bool:
+        """Работающий демон сохраняет сессию в наш файл (--save-session)"""
+        saved_to = self.client.get_global_options().get("save-session")
+        return bool(saved_to) and os.path.realpath(saved_to) == os.path.realpath(self.path)
+
+    def start_daemon(self, restore: bool = True) -> bool:
+        """Запускает демон с файлом сессии или подключается к работающему
+
+        Новый демон сам читает очередь из --input-file с паузами и порядком.
+        Если демон уже работал, недостающие в нём записи сессии
+        досылаются через restore - только когда он сохраняет сессию в наш
+        файл; иначе восстановление и сохранение сессии отключаются.
+        """
+        source = self.prepare()
+        if not self.client.start_aria2_daemon(session_file=self.path):
+            return False
+        self.managed = not self.client.startup.attached or self.owns_daemon()
+        if not self.managed:
+            print(f"Работающий aria2 запущен не с --save-session={self.path}: "
+                  f"сессия не восстанавливается и не сохраняется")
+            return True
+        if restore and source and self.client.startup.attached:
+            result = self.restore(source)
+            if result.added:
+                print(f"Восстановлено загрузок из сессии: {result.added} за {result.elapsed:.1f} с")
+        return True
+
+    def save(self) -> bool:
+        """Просит aria2 записать сессию и обновляет резервные копии"""
+        if not self.managed or not self.client.save_session():
+            return False
+        self.rotate()
+        return True
+
+    def rotate(self):
+        """Сдвигает копии path.1 -> path.2 ... и кладёт текущую сессию в path.1
+
+        Если сессия не изменилась с прошлой копии, ничего не делается.
+        """
+        # rotate вызывается после успешного saveSession: пустой файл - пустая очередь
+        if not self.is_valid(self.path, allow_empty=True):
+            return
+        newest = self.backup_path(1)
+        if os.path.exists(newest) and _same_content(self.path, newest):
+            return
+        for index in range(self.keep - 1, 0, -1):
+            older = self.backup_path(index)
+            if os.path.exists(older):
+                os.replace(older, self.backup_path(index + 1))
+        self._atomic_copy(self.path, newest)
+
+    @staticmethod
+    def _atomic_copy(source: str, target: str):
+        temp = f"{target}.tmp"
+        with open(source, "rb") as src, open(temp, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.replace(temp, target)
+
+    def restore(self, path: Optional[str] = None, chunk_size: int = 500) -> RestoreResult:
+        """Досылает в работающий демон записи сессии, которых в нём нет
+
+        Записи с GID, уже известным демону, пропускаются. Остальные
+        добавляются группами через system.multicall строго по порядку,
+        поэтому позиции в очереди сохраняются; pause=true и gid из файла
+        передаются как опции.
+        """
+        started = time.perf_counter()
+        entries: List[Entry] = list(read_input_file(path or self.path))
+
+        gids = [options["gid"] for _, options in entries if options.get("gid")]
+        existing = set()
+        for start in range(0, len(gids), chunk_size):
+            existing.update(self.client.get_statuses(gids[start:start + chunk_size], keys=["gid"]))
+        pending = [(uris, options) for uris, options in entries if options.get("gid") not in existing]
+
+        added = 0
+        errors: List[Tuple[List[str], Any]] = []
+        for start in range(0, len(pending), chunk_size):
+            calls = []
+            sent = []
+            for uris, options in pending[start:start + chunk_size]:
+                try:
+                    calls.append(restore_call(uris, options))
+                except (OSError, ValueError) as e:
+                    errors.append((uris, str(e)))
+                    continue
+                sent.append(uris)
+            for uris, response in zip(sent, self.client.batch(calls) if calls else []):
+                if "result" in response:
+                    added += 1
+                else:
+                    errors.append((uris, response.get("error")))
+        return RestoreResult(added, len(entries) - len(pending), errors, time.perf_counter() - started)
+
+    def start(self, interval: float = 60.0):
+        """Сохраняет сессию в фоновом потоке каждые interval секунд
+
+        Для чужого демона (managed=False) поток не запускается.
+        """
+        if not self.managed or (self._saver and self._saver.is_alive()):
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.save()
+                except OSError as e:
+                    print(f"Ошибка сохранения сессии: {e}")
+
+        self._saver = threading.Thread(target=run, daemon=True)
+        self._saver.start()
+
+    def stop(self, save: bool = True):
+        """Останавливает периодическое сохранение и сохраняет сессию последний раз"""
+        self._stop.set()
+        if self._saver:
+            self._saver.join(timeout=5)
+            self._saver = None
+        if save:
+            try:
+                self.save()
+            except OSError as e:
+                print(f"Ошибка сохранения сессии: {e}")
+
+
+def _same_content(first: str, second: str) -> bool:
+    if os.path.getsize(first) != os.path.getsize(second):
+        return False
+    with open(first, "rb") as a, open(second, "rb") as b:
+        return a.read() == b.read()
@@ -0,0 +1,336 @@
+"""
+Несколько демонов aria2c на одной машине как один менеджер загрузок
+
+ShardManager запускает и поддерживает N демонов на разных портах, у каждого
+свой секрет и файл сессии. ShardedClient распределяет новые загрузки между
+ними по политике и показывает общий список с глобальными ID вида
+"<номер демона>-<gid>".
+"""
+
+import os
+import secrets
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+import rpc_protocol as rpc
+from aria2_client import Aria2Client
+from torrent_file import TorrentFile, load_torrent
+
+DEFAULT_SESSION_DIR = os.path.expanduser("~/.local/share/aria2-download-manager/shards")
+
+# Числовые поля getGlobalStat, которые складываются по всем демонам
+_STAT_FIELDS = ("downloadSpeed", "uploadSpeed", "numActive", "numWaiting",
+                "numStopped", "numStoppedTotal")
+
+
+def make_global_id(shard: int, gid: str) -> str:
+    """Глобальный ID загрузки: номер демона и его GID"""
+    return f"{shard}-{gid}"
+
+
+def split_global_id(global_id: str) -> Tuple[int, str]:
+    """Разбирает глобальный ID на (номер демона, gid)"""
+    shard, sep, gid = global_id.partition("-")
+    if not sep or not shard.isdigit():
+        raise ValueError(f"Некорректный глобальный ID: {global_id}")
+    return int(shard), gid
+
+
+def merge_stats(stats: Iterable[Dict]) -> Dict[str, str]:
+    """Суммирует ответы getGlobalStat нескольких демонов"""
+    totals = dict.fromkeys(_STAT_FIELDS, 0)
+    for item in stats:
+        for field in _STAT_FIELDS:
+            try:
+                totals[field] += int(item.get(field, 0))
+            except (TypeError, ValueError):
+                pass
+    return {field: str(value) for field, value in totals.items()}
+
+
+class ShardPolicy(ABC):
+    """Выбор демона для новой загрузки"""
+
+    @abstractmethod
+    def choose(self, uris: List[str], clients: List[Aria2Client]) -> int:
+        """Номер демона в clients для загрузки с адресами uris"""
+
+
+class RoundRobinPolicy(ShardPolicy):
+    """По очереди"""
+
+    def __init__(self):
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def choose(self, uris: List[str], clients: List[Aria2Client]) -> int:
+        with self._lock:
+            index = self._next % len(clients)
+            self._next += 1
+            return index
+
+
+class LeastLoadedPolicy(ShardPolicy):
+    """Демон с наименьшим числом активных и ожидающих загрузок
+
+    Нагрузка запрашивается у демонов не чаще refresh_interval секунд;
+    между запросами учитываются загрузки, назначенные этой политикой.
+    """
+
+    def __init__(self, refresh_interval: float = 1.0):
+        self.refresh_interval = refresh_interval
+        self._loads: List[int] = []
+        self._refreshed = float("-inf")
+        self._lock = threading.Lock()
+
+    def choose(self, uris: List[str], clients: List[Aria2Client]) -> int:
+        with self._lock:
+            if (len(self._loads) != len(clients)
+                    or time.monotonic() - self._refreshed > self.refresh_interval):
+                self._loads = [self._load(client) for client in clients]
+                self._refreshed = time.monotonic()
+            index = min(range(len(clients)), key=self._loads.__getitem__)
+            self._loads[index] += 1
+            return index
+
+    @staticmethod
+    def _load(client: Aria2Client) -> int:
+        stats = client.get_global_stats()
+        if not stats:
+            return 1 << 30  # недоступный демон выбирается последним
+        return int(stats.get("numActive", 0)) + int(stats.get("numWaiting", 0))
+
+
+class HostAffinityPolicy(ShardPolicy):
+    """Загрузки с одного хоста попадают на один демон
+
+    Так ограничения aria2 на число соединений к серверу действуют как у
+    одного демона. Без URI (торренты) - по очереди.
+    """
+
+    def __init__(self):
+        self._fallback = RoundRobinPolicy()
+
+    def choose(self, uris: List[str], clients: List[Aria2Client]) -> int:
+        host = urlparse(uris[0]).hostname if uris else None
+        if not host:
+            return self._fallback.choose(uris, clients)
+        return zlib.crc32(host.lower().encode("utf-8")) % len(clients)
+
+
+class ShardedClient:
+    """Общий интерфейс к нескольким демонам с глобальными ID загрузок"""
+
+    def __init__(self, clients: List[Aria2Client], policy: Optional[ShardPolicy] = None):
+        if not clients:
+            raise ValueError("Нужен хотя бы один демон")
+        self.clients = clients
+        self.policy = policy or RoundRobinPolicy()
+
+    def _resolve(self, global_id: str) -> Tuple[int, Aria2Client, str]:
+        shard, gid = split_global_id(global_id)
+        if shard >= len(self.clients):
+            raise ValueError(f"Нет демона с номером {shard}")
+        return shard, self.clients[shard], gid
+
+    def _globalize(self, shard: int, download: Dict) -> Dict:
+        download = dict(download)
+        download["gid"] = make_global_id(shard, download["gid"])
+        download["shard"] = shard
+        return download
+
+    def add_download(self, url: str, options: Optional[Dict] = None) -> Optional[str]:
+        """Добавляет загрузку на выбранный политикой демон"""
+        shard = self.policy.choose([url], self.clients)
+        gid = self.clients[shard].add_download(url, options)
+        return make_global_id(shard, gid) if gid else None
+
+    def bulk_add(self, items: Iterable[rpc.AddItem], chunk_size: int = 500) -> Iterator[rpc.AddResult]:
+        """Массовое добавление с распределением элементов политикой
+
+        Группы разных демонов отправляются параллельно, результаты выдаются
+        в исходном порядке с глобальными ID.
+        """
+        with ThreadPoolExecutor(max_workers=len(self.clients)) as pool:
+            start = 0
+            for chunk in rpc.chunked(items, chunk_size * len(self.clients)):
+                groups: Dict[int, List[Tuple[int, Tuple[List[str], Optional[Dict]]]]] = {}
+                for offset, entry in enumerate(chunk):
+                    shard = self.policy.choose(entry[0], self.clients)
+                    groups.setdefault(shard, []).append((start + offset, entry))
+
+                futures = {
+                    shard: pool.submit(self.clients[shard].batch,
+                                       rpc.add_uri_calls([entry for _, entry in group]))
+                    for shard, group in groups.items()
+                }
+                results = []
+                for shard, group in groups.items():
+                    for (index, (uris, _)), response in zip(group, futures[shard].result()):
+                        gid = response.get("result")
+                        global_id = make_global_id(shard, gid) if gid else None
+                        results.append(rpc.AddResult(index, uris, global_id, response.get("error")))
+                results.sort(key=lambda result: result.index)
+                yield from results
+                start += len(chunk)
+
+    def add_torrent(self, torrent_path: str, options: Optional[Dict] = None) -> Optional[str]:
+        """Добавляет торрент; если он уже есть на каком-то демоне, возвращает его ID"""
+        try:
+            torrent = load_torrent(torrent_path)
+        except (OSError, ValueError) as e:
+            print(f"Ошибка добавления торрента: {e}")
+            return None
+        gids = self.add_torrent_file(torrent, options)
+        return gids[0] if gids else None
+
+    def add_torrent_file(self, torrent: TorrentFile, options: Optional[Dict] = None) -> List[str]:
+        """Отправляет прочитанный торрент или metalink на выбранный демон"""
+        if torrent.info.info_hash:
+            for shard, client in enumerate(self.clients):
+                existing = client.find_by_info_hash(torrent.info.info_hash)
+                if existing:
+                    return [make_global_id(shard, existing)]
+        shard = self.policy.choose([], self.clients)
+        gids = self.clients[shard].add_torrent_file(torrent, options, dedupe=False)
+        return [make_global_id(shard, gid) for gid in gids]
+
+    def pause_download(self, global_id: str) -> bool:
+        """Ставит загрузку на паузу по глобальному ID"""
+        _, client, gid = self._resolve(global_id)
+        return client.pause_download(gid)
+
+    def unpause_download(self, global_id: str) -> bool:
+        """Возобновляет загрузку по глобальному ID"""
+        _, client, gid = self._resolve(global_id)
+        return client.unpause_download(gid)
+
+    def remove_download(self, global_id: str) -> bool:
+        """Удаляет загрузку по глобальному ID"""
+        _, client, gid = self._resolve(global_id)
+        return client.remove_download(gid)
+
+    def get_download_status(self, global_id: str, keys: rpc.Keys = None) -> Dict:
+        """Статус загрузки по глобальному ID"""
+        shard, client, gid = self._resolve(global_id)
+        status = client.get_download_status(gid, keys)
+        return self._globalize(shard, status) if status else {}
+
+    def get_all_downloads(self, keys: rpc.Keys = None, limit: Optional[int] = None,
+                          chunk_size: int = 1000) -> List[Dict]:
+        """Общий список загрузок всех демонов с глобальными ID
+
+        gid заменяется глобальным ID, в поле shard - номер демона. По
+        умолчанию (limit=None) очереди каждого демона дочитываются
+        страницами по chunk_size, иначе с демона берутся первые limit записей.
+        """
+        downloads = []
+        for shard, client in enumerate(self.clients):
+            shard_downloads, _ = client.get_snapshot(keys, limit, chunk_size)
+            downloads.extend(self._globalize(shard, download) for download in shard_downloads)
+        return downloads
+
+    def get_global_stats(self) -> Dict:
+        """Суммарная статистика всех демонов"""
+        return merge_stats(client.get_global_stats() for client in self.clients)
+
+    def close(self):
+        for client in self.clients:
+            client.close()
+
+
+class ShardManager:
+    """Запускает и поддерживает несколько демонов aria2c на одной машине
+
+    Демон i слушает ports[i] (по умолчанию base_port + i). Секрет и файл
+    сессии хранятся в session_dir и переживают перезапуск: уже работающие
+    демоны подхватываются, а не запускаются заново.
+    """
+
+    def __init__(self, count: int = 4, base_port: int = 6801, session_dir: str = DEFAULT_SESSION_DIR,
+                 host: str = "http://localhost", ports: Optional[List[int]] = None):
+        self.ports = list(ports) if ports else [base_port + i for i in range(count)]
+        self.session_dir = session_dir
+        os.makedirs(session_dir, exist_ok=True)
+        self.clients = [
+            Aria2Client(host=host, port=port, secret=self._load_secret(shard))
+            for shard, port in enumerate(self.ports)
+        ]
+        self._supervisor: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._foreign: Set[int] = set()
+
+    def session_file(self, shard: int) -> str:
+        return os.path.join(self.session_dir, f"shard-{shard}.session")
+
+    def _load_secret(self, shard: int) -> str:
+        """Секрет демона; создаётся при первом запуске с правами 0600"""
+        path = os.path.join(self.session_dir, f"shard-{shard}.secret")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            secret = secrets.token_hex(16)
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(secret)
+            return secret
+
+    def _start_shard(self, shard: int) -> bool:
+        return self.clients[shard].start_aria2_daemon(session_file=self.session_file(shard))
+
+    def start(self) -> bool:
+        """Подключается ко всем демонам или запускает их параллельно"""
+        with ThreadPoolExecutor(max_workers=len(self.clients)) as pool:
+            return all(pool.map(self._start_shard, range(len(self.clients))))
+
+    def check(self) -> List[int]:
+        """Перезапускает не отвечающие демоны; возвращает их номера
+
+        Порт, на котором отвечает демон с другим секретом, занят не нами:
+        такой демон пропускается (с одним сообщением), а не перезапускается.
+        """
+        restarted = []
+        for shard, client in enumerate(self.clients):
+            response = client.probe()
+            if response is not None and "error" in response:
+                if shard not in self._foreign:
+                    print(f"Порт {self.ports[shard]} занят чужим демоном aria2 "
+                          f"(ошибка авторизации), демон {shard} пропущен")
+                    self._foreign.add(shard)
+                continue
+            self._foreign.discard(shard)
+            if response is None or "result" not in response:
+                print(f"Демон {shard} (порт {self.ports[shard]}) не отвечает, перезапуск")
+                self._start_shard(shard)
+                restarted.append(shard)
+        return restarted
+
+    def start_supervisor(self, interval: float = 10.0):
+        """Проверяет демоны в фоновом потоке каждые interval секунд"""
+        if self._supervisor and self._supervisor.is_alive():
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                self.check()
+
+        self._supervisor = threading.Thread(target=run, daemon=True)
+        self._supervisor.start()
+
+    def client(self, policy: Optional[ShardPolicy] = None) -> ShardedClient:
+        """Общий клиент ко всем демонам"""
+        return ShardedClient(self.clients, policy)
+
+    def shutdown(self):
+        """Останавливает надзор и все демоны (сессии сохраняются aria2)"""
+        self._stop.set()
+        for client in self.clients:
+            client.shutdown()
+            client.close()
@@ -4,28 +4,62 @@ import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import sys
 import os
+import time
 
 # Добавляем текущую директорию в путь
 sys.path.insert(0, os.path.dirname(__file__))
 
 from aria2_client import Aria2Client
+from download_list import DownloadListView
+from download_store import DownloadStore
+from eta import DEFAULT_MAX_CONCURRENT, EtaEstimator
+from gui_worker import RpcWorker
+from scheduler import AdaptiveScheduler
+from session import DEFAULT_SESSION_FILE, SessionManager
+from speed_history import SpeedHistory
+from torrent_file import load_torrent
+from utils import format_size, format_speed, format_time
 
 
 class DownloadGUI:
     """Полная версия GUI с расширенным функционалом"""
     
-    def __init__(self):
+    def __init__(self, client=None, session_file=DEFAULT_SESSION_FILE):
+        """client - готовый Aria2Client (например, к фейковому демону в тестах)"""
         self.root = tk.Tk()
         self.root.title("Aria2 Download Manager")
         self.root.geometry("900x450")
         
         # Инициализация aria2 клиента
-        self.aria2_client = Aria2Client()
-        
-        if not self.aria2_client.start_aria2_daemon():
-            messagebox.showerror("Ошибка", "Не удалось запустить aria2. Проверьте подключение.")
-        else:
-            self.setup_main_ui_clean()
+        self.aria2_client = client or Aria2Client()
+        # Очередь переживает перезапуск aria2: файл сессии с резервными копиями
+        self.session = SessionManager(self.aria2_client, session_file)
+        # Последнее известное состояние загрузок с индексами по GID и статусу
+        self.store = DownloadStore()
+        # История скоростей в буферах фиксированного размера
+        self.speed_history = SpeedHistory()
+        # Сглаженные ETA загрузок и всей очереди
+        self.eta = EtaEstimator()
+        self.max_concurrent = DEFAULT_MAX_CONCURRENT
+        # Все вызовы aria2 идут через фоновый поток, чтобы окно не зависало.
+        # Пока aria2 не готов, команды пользователя копятся в буфере
+        self.worker = RpcWorker(self.root, hold=True)
+        self.connection_state = "connecting"
+        
+        # Интервал автообновления подстраивается под активность и видимость окна
+        self.scheduler = AdaptiveScheduler(min_interval=1.0, max_interval=15.0, hidden_interval=60.0)
+        self.auto_refresh_active = False
+        self.window_visible = True
+        self._refresh_after_id = None
+        self._refresh_started = 0.0
+        self.root.bind("<Map>", self._on_window_map)
+        self.root.bind("<Unmap>", self._on_window_unmap)
+        self.root.bind_all("<ButtonPress>", self._on_user_input, add="+")
+        self.root.bind_all("<KeyPress>", self._on_user_input, add="+")
+        
+        # Окно появляется сразу, aria2 ищется и запускается в фоне
+        self.setup_main_ui_clean()
+        self.connect_aria2()
         
     def setup_debug_ui(self):
         """Настройка отладочного интерфейса"""
@@ -76,28 +110,30 @@ class DownloadGUI:
         ttk.Button(control_frame, text="🧲 Добавить торрент", 
                   command=self.add_torrent_dialog).pack(side=tk.LEFT, padx=(0, 5))
         ttk.Button(control_frame, text="Обновить список", 
-                  command=self.refresh_downloads).pack(side=tk.LEFT, padx=(0, 10))
+                  command=self.request_refresh).pack(side=tk.LEFT, padx=(0, 10))
         
         # Кнопки управления загрузками
         ttk.Button(control_frame, text="⏸️ Пауза/Возобновить", 
                   command=self.toggle_last_download).pack(side=tk.LEFT, padx=(0, 5))
         ttk.Button(control_frame, text="🗑️ Удалить загрузку", 
                   command=self.remove_last_download).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(control_frame, text="🧹 Очистить завершённые", 
+                  command=self.purge_finished).pack(side=tk.LEFT, padx=(0, 5))
         ttk.Button(control_frame, text="📁 Открыть папку", 
                   command=self.open_downloads_folder).pack(side=tk.LEFT, padx=(0, 10))
         ttk.Button(control_frame, text="🔥 Удалить файл", 
                   command=self.delete_last_file).pack(side=tk.LEFT)
         
-        # Список загрузок (простой)
-        downloads_frame = ttk.LabelFrame(self.root, text="Загрузки")
-        downloads_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
+        # Список загрузок
+        self.downloads_frame = ttk.LabelFrame(self.root, text="Загрузки")
+        self.downloads_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
         
-        self.downloads_text = tk.Text(downloads_frame, height=8, font=("Consolas", 10))
-        downloads_scroll = ttk.Scrollbar(downloads_frame, orient=tk.VERTICAL, command=self.downloads_text.yview)
-        self.downloads_text.configure(yscrollcommand=downloads_scroll.set)
+        self.download_list = DownloadListView(self.downloads_frame, height=8)
+        self.download_list.pack(fill=tk.BOTH, expand=True)
         
-        self.downloads_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(5, 0), pady=5)
-        downloads_scroll.pack(side=tk.RIGHT, fill=tk.Y, padx=(0, 5), pady=5)
+        # Общая скорость за последние 5 минут
+        self.speed_label = ttk.Label(self.downloads_frame, text="", font=("TkFixedFont", 9))
+        self.speed_label.pack(fill=tk.X, padx=5, pady=(0, 5))
         
         self.status_label.config(text="Готов к работе")
         
@@ -124,6 +160,10 @@ class DownloadGUI:
         self.status_label = ttk.Label(control_top_frame, text="Готов к работе")
         self.status_label.pack(side=tk.RIGHT)
         
+        # Показывается, только если подключиться к aria2 не удалось
+        self.reconnect_button = ttk.Button(control_top_frame, text="🔌 Переподключить",
+                                           command=self.connect_aria2)
+        
         # Кнопки управления - первый ряд
         control_frame1 = ttk.Frame(main_frame)
         control_frame1.pack(fill=tk.X, pady=(0, 5))
@@ -135,7 +175,7 @@ class DownloadGUI:
         ttk.Button(control_frame1, text="🧪 Тест", 
                   command=self.add_download).pack(side=tk.LEFT, padx=(0, 3))
         ttk.Button(control_frame1, text="🔄 Обновить", 
-                  command=self.refresh_downloads).pack(side=tk.LEFT, padx=(0, 10))
+                  command=self.request_refresh).pack(side=tk.LEFT, padx=(0, 10))
         
         # Кнопки управления - второй ряд
         control_frame2 = ttk.Frame(main_frame)
@@ -145,23 +185,79 @@ class DownloadGUI:
                   command=self.toggle_last_download).pack(side=tk.LEFT, padx=(0, 3))
         ttk.Button(control_frame2, text="🗑️ Удалить", 
                   command=self.remove_last_download).pack(side=tk.LEFT, padx=(0, 3))
+        ttk.Button(control_frame2, text="🧹 Очистить", 
+                  command=self.purge_finished).pack(side=tk.LEFT, padx=(0, 3))
         ttk.Button(control_frame2, text="📁 Папка", 
                   command=self.open_downloads_folder).pack(side=tk.LEFT, padx=(0, 3))
         
         # Список загрузок
-        downloads_frame = ttk.LabelFrame(main_frame, text="Загрузки")
-        downloads_frame.pack(fill=tk.BOTH, expand=True)
+        self.downloads_frame = ttk.LabelFrame(main_frame, text="Загрузки")
+        self.downloads_frame.pack(fill=tk.BOTH, expand=True)
         
-        self.downloads_text = tk.Text(downloads_frame, height=12, font=("Consolas", 10))
-        downloads_scroll = ttk.Scrollbar(downloads_frame, orient=tk.VERTICAL, command=self.downloads_text.yview)
-        self.downloads_text.configure(yscrollcommand=downloads_scroll.set)
+        self.download_list = DownloadListView(self.downloads_frame, height=12)
+        self.download_list.pack(fill=tk.BOTH, expand=True)
         
-        self.downloads_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(5, 0), pady=5)
-        downloads_scroll.pack(side=tk.RIGHT, fill=tk.Y, padx=(0, 5), pady=5)
+        # Общая скорость за последние 5 минут
+        self.speed_label = ttk.Label(self.downloads_frame, text="", font=("TkFixedFont", 9))
+        self.speed_label.pack(fill=tk.X, padx=5, pady=(0, 5))
         
         # Запускаем автоматическое обновление
         self.start_auto_refresh()
         
+    def connect_aria2(self):
+        """Подключается к aria2 или запускает его в фоновом потоке
+        
+        До готовности команды пользователя не теряются: worker копит их и
+        выполняет после подключения.
+        """
+        self.connection_state = "connecting"
+        self.worker.hold()
+        self.reconnect_button.pack_forget()
+        self.worker.submit(self.session.start_daemon, key="connect", urgent=True,
+                           on_done=self._on_aria2_ready,
+                           on_error=lambda e: self._on_aria2_ready(False, str(e)))
+        self._show_connecting()
+    
+    def _on_global_options(self, options):
+        """Лимит одновременных загрузок нужен для оценки времени очереди"""
+        try:
+            self.max_concurrent = int(options.get("max-concurrent-downloads", DEFAULT_MAX_CONCURRENT))
+        except (TypeError, ValueError):
+            pass
+    
+    def _show_connecting(self):
+        """Статус подключения с числом отложенных команд"""
+        if self.connection_state != "connecting":
+            return
+        text = "⏳ Подключение к aria2..."
+        queued = self.worker.held_count
+        if queued:
+            text += f" (ожидают команды: {queued})"
+        self.status_label.config(text=text)
+        self.root.after(250, self._show_connecting)
+    
+    def _on_aria2_ready(self, ok, error=None):
+        """Итог подключения: выполняем накопленные команды или предлагаем повторить"""
+        startup = self.aria2_client.startup
+        if ok:
+            self.connection_state = "ready"
+            queued = self.worker.held_count
+            action = "подключен" if startup.attached else "запущен"
+            self.status_label.config(text=f"✅ aria2 {action} за {startup.elapsed * 1000:.0f} мс")
+            self.worker.release()
+            if queued:
+                self.log(f"Выполняю отложенные команды: {queued}")
+            self.request_refresh()
+            self.worker.submit(self.aria2_client.get_global_options,
+                               on_done=self._on_global_options)
+            self.session.start()
+        else:
+            self.connection_state = "failed"
+            error = error or (startup.error if startup else "неизвестная ошибка")
+            self.status_label.config(text=f"❌ aria2 недоступен: {error}")
+            self.log(f"❌ Не удалось подключиться к aria2: {error}")
+            self.reconnect_button.pack(side=tk.RIGHT, padx=(0, 10))
+    
     def log(self, message):
         """Заглушка для логирования"""
         pass
@@ -173,22 +269,32 @@ class DownloadGUI:
     def test_aria2(self):
         """Тестирует aria2"""
         self.log("=== ТЕСТ ARIA2 ===")
-        
+        self.worker.submit(self._probe_aria2, on_done=self._log_lines)
+    
+    def _log_lines(self, lines):
+        """Выводит в лог строки, подготовленные фоновой задачей"""
+        for line in lines:
+            self.log(line)
+    
+    @staticmethod
+    def _probe_aria2():
+        """Проверяет бинарник и демон aria2 (выполняется в фоновом потоке)"""
         import subprocess
+        lines = []
         paths = ["/usr/bin/aria2c", "aria2c"]
         
         for path in paths:
-            self.log(f"Тестирую: {path}")
+            lines.append(f"Тестирую: {path}")
             try:
                 result = subprocess.run([path, "--version"], 
                                       capture_output=True, text=True, timeout=3)
                 if result.returncode == 0:
                     version = result.stdout.split()[2] if len(result.stdout.split()) > 2 else "unknown"
-                    self.log(f"✅ {path} работает, версия: {version}")
+                    lines.append(f"✅ {path} работает, версия: {version}")
                 else:
-                    self.log(f"❌ Ошибка: {result.stderr}")
+                    lines.append(f"❌ Ошибка: {result.stderr}")
             except Exception as e:
-                self.log(f"❌ Исключение: {e}")
+                lines.append(f"❌ Исключение: {e}")
         
         # Тест подключения к демону
         try:
@@ -199,11 +305,12 @@ class DownloadGUI:
                 timeout=3
             )
             if response.status_code == 200:
-                self.log("✅ Подключение к демону работает")
+                lines.append("✅ Подключение к демону работает")
             else:
-                self.log(f"❌ Ошибка подключения: {response.status_code}")
+                lines.append(f"❌ Ошибка подключения: {response.status_code}")
         except Exception as e:
-            self.log(f"❌ Ошибка подключения: {e}")
+            lines.append(f"❌ Ошибка подключения: {e}")
+        return lines
             
     def add_url_dialog(self):
         """Диалог для ввода URL пользователем"""
@@ -236,41 +343,35 @@ class DownloadGUI:
         else:
             self.log(f"Выбрана папка: {folder}")
         
-        try:
-            options = {"dir": folder}
-            self.log(f"Опции загрузки: {options}")
-            
-            gid = self.aria2_client.add_download(url, options)
-            if gid:
-                self.log(f"✅ Загрузка добавлена: {gid}")
-                self.refresh_downloads()
-            else:
-                self.log("❌ Не удалось добавить загрузку")
-        except Exception as e:
-            self.log(f"❌ Ошибка добавления загрузки: {e}")
-            import traceback
-            self.log(f"Детали ошибки: {traceback.format_exc()}")
+        options = {"dir": folder}
+        self.log(f"Опции загрузки: {options}")
+        self.worker.submit(self.aria2_client.add_download, url, options,
+                           on_done=self._on_download_added,
+                           on_error=self._on_download_add_error)
 
     def add_download(self):
         """Добавляет тестовую загрузку"""
         url = "http://httpbin.org/bytes/1024"  # Простой тестовый файл
         self.log(f"Добавляю тестовую загрузку: {url}")
         
-        try:
-            # Тестируем с опциями
-            options = {"dir": os.path.expanduser("~/Downloads")}
-            self.log(f"Опции загрузки: {options}")
-            
-            gid = self.aria2_client.add_download(url, options)
-            if gid:
-                self.log(f"✅ Загрузка добавлена: {gid}")
-                self.refresh_downloads()
-            else:
-                self.log("❌ Не удалось добавить загрузку")
-        except Exception as e:
-            self.log(f"❌ Ошибка добавления загрузки: {e}")
-            import traceback
-            self.log(f"Детали ошибки: {traceback.format_exc()}")
+        # Тестируем с опциями
+        options = {"dir": os.path.expanduser("~/Downloads")}
+        self.log(f"Опции загрузки: {options}")
+        self.worker.submit(self.aria2_client.add_download, url, options,
+                           on_done=self._on_download_added,
+                           on_error=self._on_download_add_error)
+    
+    def _on_download_added(self, gid):
+        """Результат добавления загрузки"""
+        if gid:
+            self.log(f"✅ Загрузка добавлена: {gid}")
+            self.request_refresh()
+        else:
+            self.log("❌ Не удалось добавить загрузку")
+    
+    def _on_download_add_error(self, error):
+        """Ошибка добавления загрузки"""
+        self.log(f"❌ Ошибка добавления загрузки: {error}")
     
     def add_torrent_dialog(self):
         """Диалог добавления торрента"""
@@ -282,7 +383,8 @@ class DownloadGUI:
         torrent_path = filedialog.askopenfilename(
             title="Выберите торрент файл",
             initialdir=os.path.expanduser("~/Загрузки"),
-            filetypes=[("Торрент файлы", "*.torrent"), ("Все файлы", "*.*")]
+            filetypes=[("Торрент файлы", "*.torrent"), ("Metalink", "*.metalink *.meta4"),
+                       ("Все файлы", "*.*")]
         )
         
         if not torrent_path:
@@ -308,36 +410,49 @@ class DownloadGUI:
         else:
             self.log(f"Выбрана папка: {folder}")
         
-        try:
-            # Добавляем опции
-            options = {"dir": folder}
-            self.log(f"Опции загрузки: {options}")
-            
-            # Проверяем размер файла
-            file_size = os.path.getsize(torrent_path)
-            self.log(f"Размер торрент файла: {file_size} байт")
-            
-            # Пробуем прочитать первые байты файла для проверки
-            with open(torrent_path, 'rb') as f:
-                first_bytes = f.read(10)
-                self.log(f"Первые байты файла: {first_bytes}")
-            
-            self.log("Вызываю aria2_client.add_torrent...")
-            gid = self.aria2_client.add_torrent(torrent_path, options)
-            self.log(f"Результат add_torrent: {gid}")
-            
-            if gid:
-                self.log(f"✅ Торрент добавлен: {gid}")
-                messagebox.showinfo("Успех", f"Торрент добавлен: {gid}")
-                self.refresh_downloads()
-            else:
-                self.log("❌ Не удалось добавить торрент - aria2 вернул None")
-                messagebox.showerror("Ошибка", "Не удалось добавить торрент")
-        except Exception as e:
-            self.log(f"❌ Ошибка добавления торрента: {e}")
-            import traceback
-            self.log(f"Трассировка: {traceback.format_exc()}")
-            messagebox.showerror("Ошибка", f"Ошибка добавления торрента:\n{e}")
+        # Добавляем опции
+        options = {"dir": folder}
+        self.log(f"Опции загрузки: {options}")
+        
+        # Файл читается и разбирается один раз в фоновом потоке
+        self.worker.submit(load_torrent, torrent_path,
+                           on_done=lambda torrent: self._on_torrent_loaded(torrent, options),
+                           on_error=self._on_torrent_add_error)
+    
+    def _on_torrent_loaded(self, torrent, options):
+        """Показывает сводку торрента и отправляет уже прочитанные данные в aria2"""
+        info = torrent.info
+        self._log_lines([
+            f"📦 {info.name}",
+            f"Размер: {format_size(info.total_length)}, файлов: {info.file_count}",
+        ] + ([f"Info-hash: {info.info_hash}"] if info.info_hash else []))
+        
+        self.worker.submit(self.aria2_client.add_torrent_file, torrent, options,
+                           on_done=lambda gids: self._on_torrent_added(gids[0] if gids else None),
+                           on_error=self._on_torrent_add_error)
+    
+    def _on_torrent_added(self, gid):
+        """Результат добавления торрента"""
+        from tkinter import messagebox
+        
+        self.log(f"Результат add_torrent: {gid}")
+        if gid and gid in self.store:
+            self.log(f"ℹ️ Торрент уже в очереди: {gid}")
+            messagebox.showinfo("Уже в очереди", f"Этот торрент уже добавлен: {gid}")
+        elif gid:
+            self.log(f"✅ Торрент добавлен: {gid}")
+            messagebox.showinfo("Успех", f"Торрент добавлен: {gid}")
+            self.request_refresh()
+        else:
+            self.log("❌ Не удалось добавить торрент - aria2 вернул None")
+            messagebox.showerror("Ошибка", "Не удалось добавить торрент")
+    
+    def _on_torrent_add_error(self, error):
+        """Ошибка добавления торрента"""
+        from tkinter import messagebox
+        
+        self.log(f"❌ Ошибка добавления торрента: {error}")
+        messagebox.showerror("Ошибка", f"Ошибка добавления торрента:\n{error}")
     
     def test_torrent(self):
         """Тестирует добавление торрента (старая функция)"""
@@ -357,167 +472,147 @@ class DownloadGUI:
         
         self.log(f"Выбран торрент: {torrent_path}")
         
-        try:
-            gid = self.aria2_client.add_torrent(torrent_path)
-            if gid:
-                self.log(f"✅ Торрент добавлен: {gid}")
-                self.refresh_downloads()
-            else:
-                self.log("❌ Не удалось добавить торрент")
-        except Exception as e:
-            self.log(f"❌ Ошибка добавления торрента: {e}")
+        self.worker.submit(self.aria2_client.add_torrent, torrent_path,
+                           on_done=self._on_download_added,
+                           on_error=lambda e: self.log(f"❌ Ошибка добавления торрента: {e}"))
             
     def refresh_downloads(self):
-        """Обновляет список загрузок с прогрессом"""
+        """Запрашивает список загрузок в фоне
+        
+        Очереди читаются целиком, чтобы в таблице были все загрузки, а не
+        только первые страницы. Пока предыдущий запрос не завершился,
+        новые не ставятся в очередь.
+        """
+        if self.worker.submit(lambda: self.aria2_client.get_snapshot("list", limit=None),
+                              on_done=self._render_downloads,
+                              on_error=lambda e: self.log(f"❌ Ошибка обновления списка: {e}"),
+                              key="refresh"):
+            self._refresh_started = time.perf_counter()
+    
+    def _render_downloads(self, snapshot):
+        """Отображает список загрузок с прогрессом и историю скорости"""
         try:
-            downloads = self.aria2_client.get_all_downloads()
-            self.downloads_text.delete(1.0, tk.END)
+            downloads, stats = snapshot
+            self.store.update_many(downloads, complete=True)
+            active = self.store.by_status("active")
+            self.speed_history.record(stats, active)
+            etas = self.eta.update(active)
+            changed = self.download_list.update(self.store.records(), etas)
             
-            if downloads:
-                self.downloads_text.insert(tk.END, "=" * 80 + "\n")
-                self.downloads_text.insert(tk.END, "📋 АКТИВНЫЕ ЗАГРУЗКИ\n")
-                self.downloads_text.insert(tk.END, "=" * 80 + "\n\n")
-                
-                active_count = 0
-                for download in downloads:
-                    gid = download.get("gid", "")[:8]
-                    status = download.get("status", "unknown")
-                    files = download.get("files", [])
-                    filename = "unknown"
-                    if files:
-                        filename = os.path.basename(files[0].get("path", "unknown"))
-                    
-                    # Получаем детальную информацию
-                    total_length = int(download.get("totalLength", 0))
-                    completed_length = int(download.get("completedLength", 0))
-                    download_speed = int(download.get("downloadSpeed", 0))
-                    
-                    # Форматируем размеры
-                    def format_size(bytes_num):
-                        for unit in ['B', 'KB', 'MB', 'GB']:
-                            if bytes_num < 1024.0:
-                                return f"{bytes_num:.1f} {unit}"
-                            bytes_num /= 1024.0
-                        return f"{bytes_num:.1f} TB"
-                    
-                    def format_speed(bytes_per_sec):
-                        return format_size(bytes_per_sec) + "/s"
-                    
-                    # Вычисляем прогресс
-                    if total_length > 0:
-                        progress = (completed_length / total_length) * 100
-                        progress_bar = "█" * int(progress / 5) + "░" * (20 - int(progress / 5))
-                        size_info = f"{format_size(completed_length)} / {format_size(total_length)}"
-                    else:
-                        progress = 0
-                        progress_bar = "░" * 20
-                        size_info = format_size(completed_length)
-                    
-                    # Скорость и ETA
-                    if download_speed > 0:
-                        speed_info = format_speed(download_speed)
-                        if total_length > completed_length:
-                            eta_seconds = (total_length - completed_length) / download_speed
-                            eta_info = f"ETA: {int(eta_seconds//60)}:{int(eta_seconds%60):02d}"
-                        else:
-                            eta_info = "Завершено"
-                    else:
-                        speed_info = "0 B/s"
-                        eta_info = "∞"
-                    
-                    # Статус
-                    status_emoji = {
-                        "active": "🔄",
-                        "paused": "⏸️", 
-                        "complete": "✅",
-                        "error": "❌",
-                        "removed": "🗑️"
-                    }.get(status, "❓")
-                    
-                    if status == "active":
-                        active_count += 1
-                    
-                    # Выводим информацию о загрузке
-                    self.downloads_text.insert(tk.END, f"📁 {filename}\n")
-                    self.downloads_text.insert(tk.END, f"🆔 {gid} | {status_emoji} {status.upper()}\n")
-                    self.downloads_text.insert(tk.END, f"📊 [{progress_bar}] {progress:.1f}%\n")
-                    self.downloads_text.insert(tk.END, f"💾 {size_info}\n")
-                    self.downloads_text.insert(tk.END, f"⚡ {speed_info} | ⏱️ {eta_info}\n")
-                    self.downloads_text.insert(tk.END, "-" * 60 + "\n\n")
-                
-                # Итоговая статистика
-                self.downloads_text.insert(tk.END, f"📈 ИТОГО: {len(downloads)} загрузок, активных: {active_count}\n")
-            else:
-                self.downloads_text.insert(tk.END, "📭 Нет загрузок\n")
-                
-            self.log(f"Обновлен список: {len(downloads)} загрузок")
+            # Стоимость цикла: запрос к aria2 плюс отрисовка
+            self.scheduler.record_tick(time.perf_counter() - self._refresh_started,
+                                       busy=bool(changed) or self.store.count("active") > 0)
+            
+            # Итоговая статистика
+            text = f"Загрузки: {len(self.store)}, активных: {len(active)}"
+            drain = self.eta.queue_drain(active, self.store.by_status("waiting"), self.max_concurrent)
+            if drain:
+                text += f", очередь завершится через {format_time(drain)}"
+            self.downloads_frame.config(text=text)
+            self._render_speed()
+            self.log(f"Обновлен список: {len(self.store)} загрузок")
         except Exception as e:
             self.log(f"❌ Ошибка обновления списка: {e}")
     
+    def _render_speed(self):
+        """Спарклайн общей скорости с её средним и пиком"""
+        summary = self.speed_history.summary(seconds=300)
+        self.speed_label.config(
+            text=f"{self.speed_history.sparkline(seconds=300, width=60)}  "
+                 f"среднее {format_speed(int(summary['mean']))}, пик {format_speed(int(summary['peak']))}"
+        )
+    
+    def _target_records(self, statuses=None):
+        """Выделенные в списке загрузки, а без выделения - первая подходящая"""
+        gids = self.download_list.selected_gids()
+        if gids:
+            return [record for record in map(self.store.get, gids) if record is not None]
+        record = self.store.first(statuses) if statuses else self.store.first()
+        return [record] if record else []
+    
+    @staticmethod
+    def _describe(records):
+        if len(records) == 1:
+            return f"{records[0].name} ({records[0].gid[:8]})"
+        return f"{len(records)} загрузок"
+    
     def toggle_last_download(self):
-        """Переключает паузу/возобновление последней загрузки"""
+        """Пауза/возобновление выделенных загрузок (или последней) одним запросом"""
         try:
-            downloads = self.aria2_client.get_all_downloads()
-            if not downloads:
+            if not len(self.store):
                 self.log("❌ Нет загрузок для управления")
                 return
             
-            # Берем последнюю активную загрузку
-            last_download = None
-            for download in downloads:
-                if download.get("status") in ["active", "paused"]:
-                    last_download = download
-                    break
-            
-            if not last_download:
+            records = self._target_records(("active", "paused"))
+            if not records:
                 self.log("❌ Нет активных загрузок")
                 return
             
-            gid = last_download.get("gid")
-            status = last_download.get("status")
-            filename = "unknown"
-            files = last_download.get("files", [])
-            if files:
-                filename = os.path.basename(files[0].get("path", "unknown"))
+            gids = [record.gid for record in records]
+            description = self._describe(records)
             
-            if status == "active":
-                self.aria2_client.pause_download(gid)
-                self.log(f"⏸️ Пауза: {filename} ({gid[:8]})")
-            elif status == "paused":
-                self.aria2_client.unpause_download(gid)
-                self.log(f"▶️ Возобновлено: {filename} ({gid[:8]})")
+            # Если среди выделенных есть активные - ставим на паузу, иначе возобновляем
+            if any(record.status in ("active", "waiting") for record in records):
+                self.worker.submit(
+                    self.aria2_client.pause_downloads, gids,
+                    on_done=lambda result: self._on_bulk_command(result, "paused",
+                                                                 f"⏸️ Пауза: {description}")
+                )
+            else:
+                self.worker.submit(
+                    self.aria2_client.unpause_downloads, gids,
+                    on_done=lambda result: self._on_bulk_command(result, "waiting",
+                                                                 f"▶️ Возобновлено: {description}")
+                )
                 
         except Exception as e:
             self.log(f"❌ Ошибка управления загрузкой: {e}")
     
     def remove_last_download(self):
-        """Удаляет последнюю загрузку"""
+        """Удаляет выделенные загрузки (или последнюю) одним запросом"""
         try:
-            downloads = self.aria2_client.get_all_downloads()
-            if not downloads:
+            records = self._target_records()
+            if not records:
                 self.log("❌ Нет загрузок для удаления")
                 return
             
-            # Берем последнюю загрузку
-            last_download = downloads[0]
-            gid = last_download.get("gid")
-            filename = "unknown"
-            files = last_download.get("files", [])
-            if files:
-                filename = os.path.basename(files[0].get("path", "unknown"))
+            gids = [record.gid for record in records]
+            description = self._describe(records)
             
             # Подтверждение удаления
             from tkinter import messagebox
             if messagebox.askyesno("Подтверждение", 
-                                 f"Удалить загрузку?\n{filename}\n\nЭто остановит загрузку, но файл останется."):
-                self.aria2_client.remove_download(gid)
-                self.log(f"🗑️ Удалена загрузка: {filename} ({gid[:8]})")
+                                 f"Удалить загрузку?\n{description}\n\nЭто остановит загрузку, но файл останется."):
+                self.worker.submit(
+                    self.aria2_client.remove_downloads, gids,
+                    on_done=lambda result: self._on_bulk_command(result, "removed",
+                                                                 f"🗑️ Удалено: {description}")
+                )
             else:
                 self.log("❌ Удаление отменено")
                 
         except Exception as e:
             self.log(f"❌ Ошибка удаления загрузки: {e}")
     
+    def purge_finished(self):
+        """Убирает из списка завершённые и удалённые загрузки"""
+        self.worker.submit(
+            self.aria2_client.purge_download_results,
+            on_done=lambda ok: (self.log("🧹 Завершённые загрузки убраны из списка" if ok
+                                         else "❌ aria2 отклонил очистку списка"),
+                                self.request_refresh())
+        )
+    
+    def _on_bulk_command(self, result, status, message):
+        """Результат массовой команды: сразу отражаем его в хранилище"""
+        for gid in result.done:
+            self.store.upsert({"gid": gid, "status": status})
+        if result.done:
+            self.log(message)
+        for gid, error in result.errors.items():
+            self.log(f"❌ aria2 отклонил команду для {gid[:8]}: {error}")
+        self.request_refresh()
+    
     def open_downloads_folder(self):
         """Открывает папку загрузок"""
         try:
@@ -530,47 +625,39 @@ class DownloadGUI:
     def delete_last_file(self):
         """Удаляет файл последней загрузки"""
         try:
-            downloads = self.aria2_client.get_all_downloads()
-            if not downloads:
+            if not len(self.store):
                 self.log("❌ Нет загрузок")
                 return
             
             # Берем последнюю завершенную загрузку
-            last_download = None
-            for download in downloads:
-                if download.get("status") == "complete":
-                    last_download = download
-                    break
+            last_download = self.store.first(("complete",))
             
             if not last_download:
                 self.log("❌ Нет завершенных загрузок для удаления файла")
                 return
             
-            files = last_download.get("files", [])
-            if not files:
+            if not last_download.path:
                 self.log("❌ Файл не найден")
                 return
                 
-            file_path = files[0].get("path", "")
-            if not file_path or not os.path.exists(file_path):
+            file_path = last_download.path
+            if not os.path.exists(file_path):
                 self.log("❌ Файл не существует")
                 return
             
             filename = os.path.basename(file_path)
-            gid = last_download.get("gid", "")
+            gid = last_download.gid
             
             # Подтверждение удаления файла
             from tkinter import messagebox
             if messagebox.askyesno("Подтверждение", 
                                  f"Удалить файл с диска?\n{filename}\n\n⚠️ ВНИМАНИЕ: Файл будет удален навсегда!"):
                 
-                # Сначала удаляем загрузку из aria2
-                self.aria2_client.remove_download(gid)
-                
-                # Затем удаляем файл
-                os.remove(file_path)
-                self.log(f"🔥 Удален файл: {filename}")
-                self.log(f"📁 Путь: {file_path}")
+                self.worker.submit(
+                    self._remove_download_and_file, gid, file_path,
+                    on_done=lambda _: self._on_file_removed(filename, file_path),
+                    on_error=lambda e: self.log(f"❌ Ошибка удаления файла: {e}")
+                )
             else:
                 self.log("❌ Удаление файла отменено")
                 
@@ -579,21 +666,69 @@ class DownloadGUI:
             import traceback
             self.log(f"Детали: {traceback.format_exc()}")
     
+    def _on_file_removed(self, filename, file_path):
+        self._log_lines([f"🔥 Удален файл: {filename}", f"📁 Путь: {file_path}"])
+        self.request_refresh()
+    
+    def _remove_download_and_file(self, gid, file_path):
+        """Удаляет загрузку из aria2 и файл с диска (выполняется в фоновом потоке)"""
+        # Сначала удаляем загрузку из aria2 (для завершённой - её результат)
+        self.aria2_client.remove_downloads([gid])
+        
+        # Затем удаляем файл
+        os.remove(file_path)
+    
     def start_auto_refresh(self):
         """Запускает автоматическое обновление прогресса"""
         self.auto_refresh_active = True
+        self._cancel_scheduled_refresh()
         self.schedule_refresh()
     
     def schedule_refresh(self):
-        """Планирует следующее обновление"""
-        if hasattr(self, 'auto_refresh_active') and self.auto_refresh_active:
+        """Обновляет список и планирует следующее обновление
+        
+        Интервал выбирает AdaptiveScheduler: часто при активных загрузках
+        и работе пользователя, реже в простое и когда окно свернуто.
+        """
+        self._refresh_after_id = None
+        if self.auto_refresh_active:
+            self.refresh_downloads()
+            delay = self.scheduler.next_interval(visible=self.window_visible)
+            self._refresh_after_id = self.root.after(int(delay * 1000), self.schedule_refresh)
+    
+    def _cancel_scheduled_refresh(self):
+        if self._refresh_after_id is not None:
+            self.root.after_cancel(self._refresh_after_id)
+            self._refresh_after_id = None
+    
+    def request_refresh(self):
+        """Немедленное обновление после команды пользователя"""
+        self.scheduler.note_interaction()
+        if self.auto_refresh_active:
+            self._cancel_scheduled_refresh()
+            self.schedule_refresh()
+        else:
             self.refresh_downloads()
-            # Планируем следующее обновление через 2 секунды
-            self.root.after(2000, self.schedule_refresh)
     
     def stop_auto_refresh(self):
         """Останавливает автоматическое обновление"""
         self.auto_refresh_active = False
+        self._cancel_scheduled_refresh()
+    
+    def _on_window_map(self, event):
+        if event.widget is self.root and not self.window_visible:
+            self.window_visible = True
+            # Окно снова видно - сразу показываем актуальное состояние
+            if self.auto_refresh_active:
+                self._cancel_scheduled_refresh()
+                self.schedule_refresh()
+    
+    def _on_window_unmap(self, event):
+        if event.widget is self.root:
+            self.window_visible = False
+    
+    def _on_user_input(self, event):
+        self.scheduler.note_interaction()
     
     def toggle_auto_refresh(self):
         """Переключает автоматическое обновление"""
@@ -611,6 +746,10 @@ class DownloadGUI:
             self.root.mainloop()
         except Exception as e:
             self.log(f"❌ Ошибка GUI: {e}")
+        finally:
+            self.worker.stop()
+            if self.connection_state == "ready":
+                self.session.stop()
 
 
 def main():
@@ -0,0 +1,264 @@
+"""
+История скоростей загрузки в кольцевых буферах фиксированного размера
+
+Отсчёты хранятся в array("d"), память выделяется один раз и не растёт при
+любой длительности работы. Если установлен NumPy, статистика считается
+векторно поверх тех же буферов без копирования; без него - на чистом Python.
+"""
+
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SPARK_BLOCKS = "▁▂▃▄▅▆▇█"
+
+
+def _percentile(values: Sequence[float], q: float) -> float:
+    """Процентиль с линейной интерполяцией (как numpy.percentile по умолчанию)"""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class RingSeries:
+    """Временной ряд (время, значение) на capacity последних отсчётов"""
+
+    __slots__ = ("capacity", "_times", "_values", "_next", "_size")
+
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError("Ёмкость ряда должна быть положительной")
+        self.capacity = capacity
+        # Буферы растут по мере поступления отсчётов до capacity, поэтому
+        # короткие загрузки не держат полный буфер
+        self._times = array("d")
+        self._values = array("d")
+        self._next = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def first_time(self) -> Optional[float]:
+        if not self._size:
+            return None
+        return self._times[self._next if self._size == self.capacity else 0]
+
+    @property
+    def last_time(self) -> Optional[float]:
+        if not self._size:
+            return None
+        return self._times[self._next - 1]
+
+    def append(self, value: float, timestamp: float):
+        if len(self._times) < self.capacity:
+            self._times.append(timestamp)
+            self._values.append(value)
+        else:
+            self._times[self._next] = timestamp
+            self._values[self._next] = value
+        self._next = (self._next + 1) % self.capacity
+        if self._size < self.capacity:
+            self._size += 1
+
+    def _ordered(self, buffer: array):
+        """Буфер в хронологическом порядке: ndarray с NumPy, иначе список"""
+        if np is not None:
+            view = np.frombuffer(buffer, dtype=np.float64)
+            if self._size < self.capacity:
+                return view[:self._size]
+            return np.concatenate((view[self._next:], view[:self._next]))
+        if self._size < self.capacity:
+            return buffer[:self._size].tolist()
+        return buffer[self._next:].tolist() + buffer[:self._next].tolist()
+
+    def window(self, seconds: Optional[float] = None, now: Optional[float] = None):
+        """Значения за последние seconds секунд (все, если None)"""
+        values = self._ordered(self._values)
+        if seconds is None or not self._size:
+            return values
+        since = (time.time() if now is None else now) - seconds
+        times = self._ordered(self._times)
+        if np is not None:
+            return values[np.searchsorted(times, since):]
+        start = next((i for i, t in enumerate(times) if t >= since), len(times))
+        return values[start:]
+
+    def clear(self):
+        self._times = array("d")
+        self._values = array("d")
+        self._next = 0
+        self._size = 0
+
+
+class TieredSeries:
+    """Подробный ряд за последний час плюс средние по минутам за неделю
+
+    Запросы за окно, которое не помещается в подробный ряд, обслуживаются
+    загрублённым; так недельная история стоит порядка сотни килобайт.
+    """
+
+    def __init__(self, capacity: int = 3600, coarse_step: float = 60.0, coarse_capacity: int = 7 * 24 * 60):
+        self.fine = RingSeries(capacity)
+        self.coarse = RingSeries(coarse_capacity)
+        self.coarse_step = coarse_step
+        self._bucket: Optional[int] = None
+        self._bucket_sum = 0.0
+        self._bucket_count = 0
+
+    def __len__(self) -> int:
+        return len(self.fine)
+
+    def append(self, value: float, timestamp: float):
+        self.fine.append(value, timestamp)
+        bucket = int(timestamp // self.coarse_step)
+        if self._bucket is not None and bucket != self._bucket:
+            self.coarse.append(self._bucket_sum / self._bucket_count, self._bucket * self.coarse_step)
+            self._bucket_sum = 0.0
+            self._bucket_count = 0
+        self._bucket = bucket
+        self._bucket_sum += value
+        self._bucket_count += 1
+
+    def _covers(self, seconds: Optional[float], now: float) -> bool:
+        """Хватает ли подробного ряда на окно"""
+        if len(self.fine) < self.fine.capacity:
+            return True  # ни один отсчёт ещё не вытеснен
+        if seconds is None:
+            return False
+        return self.fine.first_time <= now - seconds
+
+    def window(self, seconds: Optional[float] = None, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        if self._covers(seconds, now):
+            return self.fine.window(seconds, now)
+        return self.coarse.window(seconds, now)
+
+
+def summarize(values) -> Dict[str, float]:
+    """Среднее, медиана, 95-й процентиль и пик ряда"""
+    if not len(values):
+        return {"mean": 0.0, "p50": 0.0, "p95": 0.0, "peak": 0.0}
+    if np is not None:
+        p50, p95 = np.percentile(values, (50, 95))
+        return {"mean": float(values.mean()), "p50": float(p50), "p95": float(p95),
+                "peak": float(values.max())}
+    return {"mean": sum(values) / len(values), "p50": _percentile(values, 50),
+            "p95": _percentile(values, 95), "peak": max(values)}
+
+
+def rolling_mean(values, span: int) -> List[float]:
+    """Скользящее среднее по span отсчётам"""
+    if span <= 0:
+        raise ValueError("Окно скользящего среднего должно быть положительным")
+    count = len(values)
+    if count < span:
+        return []
+    if np is not None:
+        sums = np.cumsum(np.concatenate(([0.0], values)))
+        return ((sums[span:] - sums[:-span]) / span).tolist()
+    result = []
+    total = sum(values[:span])
+    result.append(total / span)
+    for i in range(span, count):
+        total += values[i] - values[i - span]
+        result.append(total / span)
+    return result
+
+
+def downsample(values, points: int) -> List[float]:
+    """Сжимает ряд до points средних по равным отрезкам"""
+    count = len(values)
+    if points <= 0:
+        raise ValueError("Число точек должно быть положительным")
+    if count <= points:
+        return [float(value) for value in values]
+    bounds = [i * count // points for i in range(points + 1)]
+    if np is not None:
+        sums = np.add.reduceat(values, bounds[:-1])
+        return (sums / np.diff(bounds)).tolist()
+    return [sum(values[bounds[i]:bounds[i + 1]]) / (bounds[i + 1] - bounds[i]) for i in range(points)]
+
+
+def sparkline(values, width: int = 40, ceiling: Optional[float] = None) -> str:
+    """Строка из блоков ▁..█ шириной не больше width символов"""
+    points = downsample(values, width) if len(values) else []
+    if not points:
+        return ""
+    top = ceiling if ceiling else max(points)
+    if top <= 0:
+        return SPARK_BLOCKS[0] * len(points)
+    last = len(SPARK_BLOCKS) - 1
+    return "".join(SPARK_BLOCKS[min(last, int(value / top * last + 0.5))] for value in points)
+
+
+class SpeedHistory:
+    """Общая скорость и скорость каждой активной загрузки во времени
+
+    record() принимает ответ getGlobalStat и записи DownloadStore. Ряды
+    загрузок хранятся только для присутствующих в последнем опросе GID,
+    так что память ограничена числом загрузок, а не временем работы.
+    """
+
+    def __init__(self, capacity: int = 3600, coarse_step: float = 60.0,
+                 coarse_capacity: int = 7 * 24 * 60, download_capacity: int = 300):
+        self.download = TieredSeries(capacity, coarse_step, coarse_capacity)
+        self.upload = TieredSeries(capacity, coarse_step, coarse_capacity)
+        self.download_capacity = download_capacity
+        self.downloads: Dict[str, RingSeries] = {}
+
+    def record(self, stats: Dict, records: Optional[Iterable] = None, now: Optional[float] = None):
+        """Добавляет отсчёт общей скорости и, если даны записи, скоростей загрузок"""
+        now = time.time() if now is None else now
+        self.download.append(_float(stats.get("downloadSpeed")), now)
+        self.upload.append(_float(stats.get("uploadSpeed")), now)
+        if records is not None:
+            self.record_downloads(records, now)
+
+    def record_downloads(self, records: Iterable, now: Optional[float] = None):
+        """Скорости активных загрузок; ряды исчезнувших GID удаляются"""
+        now = time.time() if now is None else now
+        seen = set()
+        for record in records:
+            seen.add(record.gid)
+            if record.status != "active":
+                continue
+            series = self.downloads.get(record.gid)
+            if series is None:
+                series = self.downloads[record.gid] = RingSeries(self.download_capacity)
+            series.append(record.download_speed, now)
+        for gid in [gid for gid in self.downloads if gid not in seen]:
+            del self.downloads[gid]
+
+    def series(self, gid: Optional[str] = None, seconds: Optional[float] = None,
+               now: Optional[float] = None):
+        """Значения общей скорости или скорости загрузки gid за окно"""
+        if gid is None:
+            return self.download.window(seconds, now)
+        series = self.downloads.get(gid)
+        return series.window(seconds, now) if series else []
+
+    def summary(self, gid: Optional[str] = None, seconds: Optional[float] = 60.0,
+                now: Optional[float] = None) -> Dict[str, float]:
+        """Среднее, медиана, p95 и пик скорости за окно"""
+        return summarize(self.series(gid, seconds, now))
+
+    def sparkline(self, gid: Optional[str] = None, seconds: Optional[float] = 300.0, width: int = 40,
+                  now: Optional[float] = None) -> str:
+        """Спарклайн скорости за окно для подписи в интерфейсе"""
+        return sparkline(self.series(gid, seconds, now), width)
+
+
+def _float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
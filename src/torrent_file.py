@@ -0,0 +1,110 @@
+"""
+Чтение .torrent и .metalink файлов с предпросмотром перед отправкой в aria2
+"""
+
+import base64
+import hashlib
+import os
+import xml.etree.ElementTree as ET
+from typing import NamedTuple, Optional
+
+from bencode import BencodeError, decode_with_info_span
+
+TORRENT = "torrent"
+METALINK = "metalink"
+
+
+class TorrentInfo(NamedTuple):
+    """Сводка о содержимом: имя, общий размер, число файлов
+
+    info_hash - SHA-1 словаря info в hex; для metalink он не определён.
+    """
+    kind: str
+    name: str
+    total_length: int
+    file_count: int
+    info_hash: Optional[str]
+
+
+class TorrentFile(NamedTuple):
+    """Содержимое файла, прочитанное один раз, и его сводка"""
+    path: str
+    data: bytes
+    info: TorrentInfo
+
+    def base64(self) -> str:
+        """Содержимое в base64 для addTorrent/addMetalink"""
+        return base64.b64encode(self.data).decode("ascii")
+
+
+def _text(value, default: str = "") -> str:
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    return default
+
+
+def _length(value) -> int:
+    """Размер файла из словаря info; не целое или отрицательное - ошибка"""
+    if not isinstance(value, int) or value < 0:
+        raise BencodeError(f"Некорректный размер файла в торренте: {value!r}")
+    return value
+
+
+def parse_torrent(data: bytes) -> TorrentInfo:
+    """Сводка .torrent по его содержимому"""
+    meta, info_span = decode_with_info_span(data)
+    info = meta.get(b"info") if isinstance(meta, dict) else None
+    if not isinstance(info, dict) or info_span is None:
+        raise BencodeError("В торренте нет словаря info")
+
+    name = _text(info.get(b"name.utf-8")) or _text(info.get(b"name"), "unknown")
+    files = info.get(b"files")
+    if isinstance(files, list):
+        if not all(isinstance(f, dict) for f in files):
+            raise BencodeError("Список files в торренте содержит не словари")
+        total_length = sum(_length(f.get(b"length", 0)) for f in files)
+        file_count = len(files)
+    else:
+        total_length = _length(info.get(b"length", 0))
+        file_count = 1
+
+    info_hash = hashlib.sha1(memoryview(data)[info_span[0]:info_span[1]]).hexdigest()
+    return TorrentInfo(TORRENT, name, total_length, file_count, info_hash)
+
+
+def parse_metalink(data: bytes) -> TorrentInfo:
+    """Сводка metalink (версий 3 и 4) по его содержимому"""
+    try:
+        root = ET.fromstring(data)
+    except ET.ParseError as e:
+        raise ValueError(f"Некорректный metalink: {e}") from None
+
+    names = []
+    total_length = 0
+    # Пространство имён у версий 3 и 4 разное, поэтому сравниваем локальные имена
+    for element in root.iter():
+        if element.tag.rsplit("}", 1)[-1] != "file":
+            continue
+        names.append(element.get("name", ""))
+        for child in element:
+            if child.tag.rsplit("}", 1)[-1] == "size" and (child.text or "").strip().isdigit():
+                total_length += int(child.text)
+
+    if not names:
+        raise ValueError("В metalink нет файлов")
+    return TorrentInfo(METALINK, names[0], total_length, len(names), None)
+
+
+def load_torrent(path: str) -> TorrentFile:
+    """Читает .torrent или .metalink/.meta4 один раз и разбирает его
+
+    Тип определяется по первому байту: bencode начинается с "d", XML - с "<".
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if data.lstrip()[:1] == b"<":
+        info = parse_metalink(data)
+    else:
+        info = parse_torrent(data)
+    return TorrentFile(os.path.abspath(path), data, info)
@@ -0,0 +1,53 @@
+"""
+HTTP транспорт для JSON-RPC запросов к aria2
+"""
+
+from typing import Any, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class HttpTransport:
+    """Транспорт с keep-alive и пулом соединений, общий для всех методов клиента"""
+
+    def __init__(self, url: str, pool_size: int = 4, connect_timeout: float = 3.0,
+                 read_timeout: float = 10.0, retries: int = 0):
+        self.url = url
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+        # Одна сессия на клиента: соединения переиспользуются между запросами
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            max_retries=retries,
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @property
+    def timeout(self) -> Tuple[float, float]:
+        """Пара (connect, read) таймаутов в формате requests"""
+        return (self.connect_timeout, self.read_timeout)
+
+    def post(self, payload: Any, timeout: Optional[float] = None) -> Any:
+        """Отправляет JSON-RPC payload и возвращает разобранный JSON ответа
+
+        timeout переопределяет только таймаут чтения - подключение всегда
+        ограничено connect_timeout.
+        """
+        read_timeout = self.read_timeout if timeout is None else timeout
+        response = self.session.post(
+            self.url,
+            json=payload,
+            timeout=(min(self.connect_timeout, read_timeout), read_timeout)
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def close(self):
+        """Закрывает все соединения пула"""
+        self.session.close()
@@ -50,26 +50,10 @@ def format_time(seconds: float) -> str:
 
 def is_aria2_installed() -> bool:
     """Проверяет, установлен ли aria2"""
-    import subprocess
-    import os
-    
-    # Проверяем несколько возможных путей к aria2c
-    possible_paths = [
-        "aria2c",  # в PATH
-        "/usr/bin/aria2c",  # стандартное расположение
-        "/usr/local/bin/aria2c",  # альтернативное расположение
-    ]
-    
-    for path in possible_paths:
-        try:
-            result = subprocess.run([path, "--version"], 
-                                  capture_output=True, text=True, timeout=5)
-            if result.returncode == 0:
-                return True
-        except (subprocess.TimeoutExpired, FileNotFoundError, OSError):
-            continue
+    from daemon import find_aria2c
     
-    return False
+    # Поиск кэшируется и общий с клиентом, повторные вызовы бесплатны
+    return find_aria2c() is not None
 
 
 def get_default_download_dir() -> str:
@@ -0,0 +1,315 @@
+"""
+WebSocket транспорт для получения уведомлений aria2 (RFC 6455, без внешних зависимостей)
+"""
+
+import base64
+import hashlib
+import json
+import os
+import socket
+import ssl
+import struct
+import threading
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+# Уведомления, которые aria2 рассылает через WebSocket
+DOWNLOAD_EVENTS = (
+    "aria2.onDownloadStart",
+    "aria2.onDownloadPause",
+    "aria2.onDownloadStop",
+    "aria2.onDownloadComplete",
+    "aria2.onDownloadError",
+    "aria2.onBtDownloadComplete",
+)
+
+
+class WebSocketError(Exception):
+    """Ошибка протокола WebSocket"""
+
+
+def accept_key(key: str) -> str:
+    """Вычисляет Sec-WebSocket-Accept для ключа клиента"""
+    digest = hashlib.sha1((key + WS_GUID).encode("ascii")).digest()
+    return base64.b64encode(digest).decode("ascii")
+
+
+def encode_frame(opcode: int, payload: bytes, mask: bool = True) -> bytes:
+    """Кодирует один финальный кадр; клиент обязан маскировать данные"""
+    header = bytearray([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    length = len(payload)
+    if length < 126:
+        header.append(mask_bit | length)
+    elif length < 65536:
+        header.append(mask_bit | 126)
+        header += struct.pack("!H", length)
+    else:
+        header.append(mask_bit | 127)
+        header += struct.pack("!Q", length)
+
+    if not mask:
+        return bytes(header) + payload
+
+    mask_key = os.urandom(4)
+    return bytes(header) + mask_key + _apply_mask(payload, mask_key)
+
+
+def _apply_mask(payload: bytes, mask_key: bytes) -> bytes:
+    # XOR целыми числами заметно быстрее побайтового цикла
+    repeated = (mask_key * (len(payload) // 4 + 1))[:len(payload)]
+    value = int.from_bytes(payload, "big") ^ int.from_bytes(repeated, "big")
+    return value.to_bytes(len(payload), "big")
+
+
+def read_frame(read_exact: Callable[[int], bytes]) -> Tuple[bool, int, bytes]:
+    """Читает один кадр; возвращает (fin, opcode, payload)"""
+    first, second = read_exact(2)
+    fin = bool(first & 0x80)
+    opcode = first & 0x0F
+    masked = bool(second & 0x80)
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", read_exact(2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", read_exact(8))[0]
+
+    mask_key = read_exact(4) if masked else None
+    payload = read_exact(length) if length else b""
+    if mask_key:
+        payload = _apply_mask(payload, mask_key)
+    return fin, opcode, payload
+
+
+async def read_frame_async(read_exact: Callable[[int], Awaitable[bytes]]) -> Tuple[bool, int, bytes]:
+    """Асинхронный вариант read_frame для asyncio.StreamReader.readexactly"""
+    first, second = await read_exact(2)
+    fin = bool(first & 0x80)
+    opcode = first & 0x0F
+    masked = bool(second & 0x80)
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", await read_exact(2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", await read_exact(8))[0]
+
+    mask_key = await read_exact(4) if masked else None
+    payload = await read_exact(length) if length else b""
+    if mask_key:
+        payload = _apply_mask(payload, mask_key)
+    return fin, opcode, payload
+
+
+def handshake_request(host: str, port: int, path: str) -> Tuple[bytes, str]:
+    """Формирует запрос на обновление до WebSocket; возвращает (запрос, ключ)"""
+    key = base64.b64encode(os.urandom(16)).decode("ascii")
+    request = (
+        f"GET {path} HTTP/1.1\r\n"
+        f"Host: {host}:{port}\r\n"
+        "Upgrade: websocket\r\n"
+        "Connection: Upgrade\r\n"
+        f"Sec-WebSocket-Key: {key}\r\n"
+        "Sec-WebSocket-Version: 13\r\n"
+        "\r\n"
+    )
+    return request.encode("ascii"), key
+
+
+def check_handshake_response(head: bytes, key: str):
+    """Проверяет ответ сервера на рукопожатие"""
+    lines = head.decode("latin-1").split("\r\n")
+    if lines[0].split()[1:2] != ["101"]:
+        raise WebSocketError(f"Сервер отказал в WebSocket: {lines[0]}")
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if headers.get("sec-websocket-accept") != accept_key(key):
+        raise WebSocketError("Неверный Sec-WebSocket-Accept")
+
+
+def notification_gids(message: Any) -> Tuple[Optional[str], List[str]]:
+    """Возвращает (метод, GID) для уведомления о загрузке или (None, [])"""
+    method = message.get("method") if isinstance(message, dict) else None
+    if method not in DOWNLOAD_EVENTS:
+        return None, []
+    gids = [event.get("gid") for event in message.get("params", [])
+            if isinstance(event, dict) and event.get("gid")]
+    return method, gids
+
+
+def websocket_endpoint(url: str) -> Tuple[str, int, str, Optional[ssl.SSLContext]]:
+    """Хост, порт, путь и SSL контекст адреса ws:// или wss://
+
+    wss:// (aria2 с --rpc-secure) использует TLS и по умолчанию порт 443.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ("ws", "wss"):
+        raise ValueError(f"Неподдерживаемая схема адреса WebSocket: {url}")
+    context = ssl.create_default_context() if parsed.scheme == "wss" else None
+    port = parsed.port or (443 if context else 80)
+    return parsed.hostname or "localhost", port, parsed.path or "/", context
+
+
+class WebSocketConnection:
+    """Минимальный синхронный WebSocket клиент для JSON-RPC aria2"""
+
+    def __init__(self, url: str, timeout: Optional[float] = 5.0):
+        self.url = url
+        self.timeout = timeout
+        self.sock: Optional[socket.socket] = None
+        self._buffer = b""
+        self._send_lock = threading.Lock()
+
+    def connect(self):
+        """Открывает соединение и выполняет рукопожатие"""
+        host, port, path, context = websocket_endpoint(self.url)
+
+        sock = socket.create_connection((host, port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if context is not None:
+            try:
+                sock = context.wrap_socket(sock, server_hostname=host)
+            except OSError:
+                sock.close()
+                raise
+        request, key = handshake_request(host, port, path)
+        sock.sendall(request)
+
+        response = b""
+        while b"\r\n\r\n" not in response:
+            chunk = sock.recv(1024)
+            if not chunk:
+                sock.close()
+                raise WebSocketError("Соединение закрыто во время рукопожатия")
+            response += chunk
+        head, self._buffer = response.split(b"\r\n\r\n", 1)
+        try:
+            check_handshake_response(head, key)
+        except WebSocketError:
+            sock.close()
+            raise
+
+        self.sock = sock
+
+    def _read_exact(self, size: int) -> bytes:
+        while len(self._buffer) < size:
+            sock = self.sock
+            if sock is None:
+                raise WebSocketError("Соединение закрыто")
+            chunk = sock.recv(max(65536, size - len(self._buffer)))
+            if not chunk:
+                raise WebSocketError("Соединение закрыто")
+            self._buffer += chunk
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def send_json(self, message: Any):
+        """Отправляет JSON сообщение текстовым кадром"""
+        data = json.dumps(message).encode("utf-8")
+        with self._send_lock:
+            self.sock.sendall(encode_frame(OP_TEXT, data))
+
+    def recv_json(self) -> Any:
+        """Читает следующее JSON сообщение, отвечая на ping"""
+        parts: List[bytes] = []
+        while True:
+            fin, opcode, payload = read_frame(self._read_exact)
+            if opcode == OP_PING:
+                with self._send_lock:
+                    self.sock.sendall(encode_frame(OP_PONG, payload))
+                continue
+            if opcode == OP_PONG:
+                continue
+            if opcode == OP_CLOSE:
+                raise WebSocketError("Сервер закрыл соединение")
+            parts.append(payload)
+            if fin:
+                return json.loads(b"".join(parts).decode("utf-8"))
+
+    def close(self):
+        """Закрывает соединение"""
+        sock, self.sock = self.sock, None
+        if sock is None:
+            return
+        try:
+            with self._send_lock:
+                sock.sendall(encode_frame(OP_CLOSE, b""))
+            # shutdown будит поток, заблокированный в recv
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        sock.close()
+
+
+class NotificationListener:
+    """Фоновый поток, принимающий уведомления aria2 о смене состояния загрузок"""
+
+    def __init__(self, url: str, on_notification: Callable[[str, List[str]], None],
+                 on_state_change: Optional[Callable[[bool], None]] = None,
+                 reconnect_delay: float = 1.0, max_reconnect_delay: float = 30.0):
+        self.url = url
+        self.on_notification = on_notification
+        self.on_state_change = on_state_change
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.connected = False
+        self._connection: Optional[WebSocketConnection] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Запускает приём уведомлений"""
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Останавливает приём уведомлений"""
+        self._stop.set()
+        if self._connection:
+            self._connection.close()
+
+    def _set_connected(self, connected: bool):
+        if self.connected != connected:
+            # Подписчик узнаёт о смене состояния раньше, чем её увидят через
+            # connected: к этому моменту монитор уже запросил синхронизацию
+            if self.on_state_change:
+                self.on_state_change(connected)
+            self.connected = connected
+
+    def _run(self):
+        delay = self.reconnect_delay
+        while not self._stop.is_set():
+            connection = WebSocketConnection(self.url)
+            try:
+                connection.connect()
+                # Дальше ждём уведомлений сколько угодно долго
+                connection.sock.settimeout(None)
+                self._connection = connection
+                self._set_connected(True)
+                delay = self.reconnect_delay
+
+                while not self._stop.is_set():
+                    method, gids = notification_gids(connection.recv_json())
+                    if method:
+                        self.on_notification(method, gids)
+            except (OSError, WebSocketError, ValueError):
+                pass
+            finally:
+                connection.close()
+                self._connection = None
+                self._set_connected(False)
+
+            if self._stop.wait(delay):
+                break
+            delay = min(delay * 2, self.max_reconnect_delay)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Тесты AsyncAria2Client против локального заменителя aria2
+"""
+
+import asyncio
+import os
+import socket
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import pytest
+
+from aria2_client import Aria2Client
+from async_client import AsyncAria2Client
+from async_transport import AsyncHttpTransport
+from fake_aria2 import FakeAria2Server
+
+
+SECRET = "test123"
+
+
+def make_client(server, **kwargs):
+    return AsyncAria2Client(host=f"http://{server.host}", port=server.port, secret=SECRET, **kwargs)
+
+
+def test_same_methods_as_sync_client():
+    async def scenario(server):
+        async with make_client(server) as client:
+            gid = await client.add_download("http://example.com/a.iso", {"dir": "/data"})
+            status = await client.get_download_status(gid)
+            assert status["dir"] == "/data"
+            assert await client.pause_download(gid)
+            assert await client.unpause_download(gid)
+            assert await client.remove_download(gid)
+            assert not await client.remove_download(gid)
+            downloads, stats = await client.get_snapshot()
+            assert [d["status"] for d in downloads] == ["removed"]
+            assert stats["numStopped"] == "1"
+
+    with FakeAria2Server(secret=SECRET) as server:
+        asyncio.run(scenario(server))
+
+
+def test_full_snapshot_matches_sync_client():
+    async def scenario(server):
+        async with make_client(server) as client:
+            return await client.get_snapshot("list", limit=None, chunk_size=500)
+
+    with FakeAria2Server(secret=SECRET) as server:
+        server.populate(3)
+        server.populate(2100, status="waiting")
+        server.populate(1200, status="complete")
+        downloads, stats = asyncio.run(scenario(server))
+        sync_client = Aria2Client(host=f"http://{server.host}", port=server.port, secret=SECRET)
+        try:
+            expected, _ = sync_client.get_snapshot("list", limit=None, chunk_size=500)
+        finally:
+            sync_client.close()
+        assert [d["gid"] for d in downloads] == [d["gid"] for d in expected]
+        assert len({d["gid"] for d in downloads}) == 3303
+        assert stats["numWaiting"] == "2100"
+
+
+def test_concurrent_requests_are_bounded_by_pool():
+    async def scenario(server, gids):
+        async with make_client(server, pool_size=4) as client:
+            statuses = await asyncio.gather(*(client.get_download_status(g) for g in gids))
+            assert [s["gid"] for s in statuses] == gids
+
+    with FakeAria2Server(secret=SECRET) as server:
+        gids = [server.add_fake_download(f"http://example.com/{i}") for i in range(50)]
+        asyncio.run(scenario(server, gids))
+        assert server.connection_count <= 4
+
+
+def test_idle_connection_closed_by_server_is_replaced():
+    def drop_connections(server):
+        with server.lock:
+            connections = list(server.connections)
+        for connection in connections:
+            connection.shutdown(socket.SHUT_RDWR)
+
+    async def scenario(server):
+        async with make_client(server, pool_size=1) as client:
+            assert await client.get_global_stats()
+            # Сервер закрыл соединение, а клиент ещё не заметил: запрос повторяется
+            drop_connections(server)
+            assert await client.get_global_stats()
+            # Закрытие уже замечено: соединение не берётся из пула
+            drop_connections(server)
+            await asyncio.sleep(0.1)
+            assert await client.get_global_stats()
+
+    with FakeAria2Server(secret=SECRET) as server:
+        asyncio.run(scenario(server))
+        assert server.connection_count == 3
+
+
+def test_transport_schemes():
+    secure = AsyncHttpTransport("https://aria2.example/jsonrpc")
+    assert secure.port == 443 and secure.ssl is not None
+    assert AsyncHttpTransport("http://localhost/jsonrpc").ssl is None
+    with pytest.raises(ValueError):
+        AsyncHttpTransport("ftp://localhost:6800/jsonrpc")
+
+
+def test_event_stream():
+    async def scenario(server, gid):
+        async with make_client(server) as client:
+            events = client.events()
+            waiter = asyncio.ensure_future(events.__anext__())
+            while not server.websockets:
+                await asyncio.sleep(0.01)
+            server.set_status(gid, "error")
+            assert await asyncio.wait_for(waiter, 2) == ("onDownloadError", gid)
+            await events.aclose()
+
+    with FakeAria2Server(secret=SECRET) as server:
+        gid = server.add_fake_download("http://example.com/a.iso")
+        asyncio.run(scenario(server, gid))
+
+
+def test_bulk_add_in_parallel_chunks():
+    async def scenario(server):
+        async with make_client(server) as client:
+            urls = (f"http://example.com/{i}.bin" for i in range(50))
+            return [result async for result in client.bulk_add(urls, chunk_size=8, parallel=3)]
+
+    with FakeAria2Server(secret=SECRET) as server:
+        results = asyncio.run(scenario(server))
+        assert [r.index for r in results] == list(range(50))
+        assert len({r.gid for r in results}) == 50
+        assert server.request_count == 7
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Тесты Aria2Client против локального заменителя aria2
+"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import pytest
+
+from aria2_client import Aria2Client
+from fake_aria2 import FakeAria2Server
+from websocket_transport import websocket_endpoint
+
+
+SECRET = "test123"
+
+
+def make_client(server, **kwargs):
+    return Aria2Client(host=f"http://{server.host}", port=server.port, secret=SECRET, **kwargs)
+
+
+def test_requests_share_one_connection():
+    with FakeAria2Server(secret=SECRET) as server:
+        client = make_client(server)
+        gid = client.add_download("http://example.com/a.iso", {"dir": "/tmp"})
+        assert gid
+        assert client.get_download_status(gid)["gid"] == gid
+        assert client.pause_download(gid)
+        assert client.get_global_stats()["numWaiting"] == "1"
+        client.close()
+
+        assert server.request_count == 4
+        assert server.connection_count == 1
+
+
+def test_wrong_secret_is_reported_as_error():
+    with FakeAria2Server(secret=SECRET) as server:
+        client = Aria2Client(host=f"http://{server.host}", port=server.port, secret="wrong")
+        assert "error" in client._make_request("getVersion")
+        client.close()
+
+
+def test_unreachable_daemon_returns_error():
+    client = Aria2Client(port=1, connect_timeout=0.5, read_timeout=0.5)
+    assert "error" in client._make_request("getVersion")
+    assert client.get_all_downloads() == []
+
+
+def test_batch_keeps_order_and_per_call_errors():
+    with FakeAria2Server(secret=SECRET) as server:
+        gid = server.add_fake_download("http://example.com/a.iso")
+        client = make_client(server)
+        results = client.batch([("tellStatus", [gid]), ("tellStatus", ["missing"]), ("getVersion", None)])
+        client.close()
+
+        assert results[0]["result"]["gid"] == gid
+        assert "error" in results[1]
+        assert "version" in results[2]["result"]
+
+
+def test_snapshot_is_one_round_trip():
+    with FakeAria2Server(secret=SECRET) as server:
+        server.add_fake_download("http://example.com/a.iso", status="active")
+        server.add_fake_download("http://example.com/b.iso", status="paused")
+        server.add_fake_download("http://example.com/c.iso", status="complete")
+        client = make_client(server)
+        downloads, stats = client.get_snapshot()
+        client.close()
+
+        assert [d["status"] for d in downloads] == ["active", "paused", "complete"]
+        assert stats["numActive"] == "1"
+        assert server.request_count == 1
+
+
+def test_monitor_refreshes_gids_from_notifications():
+    with FakeAria2Server(secret=SECRET) as server:
+        gid = server.add_fake_download("http://example.com/a.iso", status="waiting")
+        client = make_client(server)
+        events = []
+        updated = threading.Event()
+
+        def on_update(downloads):
+            if any(d["gid"] == gid and d["status"] == "complete" for d in downloads):
+                updated.set()
+
+        client.register_callback("download_event", lambda event, g: events.append((event, g)))
+        client.register_callback("downloads_updated", on_update)
+        monitor = client.start_monitoring(idle_interval=30)
+        try:
+            # Ждём подключения WebSocket и полной синхронизации после него,
+            # иначе она может увидеть новый статус раньше уведомления
+            deadline = time.time() + 5
+            while not (monitor.notifications_active and monitor._next_resync) and time.time() < deadline:
+                time.sleep(0.01)
+            assert monitor.notifications_active
+
+            # Без уведомления монитор спал бы idle_interval
+            requests_before = server.request_count
+            server.set_status(gid, "complete")
+            assert updated.wait(2)
+            assert ("onDownloadComplete", gid) in events
+            assert server.request_count - requests_before <= 2
+        finally:
+            client.stop_monitoring()
+            client.close()
+
+
+def test_secure_rpc_uses_tls_websocket():
+    client = Aria2Client(host="https://aria2.example", port=6800)
+    host, port, path, context = websocket_endpoint(client.websocket_url)
+    assert (host, port, path) == ("aria2.example", 6800, "/jsonrpc") and context is not None
+    assert websocket_endpoint("wss://aria2.example/jsonrpc")[1] == 443
+    assert websocket_endpoint("ws://localhost/jsonrpc")[1:] == (80, "/jsonrpc", None)
+    with pytest.raises(ValueError):
+        websocket_endpoint("http://localhost:6800/jsonrpc")
+    client.close()
+
+
+def test_projection_limits_status_fields():
+    with FakeAria2Server(secret=SECRET) as server:
+        gid = server.add_fake_download("http://example.com/a.iso", status="active")
+        client = make_client(server)
+
+        listed = client.get_all_downloads(keys="list")
+        assert set(listed[0]) == {"gid", "status", "totalLength", "completedLength",
+                                  "downloadSpeed", "dir", "files"}
+        assert set(client.get_download_status(gid, keys=["status"])) == {"gid", "status"}
+        assert "bitfield" in client.get_download_status(gid)
+        client.close()
+
+
+def test_paginated_iteration_sees_whole_queue():
+    with FakeAria2Server(secret=SECRET) as server:
+        for i in range(250):
+            server.add_fake_download(f"http://example.com/{i}", status="waiting")
+        for i in range(30):
+            server.add_fake_download(f"http://example.com/done{i}", status="complete")
+        client = make_client(server)
+
+        assert len(client.get_all_downloads()) == 130
+        waiting = list(client.iter_waiting(chunk_size=100, keys=["status"]))
+        assert len(waiting) == 250
+        assert len({d["gid"] for d in waiting}) == 250
+        assert len(list(client.iter_all_downloads(chunk_size=7))) == 280
+
+        window = client.get_stopped_window(offset=25, limit=10)
+        assert len(window) == 5
+        client.close()
+
+
+def test_bulk_add_from_input_file_keeps_order_and_errors(tmp_path):
+    input_file = tmp_path / "urls.txt"
+    input_file.write_text(
+        "# ночная выгрузка\n"
+        "http://a.example/1.iso\thttp://b.example/1.iso\n"
+        "  dir=/data\n"
+        "  out=first.iso\n"
+        "not-a-uri\n"
+        + "".join(f"http://example.com/{i}.bin\n" for i in range(10))
+    )
+
+    with FakeAria2Server(secret=SECRET) as server:
+        client = make_client(server)
+        results = list(client.bulk_add_file(str(input_file), chunk_size=4, parallel=2))
+        client.close()
+
+        assert [r.index for r in results] == list(range(12))
+        assert results[0].uris == ["http://a.example/1.iso", "http://b.example/1.iso"]
+        assert server.downloads[results[0].gid]["files"][0]["path"] == "/data/first.iso"
+        assert results[1].gid is None and results[1].error
+        assert all(r.gid for r in results[2:])
+        # 12 элементов по 4 в группе - три запроса вместо двенадцати
+        assert server.request_count == 3
+
+
+def test_bulk_control_by_selection_is_one_round_trip():
+    with FakeAria2Server(secret=SECRET) as server:
+        isos = [server.add_fake_download(f"http://example.com/{i}.iso", options={"dir": "/data"})
+                for i in range(5)]
+        logs = [server.add_fake_download(f"http://example.com/{i}.log", options={"dir": "/logs"})
+                for i in range(3)]
+        done = server.add_fake_download("http://example.com/old.iso", status="complete",
+                                        options={"dir": "/data"})
+        client = make_client(server)
+
+        # Запрос состояния для фильтрации + один multicall с паузами
+        before = server.request_count
+        result = client.pause_downloads(directory="/data", pattern="*.iso")
+        assert result.ok and sorted(result.done) == sorted(isos)
+        assert server.request_count - before == 2
+        assert server.downloads[logs[0]]["status"] == "active"
+
+        # Список GID - сразу один multicall
+        before = server.request_count
+        result = client.unpause_downloads(isos[:2])
+        assert result.ok and server.request_count - before == 1
+
+        assert client.pause_downloads().ok
+        assert all(server.downloads[gid]["status"] == "paused" for gid in logs)
+
+        # Остановленные загрузки удаляются через removeDownloadResult
+        result = client.remove_downloads([logs[0], done])
+        assert result.ok and sorted(result.done) == sorted([logs[0], done])
+        assert done not in server.downloads
+
+        assert client.remove_downloads(status=["complete", "error", "removed"]).ok
+        assert logs[0] not in server.downloads
+        client.close()
+
+
+def test_start_attaches_to_running_daemon_without_killing_it():
+    with FakeAria2Server(secret=SECRET) as server:
+        client = make_client(server)
+        assert client.start_aria2_daemon()
+        assert client.startup.attached
+        assert client.startup.elapsed < 0.3
+        client.close()
+
+        # Чужой демон с другим секретом не перезапускается
+        other = Aria2Client(host=f"http://{server.host}", port=server.port, secret="other")
+        assert not other.start_aria2_daemon()
+        assert not other.startup.attached and other.startup.path is None
+        other.close()
+
+        assert make_client(server).get_global_stats()
+
+
+def test_missing_aria2c_is_not_cached(tmp_path, monkeypatch):
+    import daemon
+
+    executable = tmp_path / "aria2c"
+    monkeypatch.setattr(daemon, "_aria2c_path", None)
+    monkeypatch.setattr(daemon, "SEARCH_PATHS", (str(executable),))
+    monkeypatch.setattr(daemon.shutil, "which", lambda name: None)
+    assert daemon.find_aria2c() is None
+
+    # aria2c установили, пока приложение работает
+    executable.write_text("#!/bin/sh\n")
+    executable.chmod(0o755)
+    assert daemon.find_aria2c() == str(executable)
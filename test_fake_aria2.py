@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Тесты фейкового aria2: имитация загрузок и внедрение сбоев
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from aria2_client import Aria2Client
+from fake_aria2 import FakeAria2Server
+
+
+SECRET = "test123"
+
+
+def make_client(server):
+    return Aria2Client(host=f"http://{server.host}", port=server.port, secret=SECRET)
+
+
+def test_simulation_is_deterministic_and_respects_concurrency():
+    def run(seed):
+        server = FakeAria2Server(secret=SECRET, seed=seed)
+        server.global_options["max-concurrent-downloads"] = "2"
+        gids = server.populate(5, status="waiting", rate=(100, 300), total_length=(500, 1500))
+        history = [server.advance(1.0) for _ in range(30)]
+        return gids, history, server
+
+    gids, history, server = run(seed=7)
+    assert run(seed=7)[1] == history
+
+    # Сначала стартуют две первые загрузки очереди, остальные - по мере завершения
+    assert history[0] == [(gids[0], "active"), (gids[1], "active")]
+    statuses = [server.downloads[gid]["status"] for gid in gids]
+    assert statuses == ["complete"] * 5
+    started = [gid for step in history for gid, status in step if status == "active"]
+    assert started == gids
+
+
+def test_injected_failures_reach_the_client():
+    with FakeAria2Server(secret=SECRET) as server:
+        server.populate(2)
+        client = make_client(server)
+        try:
+            server.inject_failure("aria2.getGlobalStat", times=1, message="boom")
+            assert client.get_global_stats() == {}
+            assert client.get_global_stats()["numActive"] == "2"
+
+            server.dropped_requests = 1
+            assert "error" in client._make_request("getVersion")
+            assert "result" in client._make_request("getVersion")
+
+            server.download_failure_rate = 1.0
+            server.advance(1.0)
+            assert {d["status"] for d in client.get_all_downloads()} == {"error"}
+        finally:
+            client.close()
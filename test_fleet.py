@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Тесты парка удалённых демонов aria2 на нескольких локальных заменителях
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from fake_aria2 import FakeAria2Server
+from fleet import DISK, Fleet, split_fleet_id
+
+
+SECRET = "test123"
+
+
+def test_fleet_merges_routes_and_survives_dead_node():
+    servers = [FakeAria2Server(secret=SECRET).start() for _ in range(3)]
+    fleet = Fleet(retry_delay=60.0)
+    try:
+        disk = {"a": 10 << 30, "b": 500 << 30, "c": 50 << 30}
+        for name, server in zip("abc", servers):
+            fleet.add_node(name, f"http://{server.host}", server.port, SECRET,
+                           disk_free=lambda name=name: disk[name])
+
+        servers[0].add_fake_download("http://example.com/busy.iso", download_speed=5000)
+        servers[1].add_fake_download("http://example.com/slow.iso", download_speed=100)
+        servers[2].global_options["max-overall-download-limit"] = "1000000"
+        servers[2].add_fake_download("http://example.com/c.iso", download_speed=200)
+
+        assert fleet.poll() == {"a": True, "b": True, "c": True}
+        assert len(fleet.downloads()) == 3
+        assert fleet.global_stats()["downloadSpeed"] == "5300"
+
+        # У c задан предел канала - у него больше всего свободной полосы
+        node, gid = split_fleet_id(fleet.add_download("http://example.com/new.bin"))
+        assert node == "c" and gid in servers[2].downloads
+        assert split_fleet_id(fleet.add_download("http://example.com/big.bin", prefer=DISK))[0] == "b"
+
+        # Узел упал: остальные опрашиваются, его данные помечены устаревшими
+        servers[1].stop()
+        assert fleet.poll() == {"a": True, "b": False, "c": True}
+        stale = [d for d in fleet.downloads() if d["stale"]]
+        assert [d["node"] for d in stale] == ["b"]
+        assert split_fleet_id(fleet.add_download("http://example.com/x", prefer=DISK))[0] == "c"
+        assert fleet.pause_download(f"a-{next(iter(servers[0].downloads))}")
+    finally:
+        fleet.close()
+        for server in (servers[0], servers[2]):
+            server.stop()
+
+
+def test_rank_keeps_limited_and_unlimited_nodes_comparable():
+    fleet = Fleet()
+    try:
+        speeds = {"fast": 50_000_000, "idle": 0, "roomy": 9_000_000, "full": 2_100_000}
+        limits = {"roomy": 10_000_000, "full": 2_000_000}
+        for name, speed in speeds.items():
+            node = fleet.add_node(name, "http://127.0.0.1", 1, max_bandwidth=limits.get(name))
+            node.mark_ok([], {"downloadSpeed": str(speed)}, None)
+
+        # Запас 1 МБ/с у roomy известен; узлы без предела - по скорости;
+        # узел, упёршийся в предел, - последним
+        assert [node.name for node in fleet.rank_nodes()] == ["roomy", "idle", "fast", "full"]
+    finally:
+        fleet.close()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Тесты истории загрузок в SQLite
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from aria2_client import Aria2Client
+from fake_aria2 import FakeAria2Server
+from history import DownloadHistory
+from monitor import DownloadMonitor
+
+
+SECRET = "test123"
+
+
+def finished(gid, status="complete", url="http://example.com/a.iso", info_hash=None, directory="/d"):
+    download = {"gid": gid, "status": status, "dir": directory, "totalLength": "100",
+                "completedLength": "100", "files": [{"path": "/d/a.iso", "uris": [{"uri": url}]}]}
+    if info_hash:
+        download["infoHash"] = info_hash
+    return download
+
+
+def test_history_queries_and_keeps_finish_time(tmp_path):
+    history = DownloadHistory(str(tmp_path / "history.sqlite3"))
+    try:
+        assert not history.record({"gid": "a", "status": "active"})
+        history.record_many([
+            finished("a"),
+            finished("b", status="error", url="http://example.com/b.iso"),
+            finished("c", info_hash="abc", directory="/torrents"),
+        ])
+        history.record(finished("a"), node="remote")
+        history.flush()
+
+        assert history.count() == 4
+        assert history.count("error") == 1
+        assert [row["gid"] for row in history.query(url="http://example.com/b.iso")] == ["b"]
+        assert [row["gid"] for row in history.query(info_hash="abc")] == ["c"]
+        assert [row["gid"] for row in history.query(directory="/torrents")] == ["c"]
+        assert [row["node"] for row in history.query(node="remote")] == ["remote"]
+
+        # Повторная запись с тем же статусом не сдвигает время завершения
+        first = history.query(status="error")[0]["finished_at"]
+        history.record(finished("b", status="error", url="http://example.com/b.iso"))
+        history.flush()
+        assert history.query(status="error")[0]["finished_at"] == first
+        # Следующая страница - записи строго старше последней полученной
+        assert all(row["finished_at"] < first for row in history.query(until=first))
+    finally:
+        history.close()
+
+
+def test_monitor_records_status_transitions(tmp_path):
+    history = DownloadHistory(str(tmp_path / "history.sqlite3"))
+    with FakeAria2Server(secret=SECRET) as server:
+        gid = server.add_fake_download("http://example.com/a.iso", status="active")
+        client = Aria2Client(host=f"http://{server.host}", port=server.port, secret=SECRET)
+        monitor = DownloadMonitor(client, use_notifications=False, history=history)
+        try:
+            monitor.tick()
+            server.set_status(gid, "complete")
+            monitor.tick()
+            monitor.tick()
+            history.flush()
+
+            rows = history.query()
+            assert [(row["gid"], row["status"], row["url"]) for row in rows] == [
+                (gid, "complete", "http://example.com/a.iso")]
+        finally:
+            client.close()
+            history.close()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Тесты мониторинга: изменения между снимками и хранилище состояния
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from aria2_client import Aria2Client
+from delta import ADDED, PROGRESS, REMOVED, STATUS_CHANGED, SnapshotDiffer
+from download_store import DownloadStore
+from eta import EtaEstimator
+from fake_aria2 import FakeAria2Server
+from monitor import DownloadMonitor
+from scheduler import AdaptiveScheduler
+from speed_history import SpeedHistory
+
+
+SECRET = "test123"
+
+
+def download(gid, status="active", completed="0"):
+    return {"gid": gid, "status": status, "completedLength": completed, "totalLength": "100"}
+
+
+def test_differ_emits_only_changes():
+    differ = SnapshotDiffer()
+    first = differ.diff([download("a"), download("b")])
+    assert [(d.kind, d.gid) for d in first] == [(ADDED, "a"), (ADDED, "b")]
+
+    assert differ.diff([download("a"), download("b")]) == []
+
+    changes = differ.diff([download("a", completed="50"), download("b", status="paused")])
+    assert [(d.kind, d.gid, d.changes) for d in changes] == [
+        (PROGRESS, "a", {"completedLength": "50"}),
+        (STATUS_CHANGED, "b", {"status": "paused"}),
+    ]
+
+    assert [(d.kind, d.gid) for d in differ.diff([download("a", completed="50")])] == [(REMOVED, "b")]
+
+
+def test_partial_update_does_not_remove_missing():
+    differ = SnapshotDiffer()
+    differ.diff([download("a"), download("b")])
+    assert differ.diff([download("a", completed="10")], complete=False)[0].kind == PROGRESS
+    assert set(differ.previous) == {"a", "b"}
+
+
+def test_monitor_tick_reports_deltas_and_keeps_full_mode():
+    with FakeAria2Server(secret=SECRET) as server:
+        gid = server.add_fake_download("http://example.com/a.iso")
+        client = Aria2Client(host=f"http://{server.host}", port=server.port, secret=SECRET)
+        received, snapshots = [], []
+        client.register_callback("downloads_delta", received.append)
+        client.register_callback("downloads_updated", snapshots.append)
+        monitor = DownloadMonitor(client, use_notifications=False)
+
+        monitor.tick()
+        assert [d.kind for d in received[0]] == [ADDED]
+
+        monitor.tick()
+        assert len(received) == 1
+
+        server.set_status(gid, "complete")
+        monitor.tick()
+        assert received[1][0].kind == STATUS_CHANGED
+        assert received[1][0].changes["status"] == "complete"
+        assert len(snapshots) == 3 and snapshots[-1][0]["status"] == "complete"
+        client.close()
+
+
+def test_resync_sees_whole_queue_beyond_first_page():
+    with FakeAria2Server(secret=SECRET) as server:
+        server.populate(150, status="complete")
+        server.populate(250, status="waiting")
+        gid, = server.populate(1, status="active", rate=1000, total_length=1000)
+        client = Aria2Client(host=f"http://{server.host}", port=server.port, secret=SECRET)
+        monitor = DownloadMonitor(client, use_notifications=False)
+        try:
+            assert len(monitor.tick()) == 401
+
+            server.advance(5)
+            deltas = monitor.tick()
+            assert (STATUS_CHANGED, gid) in [(d.kind, d.gid) for d in deltas]
+            assert REMOVED not in [d.kind for d in deltas]
+            assert monitor.store.count("complete") == 151
+        finally:
+            client.close()
+
+
+def test_store_diffs_against_compact_records():
+    store = DownloadStore()
+    assert [(d.kind, d.gid) for d in store.apply([download("a"), download("b")])] == [
+        (ADDED, "a"), (ADDED, "b")]
+    assert store.apply([download("a"), download("b")]) == []
+
+    changes = store.apply([download("a", completed="50"), download("b", status="paused")],
+                          complete=True)
+    assert [(d.kind, d.gid, d.changes) for d in changes] == [
+        (PROGRESS, "a", {"completedLength": "50"}),
+        (STATUS_CHANGED, "b", {"status": "paused"}),
+    ]
+    assert [(d.kind, d.gid) for d in store.apply([download("b", status="paused")], complete=True)] == [
+        (REMOVED, "a")]
+    assert store.get("b").as_dict()["status"] == "paused"
+
+
+def test_running_monitor_reports_tick_costs():
+    with FakeAria2Server(secret=SECRET) as server:
+        server.populate(3)
+        client = Aria2Client(host=f"http://{server.host}", port=server.port, secret=SECRET)
+        monitor = DownloadMonitor(client, poll_interval=0.05, use_notifications=False)
+        monitor.start()
+        try:
+            deadline = time.monotonic() + 5
+            while monitor.stats()["ticks"] < 2 and time.monotonic() < deadline:
+                time.sleep(0.02)
+            stats = monitor.stats()
+            assert stats["ticks"] >= 2
+            assert 0 < stats["mean_cost"] <= stats["max_cost"]
+            assert monitor.global_stats["numActive"] == "3"
+        finally:
+            monitor.stop()
+            client.close()
+
+
+def test_store_indexes_follow_updates():
+    store = DownloadStore()
+    store.update_many([
+        {"gid": "a", "status": "active", "dir": "/d1", "totalLength": "100",
+         "completedLength": "25", "files": [{"path": "/d1/a.iso"}]},
+        {"gid": "b", "status": "paused", "dir": "/d2"},
+        {"gid": "c", "status": "complete", "dir": "/d1"},
+    ], complete=True)
+
+    assert store.get("a").completed_length == 25
+    assert store.get("a").progress == 25.0
+    assert store.get("a").name == "a.iso"
+    assert store.first(("paused", "active")).gid == "b"
+    assert [r.gid for r in store.by_directory("/d1")] == ["a", "c"]
+
+    store.upsert({"gid": "a", "status": "paused", "dir": "/d2"})
+    assert store.count("active") == 0
+    assert [r.gid for r in store.by_status("paused")] == ["b", "a"]
+    assert [r.gid for r in store.by_directory("/d2")] == ["b", "a"]
+
+    store.update_many([{"gid": "a"}, {"gid": "c"}], complete=True)
+    assert "b" not in store
+    assert store.by_directory("/d2")[0].gid == "a"
+
+
+def test_store_applies_monitor_deltas():
+    differ = SnapshotDiffer()
+    store = DownloadStore()
+    store.apply_deltas(differ.diff([download("a"), download("b")]))
+    store.apply_deltas(differ.diff([download("a", status="complete", completed="100")]))
+
+    assert len(store) == 1
+    assert store.get("a").status == "complete"
+    assert store.get("a").completed_length == 100
+
+
+def test_scheduler_backs_off_when_idle_and_resets_on_activity():
+    scheduler = AdaptiveScheduler(min_interval=1.0, max_interval=8.0, hidden_interval=60.0)
+
+    for _ in range(5):
+        scheduler.record_tick(0.01, busy=False)
+    assert scheduler.next_interval() == 8.0
+    assert scheduler.next_interval(ceiling=5.0) == 5.0
+    assert scheduler.next_interval(visible=False) == 60.0
+
+    scheduler.record_tick(0.03, busy=True)
+    assert scheduler.next_interval() == 1.0
+
+    scheduler.record_tick(0.01, busy=False)
+    scheduler.note_interaction()
+    assert scheduler.next_interval() == 1.0
+    assert scheduler.stats()["ticks"] == 7
+
+
+def test_speed_history_is_bounded_and_summarizes_windows():
+    history = SpeedHistory(capacity=60, coarse_step=10.0, coarse_capacity=100, download_capacity=5)
+    store = DownloadStore()
+    store.update_many([download("a"), download("b", status="paused")])
+
+    for second in range(600):
+        store.get("a").download_speed = second % 10
+        history.record({"downloadSpeed": str(second)}, store.by_status("active"), now=second)
+
+    assert len(history.download.fine) == 60
+    assert len(history.downloads["a"]) == 5
+    assert "b" not in history.downloads
+
+    assert history.summary(seconds=10, now=599) == {"mean": 594.0, "p50": 594.0, "p95": 598.5, "peak": 599.0}
+    # Окно длиннее подробного ряда обслуживают средние по 10 секунд
+    assert history.summary(seconds=300, now=599)["peak"] == 584.5
+    assert len(history.sparkline(seconds=300, width=20, now=599)) == 20
+
+    history.record_downloads([])
+    assert history.downloads == {}
+
+
+def test_eta_survives_stalls_and_estimates_queue():
+    store = DownloadStore()
+    store.update_many([download("a"), download("b"), download("c", status="waiting"),
+                       download("d", status="waiting")])
+    for gid in "ab":
+        store.get(gid).total_length = 1000
+        store.get(gid).download_speed = 10
+    estimator = EtaEstimator(half_life=5.0, stall_timeout=30.0)
+
+    assert estimator.update(store.by_status("active"), now=0) == {"a": 100.0, "b": 100.0}
+    store.get("a").completed_length = 100
+    store.get("b").completed_length = 100
+    assert estimator.update(store.by_status("active"), now=10)["a"] == 90.0
+
+    # Короткий простой не даёт бесконечности, долгий - даёт
+    stalled = estimator.update(store.by_status("active"), now=12)["a"]
+    assert 90 < stalled < 200
+    assert estimator.update(store.by_status("active"), now=50)["a"] is None
+
+    estimator = EtaEstimator()
+    estimator.update(store.by_status("active"), now=0)
+    # Два слота по 10 байт/с: по 90 с на активные, затем по 10 с на c и d
+    assert estimator.queue_drain(store.by_status("active"), store.by_status("waiting"),
+                                 max_concurrent=2) == 100.0
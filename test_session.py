@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Тесты файла сессии: сохранение, ротация копий и восстановление очереди
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from aria2_client import Aria2Client
+from daemon import daemon_command
+from fake_aria2 import FakeAria2Server
+from input_file import read_input_file
+from session import SessionManager
+
+
+SECRET = "test123"
+
+
+def make_client(server):
+    return Aria2Client(host=f"http://{server.host}", port=server.port, secret=SECRET)
+
+
+def test_save_rotates_backups_and_recovers_broken_session(tmp_path):
+    path = str(tmp_path / "aria2.session")
+    with FakeAria2Server(secret=SECRET) as server:
+        server.global_options["save-session"] = path
+        client = make_client(server)
+        session = SessionManager(client, path, keep=2)
+        try:
+            server.add_fake_download("http://example.com/a.iso", status="waiting")
+            assert session.save()
+            assert session.save()  # без изменений копия не сдвигается
+            assert not os.path.exists(session.backup_path(2))
+
+            server.add_fake_download("http://example.com/b.iso", status="paused")
+            assert session.save()
+            assert len(list(read_input_file(session.backup_path(1)))) == 2
+            assert len(list(read_input_file(session.backup_path(2)))) == 1
+        finally:
+            client.close()
+
+    # Испорченный файл сессии заменяется свежей копией перед запуском
+    with open(path, "wb") as f:
+        f.write(b"\xff\xfe broken")
+    assert session.prepare() == session.backup_path(1)
+    assert session.is_valid(path)
+
+
+def test_truncated_session_is_restored_from_backup(tmp_path):
+    path = str(tmp_path / "aria2.session")
+    with FakeAria2Server(secret=SECRET) as server:
+        server.global_options["save-session"] = path
+        client = make_client(server)
+        session = SessionManager(client, path)
+        try:
+            for i in range(3):
+                server.add_fake_download(f"http://example.com/{i}.iso", status="waiting")
+            assert session.save()
+        finally:
+            client.close()
+    with open(path, "rb") as f:
+        saved = f.read()
+
+    # Запись оборвалась посреди записи, до gid и перевода строки
+    for broken in (saved[:saved.rindex(b" gid=")], saved[:-1], b""):
+        with open(path, "wb") as f:
+            f.write(broken)
+        assert not session.is_valid(path)
+        assert session.prepare() == session.backup_path(1)
+        with open(path, "rb") as f:
+            assert f.read() == saved
+    assert [uris for uris, _ in read_input_file(path)] == [
+        [f"http://example.com/{i}.iso"] for i in range(3)]
+
+
+def test_restore_keeps_order_pause_and_skips_known_gids(tmp_path):
+    path = str(tmp_path / "aria2.session")
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(1200):
+            f.write(f"http://example.com/{i}.bin\n gid={i + 1:016x}\n")
+            if i % 2:
+                f.write(" pause=true\n")
+
+    with FakeAria2Server(secret=SECRET) as server:
+        server.add_fake_download("http://example.com/0.bin", options={"gid": f"{1:016x}"})
+        client = make_client(server)
+        try:
+            result = SessionManager(client, path).restore(chunk_size=500)
+            assert (result.added, result.skipped, result.errors) == (1199, 1, [])
+
+            queued = [d for d in server.downloads.values() if d["status"] != "active"]
+            assert [d["gid"] for d in queued] == [f"{i + 1:016x}" for i in range(1, 1200)]
+            assert [d["status"] for d in queued[:2]] == ["paused", "waiting"]
+        finally:
+            client.close()
+
+
+def test_corrupt_session_without_backup_is_moved_aside(tmp_path):
+    path = str(tmp_path / "aria2.session")
+    with open(path, "wb") as f:
+        f.write(b"http://example.com/a.iso\n gid=00000000000")
+    session = SessionManager(None, path)
+    assert session.prepare() is None
+    assert not os.path.exists(path)
+    assert os.path.exists(path + ".corrupt")
+    assert not any(arg.startswith("--input-file") for arg in daemon_command("aria2c", 6800, None, path))
+
+
+def test_foreign_daemon_is_neither_restored_nor_saved(tmp_path):
+    path = str(tmp_path / "aria2.session")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("http://example.com/a.iso\n gid=0000000000000001\n")
+
+    with FakeAria2Server(secret=SECRET) as server:
+        server.global_options["save-session"] = str(tmp_path / "other.session")
+        client = make_client(server)
+        session = SessionManager(client, path)
+        try:
+            assert session.start_daemon()
+            assert client.startup.attached and not session.managed
+            assert server.downloads == {}
+            assert not session.save()
+            session.start()
+            assert session._saver is None
+
+            server.global_options["save-session"] = path
+            assert session.start_daemon()
+            assert session.managed and len(server.downloads) == 1
+        finally:
+            client.close()
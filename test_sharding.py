@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Тесты нескольких демонов aria2 за одним клиентом
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from fake_aria2 import FakeAria2Server
+from sharding import HostAffinityPolicy, LeastLoadedPolicy, ShardManager, split_global_id
+
+
+def start_fakes(tmp_path, count):
+    """Фейковые демоны с секретами, заранее записанными в каталог сессий"""
+    servers = []
+    for shard in range(count):
+        secret = f"secret{shard}"
+        (tmp_path / f"shard-{shard}.secret").write_text(secret)
+        servers.append(FakeAria2Server(secret=secret).start())
+    return servers
+
+
+def test_manager_attaches_and_merges_with_global_ids(tmp_path):
+    servers = start_fakes(tmp_path, 3)
+    try:
+        manager = ShardManager(session_dir=str(tmp_path), host="http://127.0.0.1",
+                               ports=[server.port for server in servers])
+        assert manager.start()
+        assert manager.check() == []
+
+        client = manager.client()
+        ids = [client.add_download(f"http://example.com/{i}.bin") for i in range(6)]
+        assert [len(server.downloads) for server in servers] == [2, 2, 2]
+
+        downloads = client.get_all_downloads()
+        assert sorted(d["gid"] for d in downloads) == sorted(ids)
+
+        assert client.pause_download(ids[4])
+        shard, gid = split_global_id(ids[4])
+        assert servers[shard].downloads[gid]["status"] == "paused"
+        assert client.get_download_status(ids[4])["gid"] == ids[4]
+        assert client.get_global_stats()["numWaiting"] == "6"
+
+        results = list(client.bulk_add(f"http://example.com/bulk/{i}" for i in range(10)))
+        assert [r.index for r in results] == list(range(10))
+        assert len({r.gid for r in results}) == 10
+        client.close()
+    finally:
+        for server in servers:
+            server.stop()
+
+
+def test_policies(tmp_path):
+    servers = start_fakes(tmp_path, 2)
+    try:
+        manager = ShardManager(session_dir=str(tmp_path), host="http://127.0.0.1",
+                               ports=[server.port for server in servers])
+        for _ in range(3):
+            servers[0].add_fake_download("http://busy.example/file")
+
+        least_loaded = manager.client(LeastLoadedPolicy())
+        assert split_global_id(least_loaded.add_download("http://a.example/1"))[0] == 1
+
+        affinity = manager.client(HostAffinityPolicy())
+        shards = {split_global_id(affinity.add_download(f"http://mirror.example/{i}"))[0]
+                  for i in range(5)}
+        assert len(shards) == 1
+    finally:
+        for server in servers:
+            server.stop()
+
+
+def test_merge_pages_every_shard_and_skips_foreign_daemon(tmp_path, capsys):
+    servers = start_fakes(tmp_path, 2)
+    try:
+        servers[0].populate(150, status="waiting")
+        servers[1].populate(120, status="complete")
+        manager = ShardManager(session_dir=str(tmp_path), host="http://127.0.0.1",
+                               ports=[server.port for server in servers])
+        assert len(manager.client().get_all_downloads(chunk_size=50)) == 270
+
+        # Порт демона 1 занят aria2 с другим секретом: не перезапускать
+        servers[1].secret = "someone-else"
+        manager._start_shard = lambda shard: pytest.fail("чужой демон перезапущен")
+        assert manager.check() == []
+        assert manager.check() == []
+        assert capsys.readouterr().out.count("занят чужим демоном") == 1
+    finally:
+        for server in servers:
+            server.stop()
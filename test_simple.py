@@ -7,24 +7,29 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
 from aria2_client import Aria2Client
+from fake_aria2 import FakeAria2Server
 from utils import is_aria2_installed, format_size, format_speed
 
 
-def test_aria2():
-    """Тест работы aria2"""
-    print("=== Тест Aria2 Download Manager ===\n")
+def check_aria2(client=None):
+    """Проверка работы aria2
     
-    # Проверка установки aria2
-    print("1. Проверка aria2...")
-    if is_aria2_installed():
-        print("✅ aria2 установлен")
-    else:
-        print("❌ aria2 не найден")
-        return False
+    Без client проверяется настоящий aria2c на порту 6800.
+    """
+    print("=== Тест Aria2 Download Manager ===\n")
     
-    # Создание клиента
-    print("\n2. Создание клиента...")
-    client = Aria2Client()
+    if client is None:
+        # Проверка установки aria2
+        print("1. Проверка aria2...")
+        if is_aria2_installed():
+            print("✅ aria2 установлен")
+        else:
+            print("❌ aria2 не найден")
+            return False
+        
+        # Создание клиента
+        print("\n2. Создание клиента...")
+        client = Aria2Client()
     
     # Запуск демона
     print("3. Запуск aria2 демона...")
@@ -76,6 +81,17 @@ def test_aria2():
     return True
 
 
+def test_aria2():
+    """Те же проверки против фейкового aria2 - без aria2c и сети"""
+    with FakeAria2Server(secret="test123") as server:
+        server.populate(3)
+        client = Aria2Client(host=f"http://{server.host}", port=server.port)
+        try:
+            assert check_aria2(client)
+        finally:
+            client.close()
+
+
 def test_simple_gui():
     """Тест простого GUI"""
     print("\n=== Тест Simple GUI ===\n")
@@ -109,7 +125,7 @@ def main():
     success = True
     
     # Тест aria2
-    if not test_aria2():
+    if not check_aria2():
         success = False
     
     # Тест GUI (опционально)
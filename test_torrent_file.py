@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Тесты разбора .torrent/.metalink и добавления торрентов
+"""
+
+import hashlib
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from aria2_client import Aria2Client
+from bencode import BencodeError, decode, encode
+from fake_aria2 import FakeAria2Server
+from torrent_file import METALINK, load_torrent
+
+
+SECRET = "test123"
+
+INFO = {
+    "name": "dataset",
+    "piece length": 262144,
+    "pieces": b"\x00" * 40,
+    "files": [
+        {"length": 1000, "path": ["a.bin"]},
+        {"length": 2500, "path": ["sub", "b.bin"]},
+    ],
+}
+
+METALINK_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<metalink xmlns="urn:ietf:params:xml:ns:metalink">
+  <file name="one.iso"><size>100</size><url>http://example.com/one.iso</url></file>
+  <file name="two.iso"><size>200</size><url>http://example.com/two.iso</url></file>
+</metalink>
+"""
+
+
+def write_torrent(path):
+    path.write_bytes(encode({"announce": "http://tracker.example/announce", "info": INFO}))
+    return str(path)
+
+
+def test_torrent_preview_and_info_hash(tmp_path):
+    torrent = load_torrent(write_torrent(tmp_path / "dataset.torrent"))
+
+    assert torrent.info.name == "dataset"
+    assert torrent.info.total_length == 3500
+    assert torrent.info.file_count == 2
+    assert torrent.info.info_hash == hashlib.sha1(encode(INFO)).hexdigest()
+    assert decode(torrent.data)[b"info"][b"files"][1][b"path"] == [b"sub", b"b.bin"]
+
+    with pytest.raises(BencodeError):
+        decode(torrent.data[:-1])
+
+
+@pytest.mark.parametrize("files", [
+    [{"length": "1000", "path": ["a.bin"]}],
+    [{"length": 1000, "path": ["a.bin"]}, b"b.bin"],
+    [{"length": -1, "path": ["a.bin"]}],
+])
+def test_malformed_files_list_is_rejected(tmp_path, files):
+    path = tmp_path / "broken.torrent"
+    path.write_bytes(encode({"info": dict(INFO, files=files)}))
+    with pytest.raises(BencodeError):
+        load_torrent(str(path))
+
+
+def test_metalink_preview(tmp_path):
+    path = tmp_path / "isos.meta4"
+    path.write_bytes(METALINK_XML)
+    info = load_torrent(str(path)).info
+    assert (info.kind, info.name, info.total_length, info.file_count) == (METALINK, "one.iso", 300, 2)
+
+
+def test_queued_torrent_is_not_added_twice(tmp_path):
+    torrent_path = write_torrent(tmp_path / "dataset.torrent")
+    metalink_path = tmp_path / "isos.metalink"
+    metalink_path.write_bytes(METALINK_XML)
+
+    with FakeAria2Server(secret=SECRET) as server:
+        client = Aria2Client(host=f"http://{server.host}", port=server.port, secret=SECRET)
+        gid = client.add_torrent(torrent_path, {"dir": "/data"})
+        assert server.downloads[gid]["files"][0]["path"] == "/data/dataset"
+
+        assert client.add_torrent(torrent_path) == gid
+        assert len(server.downloads) == 1
+
+        assert len(client.add_metalink(str(metalink_path))) == 2
+        client.close()